@@ -0,0 +1,9 @@
+"""Performance benchmarks for Coffee Canary.
+
+    python -m benchmarks.generate_data   # synthetic CSVs at any scale
+    python -m benchmarks.run             # time + memory, written as JSON
+    python -m benchmarks.compare         # flag regressions against a baseline
+    python -m benchmarks.startup         # worker import profile, held to a time budget
+    python -m benchmarks.loadtest        # gunicorn throughput, latency and RSS per worker setting
+    python -m benchmarks.postgres_parity # PostgreSQL builds hold the same rows as SQLite builds
+"""
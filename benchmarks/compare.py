@@ -0,0 +1,95 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare benchmarks/baseline.json benchmarks/results/latest.json
+
+Exits 1 when any benchmark got slower (or used more memory) than the
+thresholds allow, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+# Relative slowdown tolerated before a benchmark counts as regressed.
+DEFAULT_TIME_THRESHOLD = 0.15
+DEFAULT_MEMORY_THRESHOLD = 0.20
+# Differences below these are timer / allocator noise, whatever the ratio.
+MIN_TIME_DELTA_SECONDS = 0.005
+MIN_MEMORY_DELTA_MB = 1.0
+
+
+def load_results(path) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(baseline: dict, current: dict,
+                    time_threshold: float = DEFAULT_TIME_THRESHOLD,
+                    memory_threshold: float = DEFAULT_MEMORY_THRESHOLD) -> list[dict]:
+    """One row per benchmark present in both runs, with a `regressed` flag."""
+    rows = []
+    for name, now in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+
+        old_s, new_s = before['seconds']['median'], now['seconds']['median']
+        time_ratio = new_s / old_s if old_s else float('inf')
+        slower = time_ratio > 1 + time_threshold and new_s - old_s > MIN_TIME_DELTA_SECONDS
+
+        old_mb, new_mb = before.get('peak_python_mb'), now.get('peak_python_mb')
+        memory_ratio = None
+        bigger = False
+        if old_mb is not None and new_mb is not None:
+            memory_ratio = new_mb / old_mb if old_mb else float('inf')
+            bigger = memory_ratio > 1 + memory_threshold and new_mb - old_mb > MIN_MEMORY_DELTA_MB
+
+        rows.append({
+            'name': name,
+            'baseline_s': old_s,
+            'current_s': new_s,
+            'time_ratio': time_ratio,
+            'baseline_mb': old_mb,
+            'current_mb': new_mb,
+            'memory_ratio': memory_ratio,
+            'regressed': slower or bigger,
+        })
+    return rows
+
+
+def format_report(rows: list[dict]) -> str:
+    lines = [f"{'benchmark':<40} {'baseline':>10} {'current':>10} {'ratio':>7} {'mem ratio':>9}"]
+    for row in rows:
+        memory_ratio = f"{row['memory_ratio']:.2f}x" if row['memory_ratio'] is not None else '-'
+        flag = '  REGRESSION' if row['regressed'] else ''
+        lines.append(
+            f"{row['name']:<40} {row['baseline_s'] * 1000:8.1f}ms {row['current_s'] * 1000:8.1f}ms "
+            f"{row['time_ratio']:6.2f}x {memory_ratio:>9}{flag}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--time-threshold', type=float, default=DEFAULT_TIME_THRESHOLD)
+    parser.add_argument('--memory-threshold', type=float, default=DEFAULT_MEMORY_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    if baseline['meta'].get('scale') != current['meta'].get('scale'):
+        print(f"Warning: comparing different scales {baseline['meta'].get('scale')} "
+              f"and {current['meta'].get('scale')}")
+
+    rows = compare_results(baseline, current, args.time_threshold, args.memory_threshold)
+    print(format_report(rows))
+    regressions = [row['name'] for row in rows if row['regressed']]
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Seeded synthetic coffee_beans.csv / coffee_roasters.csv at any scale.
+
+    python -m benchmarks.generate_data --beans 1000000 --roasters 5000 --out-dir /tmp/canary
+
+Distributions are shaped after the real data: a few roasters sell most of the
+bags, tasting notes and origins follow a long tail, and purchases get more
+frequent over time. Roaster cities come from the bundled gazetteer so building
+a database from generated data never needs the network.
+"""
+import argparse
+import csv
+import datetime as dt
+import os
+import random
+import sys
+from itertools import accumulate
+from pathlib import Path
+
+from src.utils.gazetteer import GAZETTEER_CSV
+
+BEANS_HEADER = [
+    'purchase_date', 'roaster', 'blend_name', 'roast_level', 'roast_date',
+    'weight_grams', 'tasting_notes', 'origin_country', 'processing_method',
+]
+ROASTERS_HEADER = ['name', 'city', 'state', 'website']
+
+MIN_BEANS, MAX_BEANS = 1_000, 10_000_000
+MIN_ROASTERS, MAX_ROASTERS = 10, 100_000
+WRITE_CHUNK_SIZE = 10_000
+
+TASTING_NOTES = [
+    'Chocolate', 'Milk Chocolate', 'Dark Chocolate', 'Caramel', 'Brown Sugar',
+    'Berry', 'Blueberry', 'Strawberry', 'Cherry', 'Cranberry', 'Citrus', 'Lemon',
+    'Orange', 'Grapefruit', 'Lime', 'Stone Fruit', 'Peach', 'Apricot', 'Plum',
+    'Nutty', 'Almond', 'Hazelnut', 'Walnut', 'Honey', 'Molasses', 'Toffee',
+    'Vanilla', 'Floral', 'Jasmine', 'Rose', 'Bergamot', 'Black Tea', 'Green Apple',
+    'Red Apple', 'Pear', 'Grape', 'Raisin', 'Fig', 'Date', 'Tropical', 'Mango',
+    'Pineapple', 'Papaya', 'Passion Fruit', 'Cinnamon', 'Clove', 'Nutmeg',
+    'Baking Spice', 'Maple', 'Marshmallow', 'Graham Cracker', 'Cocoa Nib',
+    'Tobacco', 'Cedar', 'Smoky', 'Earthy', 'Winey', 'Rum', 'Butter', 'Cream',
+]
+ORIGINS = [
+    ('Ethiopia', 18), ('Colombia', 16), ('Brazil', 12), ('Guatemala', 9),
+    ('Kenya', 8), ('Costa Rica', 5), ('Honduras', 5), ('Peru', 5),
+    ('Mexico', 4), ('Rwanda', 3), ('Burundi', 3), ('El Salvador', 3),
+    ('Nicaragua', 2), ('Panama', 2), ('Indonesia', 3), ('Papua New Guinea', 1),
+    ('Tanzania', 2), ('Uganda', 2), ('Yemen', 1), ('India', 1),
+]
+ROAST_LEVELS = [('Light', 20), ('Medium', 45), ('Dark', 18), ('Espresso', 12), ('Vienna', 5)]
+PROCESSING_METHODS = [('Washed', 55), ('Natural', 30), ('Honey', 10), ('Anaerobic', 5)]
+BAG_WEIGHTS = [(250.0, 25), (340.0, 45), (454.0, 15), (1000.0, 10), (2268.0, 5)]
+
+_ROASTER_WORDS = [
+    'Alpine', 'Anchor', 'Birch', 'Blue', 'Bright', 'Canyon', 'Cedar', 'Copper',
+    'Crown', 'Desert', 'Ember', 'Fable', 'Field', 'Golden', 'Granite', 'Harbor',
+    'Heron', 'Highland', 'Iron', 'Juniper', 'Lantern', 'Maple', 'Meridian', 'Mesa',
+    'North', 'Oak', 'Pine', 'Quarry', 'Raven', 'Ridge', 'River', 'Saltwater',
+    'Sierra', 'Slate', 'Summit', 'Thistle', 'Timber', 'Valley', 'Willow', 'Wren',
+]
+_ROASTER_SUFFIXES = ['Coffee', 'Roasters', 'Coffee Co.', 'Roasting Co.', 'Coffee Works', '']
+_BLEND_WORDS = [
+    'Highgate', 'Sermon', 'Hair Bender', 'Holler Mountain', 'Morning', 'Midnight',
+    'Daybreak', 'Founders', 'House', 'Classic', 'Reserve', 'Heritage', 'Harvest',
+    'Sunrise', 'Nightjar', 'Velvet', 'Parlor', 'Decaf', 'Single Origin', 'Seasonal',
+]
+
+
+def _zipf_weights(n: int, s: float = 1.1) -> list[float]:
+    """Long-tail popularity: item k is picked in proportion to 1 / k**s."""
+    return [1 / (k ** s) for k in range(1, n + 1)]
+
+
+def _weighted(pairs):
+    values, weights = zip(*pairs)
+    return list(values), list(accumulate(weights))
+
+
+def _load_places() -> list[tuple[str, str]]:
+    with open(GAZETTEER_CSV, newline='', encoding='utf-8') as f:
+        return [(row['city'], row['state']) for row in csv.DictReader(f)]
+
+
+def _roaster_names(count: int, rng: random.Random) -> list[str]:
+    names, seen = [], set()
+    while len(names) < count:
+        words = ' '.join(rng.sample(_ROASTER_WORDS, rng.choice((1, 1, 2))))
+        name = f"{words} {rng.choice(_ROASTER_SUFFIXES)}".strip()
+        if name in seen:
+            # Past a few thousand the word combinations run out.
+            name = f"{name} {len(names)}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def generate_roasters(path, count: int, rng: random.Random) -> list[str]:
+    """Write `count` roasters to `path` and return their names, most popular first."""
+    places = _load_places()
+    place_weights = list(accumulate(_zipf_weights(len(places), 0.8)))
+    names = _roaster_names(count, rng)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(ROASTERS_HEADER)
+        for start in range(0, count, WRITE_CHUNK_SIZE):
+            rows = []
+            for name in names[start:start + WRITE_CHUNK_SIZE]:
+                city, state = rng.choices(places, cum_weights=place_weights)[0]
+                website = f"https://{name.lower().replace(' ', '').replace('.', '')}.example" \
+                    if rng.random() < 0.6 else ''
+                rows.append((name, city, state, website))
+            writer.writerows(rows)
+    return names
+
+
+def generate_beans(path, count: int, roasters: list[str], rng: random.Random,
+                   end_date: dt.date, years: float = 5.0):
+    """Write `count` bean purchases to `path` in purchase-date order."""
+    roaster_weights = list(accumulate(_zipf_weights(len(roasters))))
+    note_weights = list(accumulate(_zipf_weights(len(TASTING_NOTES), 0.9)))
+    origins, origin_weights = _weighted(ORIGINS)
+    roast_levels, roast_level_weights = _weighted(ROAST_LEVELS)
+    methods, method_weights = _weighted(PROCESSING_METHODS)
+    bag_weights, bag_weight_weights = _weighted(BAG_WEIGHTS)
+    span_days = int(years * 365)
+    start_date = end_date - dt.timedelta(days=span_days)
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(BEANS_HEADER)
+        for start in range(0, count, WRITE_CHUNK_SIZE):
+            rows = []
+            for i in range(start, min(start + WRITE_CHUNK_SIZE, count)):
+                # Purchase rate grows linearly, so the date is sqrt-spaced.
+                purchase = start_date + dt.timedelta(days=int(span_days * ((i + 0.5) / count) ** 0.5))
+                roast = purchase - dt.timedelta(days=rng.randint(2, 30)) if rng.random() < 0.7 else None
+                notes = dict.fromkeys(
+                    rng.choices(TASTING_NOTES, cum_weights=note_weights, k=rng.randint(1, 4))
+                )
+                bean_origins = dict.fromkeys(
+                    rng.choices(origins, cum_weights=origin_weights, k=1 if rng.random() < 0.8 else 2)
+                )
+                rows.append((
+                    purchase.isoformat(),
+                    rng.choices(roasters, cum_weights=roaster_weights)[0],
+                    rng.choice(_BLEND_WORDS) if rng.random() < 0.5 else
+                    f"{next(iter(bean_origins))} {rng.choice(_BLEND_WORDS)}",
+                    rng.choices(roast_levels, cum_weights=roast_level_weights)[0],
+                    roast.isoformat() if roast else '',
+                    rng.choices(bag_weights, cum_weights=bag_weight_weights)[0],
+                    '; '.join(notes),
+                    '; '.join(bean_origins),
+                    rng.choices(methods, cum_weights=method_weights)[0],
+                ))
+            writer.writerows(rows)
+
+
+def generate_dataset(out_dir, beans: int = 10_000, roasters: int = 100, seed: int = 42,
+                     end_date: dt.date = dt.date(2025, 12, 31), years: float = 5.0) -> tuple[Path, Path]:
+    """Generate both CSVs under `out_dir`; the same arguments always give the same files."""
+    if not MIN_BEANS <= beans <= MAX_BEANS:
+        raise ValueError(f"beans must be between {MIN_BEANS:,} and {MAX_BEANS:,}")
+    if not MIN_ROASTERS <= roasters <= MAX_ROASTERS:
+        raise ValueError(f"roasters must be between {MIN_ROASTERS:,} and {MAX_ROASTERS:,}")
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    roasters_csv = out_dir / 'coffee_roasters.csv'
+    beans_csv = out_dir / 'coffee_beans.csv'
+    rng = random.Random(seed)
+    names = generate_roasters(roasters_csv, roasters, rng)
+    generate_beans(beans_csv, beans, names, rng, end_date, years)
+    return roasters_csv, beans_csv
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--beans', type=int, default=10_000)
+    parser.add_argument('--roasters', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--years', type=float, default=5.0)
+    parser.add_argument('--out-dir', default=os.getenv('BENCH_DATA_DIR', 'data/bench'))
+    args = parser.parse_args(argv)
+
+    try:
+        roasters_csv, beans_csv = generate_dataset(
+            args.out_dir, args.beans, args.roasters, args.seed, years=args.years
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+    print(f"Wrote {args.roasters:,} roasters to {roasters_csv} and {args.beans:,} beans to {beans_csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,605 @@
+"""Load-test a locally started gunicorn across worker settings.
+
+    python -m benchmarks.loadtest --workers 1 2 4 --threads 1 4 --duration 20
+    python -m benchmarks.loadtest --worker-classes gthread --workers 2 --threads 8 --concurrency 32
+
+Each configuration gets its own gunicorn on a free local port, started with
+gunicorn.conf.py so the database build and prerender run as in production,
+serving synthetic data from a scratch directory. Virtual users replay browser
+flows: the page shell, `_dash-layout` and `_dash-dependencies`, the routing
+and initial callbacks, then the page's own interactions (panning the map,
+filtering, searching). Throughput, latency percentiles and the resident
+memory of every worker are written as JSON.
+
+The load generator runs on the same machine as the server; on a small box
+give it its own cores (`--processes`) or compare configurations relative to
+each other rather than reading the numbers as absolute capacity.
+"""
+import argparse
+import datetime as dt
+import gzip
+import http.client
+import importlib.util
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .generate_data import generate_dataset
+from .run import _git_commit
+
+DEFAULT_OUTPUT = 'benchmarks/results/loadtest.json'
+REPO_ROOT = Path(__file__).resolve().parent.parent
+WORKER_CLASSES = ('sync', 'gthread', 'gevent', 'eventlet')
+# Worker classes that need a package gunicorn does not install itself.
+WORKER_CLASS_MODULES = {'gevent': 'gevent', 'eventlet': 'eventlet'}
+
+# (flow, path, share of sessions); paths are the registered Dash pages.
+FLOWS = [
+    ('coffee_beans', '/coffee_beans', 0.4),
+    ('home', '/', 0.15),
+    ('search', '/search', 0.2),
+    ('daily_consumption', '/daily_consumption', 0.15),
+    ('brew_tools', '/brew_tools', 0.1),
+]
+SEARCH_TERMS = [
+    'chocolate', 'ethiopia', 'washed', 'berry', 'colombia', 'natural', 'caramel',
+    'kenya', 'espresso', 'citrus', 'honey', 'guatemala', 'light', 'floral',
+]
+
+PAGES_CONTENT_ID = '_pages_content'
+PAGES_LOCATION_ID = '_pages_location'
+DASH_CONFIG_RE = re.compile(rb'<script id="_dash-config" type="application/json">(.*?)</script>', re.S)
+MAP_ID = 'roaster-map'
+CUMULATIVE_WEIGHT_GRAPH_ID = 'cumulative-weight-graph'
+ROASTER_FILTER_ID = 'filter-roasters'
+SEARCH_INPUT_ID = 'bean-search-input'
+
+
+class _Stop(Exception):
+    """The run's deadline passed mid-flow."""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(ordered, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _latency_summary(seconds) -> dict:
+    if not seconds:
+        return {'count': 0}
+    ordered = sorted(seconds)
+    ms = lambda value: round(value * 1000, 2)
+    return {
+        'count': len(ordered),
+        'p50_ms': ms(_percentile(ordered, 50)),
+        'p95_ms': ms(_percentile(ordered, 95)),
+        'p99_ms': ms(_percentile(ordered, 99)),
+        'mean_ms': ms(sum(ordered) / len(ordered)),
+        'max_ms': ms(ordered[-1]),
+    }
+
+
+def _components(tree):
+    """Every component with a string id in a layout tree, as (id, props)."""
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            props = node.get('props')
+            if isinstance(props, dict):
+                if isinstance(props.get('id'), str):
+                    yield props['id'], props
+                stack.extend(value for value in props.values() if isinstance(value, (list, dict)))
+
+
+def _prop_values(tree) -> dict:
+    """{'id.prop': value} for the components in a layout tree, as the renderer holds them."""
+    return {
+        f'{component_id}.{name}': value
+        for component_id, props in _components(tree)
+        for name, value in props.items()
+        if name not in ('id', 'children')
+    }
+
+
+def _split_prop(key: str) -> dict:
+    component_id, prop = key.rsplit('.', 1)
+    return {'id': component_id, 'property': prop}
+
+
+def _callback_body(dependency: dict, values: dict, changed) -> dict:
+    """A `_dash-update-component` payload like the renderer posts for `dependency`."""
+    output = dependency['output']
+    if output.startswith('..'):
+        outputs = [_split_prop(part) for part in output[2:-2].split('...')]
+    else:
+        outputs = _split_prop(output)
+    fill = lambda items: [
+        {**item, 'value': values.get(f"{item['id']}.{item['property']}")} for item in items
+    ]
+    return {
+        'output': output,
+        'outputs': outputs,
+        'inputs': fill(dependency['inputs']),
+        'changedPropIds': list(changed),
+        'state': fill(dependency['state']),
+    }
+
+
+class Page:
+    """One loaded page as the browser holds it: API prefix, callbacks and prop values."""
+
+    def __init__(self, prefix: str, dependencies: list, values: dict):
+        self.prefix = prefix
+        self.dependencies = [dep for dep in dependencies if not dep.get('clientside_function')]
+        self.values = values
+
+
+class VirtualUser:
+    """One browser: a keep-alive connection, replaying flows until the deadline."""
+
+    def __init__(self, port: int, deadline: float, samples: list, seed: int):
+        self.port = port
+        self.deadline = deadline
+        self.samples = samples
+        self.rng = random.Random(seed)
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def request(self, step: str, method: str, path: str, body=None):
+        """Response body, or None on an error; every request is recorded as a sample."""
+        if time.perf_counter() >= self.deadline:
+            raise _Stop
+        headers = {'Accept-Encoding': 'gzip'}
+        if body is not None:
+            body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+            ok = response.status < 400
+            if ok and response.getheader('Content-Encoding') == 'gzip':
+                data = gzip.decompress(data)
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            ok, data = False, None
+        self.samples.append((step, time.perf_counter() - start, ok))
+        return data if ok else None
+
+    def request_json(self, step: str, method: str, path: str, body=None):
+        data = self.request(step, method, path, body)
+        return json.loads(data) if data else None
+
+    def callback(self, step: str, page: Page, changed: dict) -> dict:
+        """Fire the callbacks `changed` triggers, as the renderer would, and apply their outputs."""
+        page.values.update(changed)
+        changed_ids = {key.rsplit('.', 1)[0] for key in changed}
+        outputs = {}
+        for dep in page.dependencies:
+            if not any(item['id'] in changed_ids for item in dep['inputs']):
+                continue
+            result = self.request_json(
+                step, 'POST', page.prefix + '_dash-update-component',
+                _callback_body(dep, page.values, changed)
+            )
+            for output_id, props in ((result or {}).get('response') or {}).items():
+                outputs.setdefault(output_id, {}).update(props)
+        for output_id, props in outputs.items():
+            page.values.update({f'{output_id}.{name}': value for name, value in props.items()})
+        return outputs
+
+    def open_page(self, flow: str, path: str):
+        """Load a page like a fresh tab; None if any step failed."""
+        shell = self.request(f'{flow}.page', 'GET', path)
+        if shell is None:
+            return None
+        match = DASH_CONFIG_RE.search(shell)
+        prefix = json.loads(match.group(1)).get('requests_pathname_prefix', '/') if match else '/'
+        layout = self.request_json(f'{flow}.layout', 'GET', prefix + '_dash-layout')
+        dependencies = self.request_json(f'{flow}.dependencies', 'GET', prefix + '_dash-dependencies')
+        if layout is None or dependencies is None:
+            return None
+        page = Page(prefix, dependencies, _prop_values(layout))
+
+        content = next(
+            (props.get('children') for cid, props in _components(layout) if cid == PAGES_CONTENT_ID), None
+        )
+        if not content:
+            # Not prerendered: the routing callback fetches the page's content.
+            routed = self.callback(f'{flow}.route', page, {
+                f'{PAGES_LOCATION_ID}.pathname': path, f'{PAGES_LOCATION_ID}.search': '',
+            })
+            content = routed.get(PAGES_CONTENT_ID, {}).get('children')
+            if content is None:
+                return None
+            page.values.update(_prop_values(content))
+
+        # Callbacks without prevent_initial_call fire once for the new content.
+        content_ids = {cid for cid, _ in _components(content)}
+        for dep in page.dependencies:
+            if dep.get('prevent_initial_call'):
+                continue
+            if all(item['id'] in content_ids for item in dep['inputs']):
+                self.request(
+                    f'{flow}.initial', 'POST', page.prefix + '_dash-update-component',
+                    _callback_body(dep, page.values, [])
+                )
+        return page
+
+    def coffee_beans(self, page: Page):
+        rng = self.rng
+        # Pan and zoom around the continental US.
+        zoom = rng.randint(4, 8)
+        lat, lon = rng.uniform(30, 45), rng.uniform(-120, -75)
+        span = 40 / 2 ** (zoom - 3)
+        self.callback('coffee_beans.map', page, {
+            f'{MAP_ID}.bounds': [[lat - span / 2, lon - span], [lat + span / 2, lon + span]],
+            f'{MAP_ID}.zoom': zoom,
+        })
+        roasters = [
+            option['value'] if isinstance(option, dict) else option
+            for option in page.values.get(f'{ROASTER_FILTER_ID}.options') or []
+        ]
+        if roasters:
+            # Fires both the count charts and the cumulative weight line.
+            self.callback('coffee_beans.filter', page, {
+                f'{ROASTER_FILTER_ID}.value': rng.sample(roasters, min(len(roasters), rng.randint(1, 3))),
+            })
+        self.callback('coffee_beans.zoom', page, {
+            f'{CUMULATIVE_WEIGHT_GRAPH_ID}.relayoutData': {'xaxis.autorange': True},
+        })
+
+    def search(self, page: Page):
+        term = self.rng.choice(SEARCH_TERMS)
+        # The input is debounced, so a query is typically sent once or twice while typing.
+        for length in sorted({max(3, len(term) // 2), len(term)}):
+            self.callback('search.query', page, {f'{SEARCH_INPUT_ID}.value': term[:length]})
+
+    def run(self, think_seconds: float):
+        names = [flow for flow, _, _ in FLOWS]
+        weights = [weight for _, _, weight in FLOWS]
+        paths = {flow: path for flow, path, _ in FLOWS}
+        try:
+            while True:
+                flow = self.rng.choices(names, weights)[0]
+                page = self.open_page(flow, paths[flow])
+                interact = getattr(self, flow, None)
+                if page is not None and interact is not None:
+                    interact(page)
+                if think_seconds:
+                    time.sleep(self.rng.uniform(0, 2 * think_seconds))
+        except _Stop:
+            pass
+        finally:
+            self.conn.close()
+
+
+def _run_users(port: int, users: int, duration: float, think_seconds: float, seed: int) -> list:
+    """Run `users` virtual users on threads for `duration` seconds; their samples."""
+    deadline = time.perf_counter() + duration
+    samples = []
+    threads = [
+        threading.Thread(
+            target=VirtualUser(port, deadline, samples, seed * 1000 + n).run,
+            args=(think_seconds,), daemon=True
+        )
+        for n in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def generate_load(port: int, concurrency: int, duration: float, processes: int = 1,
+                  think_seconds: float = 0.0, seed: int = 42) -> list:
+    """(step, seconds, ok) for every request made by `concurrency` users over `duration`."""
+    processes = max(1, min(processes, concurrency))
+    if processes == 1:
+        return _run_users(port, concurrency, duration, think_seconds, seed)
+    shares = [concurrency // processes + (n < concurrency % processes) for n in range(processes)]
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        batches = pool.starmap(_run_users, [
+            (port, users, duration, think_seconds, seed + n) for n, users in enumerate(shares)
+        ])
+    return [sample for batch in batches for sample in batch]
+
+
+def _proc_rss_mb(pid: int):
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _children(pid: int) -> list:
+    """Direct children of `pid`, read from /proc (empty where /proc is unavailable)."""
+    children = []
+    for entry in Path('/proc').iterdir() if Path('/proc').is_dir() else ():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # Fields after the parenthesised command name; ppid is the second.
+            stat = (entry / 'stat').read_text().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(stat[1]) == pid:
+            children.append(int(entry.name))
+    return children
+
+
+class RssSampler(threading.Thread):
+    """Peak resident memory of a gunicorn master's workers, sampled while the load runs."""
+
+    def __init__(self, master_pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peak = {}
+        self.stopped = threading.Event()
+
+    def sample(self):
+        for pid in _children(self.master_pid):
+            rss = _proc_rss_mb(pid)
+            if rss is not None:
+                self.peak[pid] = max(rss, self.peak.get(pid, 0.0))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def report(self) -> dict:
+        self.sample()
+        workers = sorted(self.peak.values(), reverse=True)
+        rounded = lambda value: round(value, 1) if value is not None else None
+        return {
+            'master_mb': rounded(_proc_rss_mb(self.master_pid)),
+            'workers_peak_mb': [rounded(value) for value in workers],
+            'worker_max_mb': rounded(workers[0]) if workers else None,
+            'workers_total_mb': rounded(sum(workers)) if workers else None,
+        }
+
+
+def _wait_ready(process, port: int, timeout: float) -> float:
+    """Seconds until the server answers `/` with 200; raises if it exits or times out."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                return time.perf_counter() - start
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conn.close()
+        time.sleep(0.2)
+    raise RuntimeError(f"gunicorn was not ready after {timeout:.0f} s")
+
+
+def _stop(process):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _server_environment(work_dir: Path, roasters_csv: Path, beans_csv: Path,
+                        db_url: str, prerender: bool) -> dict:
+    db_path = work_dir / 'coffee_canary.db'
+    return {
+        **os.environ,
+        'DB_PATH': str(db_path),
+        'DB_URL': db_url or f'sqlite:///{db_path}',
+        'DB_READ_ONLY': 'False',
+        'BUILD_DB_ON_STARTUP': 'True',
+        'COFFEE_ROASTERS_CSV': str(roasters_csv),
+        'COFFEE_BEANS_CSV': str(beans_csv),
+        # Generated roasters geocode from the bundled gazetteer; never the network.
+        'GOOGLE_MAPS_API_KEY': '',
+        'DEBUG': 'False',
+        'PRERENDER_ENABLED': str(prerender),
+        'FIGURE_CACHE_DIR': '',
+    }
+
+
+def run_configuration(env: dict, log_path: Path, worker_class: str, workers: int, threads: int,
+                      args) -> dict:
+    """Start gunicorn with one worker setting, warm it up, load it and report."""
+    port = _free_port()
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+        '-b', f'127.0.0.1:{port}',
+        '-k', worker_class, '-w', str(workers), '--threads', str(threads),
+        'src.app:server',
+    ]
+    with open(log_path, 'ab') as log:
+        process = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        ready_seconds = _wait_ready(process, port, args.startup_timeout)
+        # Every worker builds its page layouts on first use; keep that out of the numbers.
+        generate_load(port, args.concurrency, args.warmup, args.processes, args.think, args.seed)
+
+        sampler = RssSampler(process.pid)
+        sampler.start()
+        samples = generate_load(
+            port, args.concurrency, args.duration, args.processes, args.think, args.seed
+        )
+        sampler.stopped.set()
+        sampler.join()
+        memory = sampler.report()
+    finally:
+        _stop(process)
+
+    steps = {}
+    for step, seconds, ok in samples:
+        entry = steps.setdefault(step, {'seconds': [], 'errors': 0})
+        entry['seconds'].append(seconds)
+        entry['errors'] += not ok
+    errors = sum(not ok for _, _, ok in samples)
+    return {
+        'worker_class': worker_class,
+        'workers': workers,
+        'threads': threads,
+        'ready_seconds': round(ready_seconds, 3),
+        'requests': len(samples),
+        'errors': errors,
+        'rps': round(len(samples) / args.duration, 1),
+        'latency': _latency_summary([seconds for _, seconds, _ in samples]),
+        'steps': {
+            step: {**_latency_summary(entry['seconds']), 'errors': entry['errors']}
+            for step, entry in sorted(steps.items())
+        },
+        'rss': memory,
+    }
+
+
+def configurations(worker_classes, workers, threads):
+    """(class, workers, threads) to run, skipping combinations gunicorn would not honor."""
+    for worker_class, worker_count, thread_count in itertools.product(worker_classes, workers, threads):
+        module = WORKER_CLASS_MODULES.get(worker_class)
+        if module and importlib.util.find_spec(module) is None:
+            continue
+        # gunicorn silently runs sync with threads > 1 as gthread.
+        if worker_class == 'sync' and thread_count > 1:
+            continue
+        yield worker_class, worker_count, thread_count
+
+
+def _print_table(results):
+    print(f"\n{'class':<9}{'workers':>8}{'threads':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'errors':>8}{'max RSS/worker MB':>19}")
+    for result in results:
+        latency = result['latency']
+        print(
+            f"{result['worker_class']:<9}{result['workers']:>8}{result['threads']:>8}"
+            f"{result['rps']:>9.1f}{latency.get('p50_ms', 0):>9.1f}{latency.get('p95_ms', 0):>9.1f}"
+            f"{latency.get('p99_ms', 0):>9.1f}{result['errors']:>8}"
+            f"{result['rss']['worker_max_mb'] or 0:>19.1f}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--worker-classes', nargs='+', choices=WORKER_CLASSES,
+                        default=['sync', 'gthread'],
+                        help='gevent/eventlet run only where the package is installed')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4])
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--concurrency', type=int, default=16, help='simultaneous virtual users')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='load-generator processes the virtual users are spread over')
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds per configuration')
+    parser.add_argument('--warmup', type=float, default=5.0, help='unmeasured seconds before each run')
+    parser.add_argument('--think', type=float, default=0.0,
+                        help='mean pause between flows in seconds; 0 runs users back to back')
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--beans', type=int, default=10_000)
+    parser.add_argument('--roasters', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db-url', default='',
+                        help='serve from this database (e.g. PostgreSQL) instead of a scratch SQLite file')
+    parser.add_argument('--no-prerender', dest='prerender', action='store_false',
+                        help='serve every page live instead of from the prerendered bundles')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch directory and server log')
+    args = parser.parse_args(argv)
+
+    for worker_class in args.worker_classes:
+        module = WORKER_CLASS_MODULES.get(worker_class)
+        if module and importlib.util.find_spec(module) is None:
+            print(f"Skipping {worker_class} workers: {module} is not installed")
+    runs = list(configurations(args.worker_classes, args.workers, args.threads))
+    if not runs:
+        print("No runnable worker configurations (is gevent/eventlet installed?)")
+        return 1
+
+    work_dir = Path(tempfile.mkdtemp(prefix='coffee-canary-load-'))
+    log_path = work_dir / 'gunicorn.log'
+    results = []
+    try:
+        print(f"Generating {args.beans:,} beans / {args.roasters:,} roasters in {work_dir}")
+        roasters_csv, beans_csv = generate_dataset(work_dir, args.beans, args.roasters, args.seed)
+        env = _server_environment(work_dir, roasters_csv, beans_csv, args.db_url, args.prerender)
+
+        for worker_class, workers, threads in runs:
+            print(f"  {worker_class} workers={workers} threads={threads} ...", end=' ', flush=True)
+            try:
+                result = run_configuration(env, log_path, worker_class, workers, threads, args)
+            except RuntimeError as e:
+                print(f"failed: {e} (see {log_path})")
+                args.keep = True
+                continue
+            results.append(result)
+            print(f"{result['rps']:.1f} rps, p99 {result['latency'].get('p99_ms', 0):.1f} ms, "
+                  f"{result['errors']} errors")
+    finally:
+        if args.keep:
+            print(f"Scratch files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not results:
+        return 1
+    _print_table(results)
+
+    report = {
+        'meta': {
+            'timestamp': dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'scale': {'beans': args.beans, 'roasters': args.roasters, 'seed': args.seed},
+            'load': {
+                'concurrency': args.concurrency,
+                'processes': args.processes,
+                'duration_seconds': args.duration,
+                'warmup_seconds': args.warmup,
+                'think_seconds': args.think,
+                'prerender': args.prerender,
+                'database': 'postgresql' if args.db_url.startswith('postgres') else 'sqlite',
+                'flows': {flow: weight for flow, _, weight in FLOWS},
+            },
+        },
+        'results': results,
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n", encoding='utf-8')
+    print(f"Wrote {output}")
+    return 0 if all(result['errors'] == 0 for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
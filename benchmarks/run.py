@@ -0,0 +1,268 @@
+"""Time and measure the memory of the database build, data loaders, plot
+builders and the coffee_beans layout on synthetic data.
+
+    python -m benchmarks.run --beans 100000 --roasters 1000 --output benchmarks/results/latest.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Everything runs against a scratch directory, never data/. Timed repeats run
+without tracing; one extra traced run records peak Python allocations.
+"""
+import argparse
+import contextlib
+import datetime as dt
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from . import compare
+from .generate_data import generate_dataset
+
+DEFAULT_OUTPUT = 'benchmarks/results/latest.json'
+
+
+def _rss_mb():
+    """Current resident set size, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def measure(fn, repeats: int = 3, setup=None) -> dict:
+    """Run `fn` `repeats` times for timing, then once under tracemalloc.
+
+    `setup` runs untimed before every call, e.g. to clear caches.
+    """
+    timings = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    rss_before = _rss_mb()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rss_after = _rss_mb()
+
+    return {
+        'repeats': repeats,
+        'seconds': {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'max': max(timings),
+        },
+        'peak_python_mb': peak / 2**20,
+        'rss_delta_mb': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+    }
+
+
+def _configure_environment(work_dir: Path, roasters_csv: Path, beans_csv: Path) -> Path:
+    """Point the app at the scratch files. Must run before any src import reads its config."""
+    db_path = work_dir / 'coffee_canary.db'
+    os.environ.update({
+        'DB_PATH': str(db_path),
+        'DB_URL': f'sqlite:///{db_path}',
+        'DB_READ_ONLY': 'False',
+        'COFFEE_ROASTERS_CSV': str(roasters_csv),
+        'COFFEE_BEANS_CSV': str(beans_csv),
+        'BUILD_DB_ON_STARTUP': 'False',
+        'FIGURE_CACHE_DIR': '',
+    })
+    return db_path
+
+
+def _remove_db(db_path: Path):
+    for suffix in ('', '-wal', '-shm', '.lock'):
+        Path(f'{db_path}{suffix}').unlink(missing_ok=True)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(roasters_csv: Path, beans_csv: Path, work_dir: Path,
+                   repeats: int = 3, build_repeats: int = 1) -> dict:
+    db_path = _configure_environment(work_dir, roasters_csv, beans_csv)
+
+    from src.db.build_db import setup_db_from_csv
+    from src.db.snapshot import write_snapshots
+    from src.utils import data_helpers, plots
+    from src.utils.consumption import ConsumptionEngine, refresh_engine
+    from src.db.schema import (
+        BEANS_COL_ID, BEANS_COL_PURCHASE_DATE, BEANS_COL_WEIGHT_GRAMS, BEANS_COL_ROASTER
+    )
+    from src.utils.data_cache import clear_data_cache
+    from src.utils.figure_cache import clear_figure_cache
+
+    results = {}
+
+    def record(name, fn, repeats=repeats, setup=None):
+        print(f"  {name} ...", end=' ', flush=True)
+        # The build and loaders report progress; keep it out of the results table.
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results[name] = measure(fn, repeats, setup)
+        print(f"{results[name]['seconds']['median'] * 1000:.1f} ms")
+
+    # A fresh file each time, so every run is a full cold build.
+    scratch_db = work_dir / 'build_scratch.db'
+    record(
+        'setup_db_from_csv.cold',
+        lambda: setup_db_from_csv(str(roasters_csv), str(beans_csv), str(scratch_db)),
+        build_repeats,
+        setup=lambda: _remove_db(scratch_db),
+    )
+    _remove_db(scratch_db)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        setup_db_from_csv(str(roasters_csv), str(beans_csv), str(db_path))
+        # Pages register themselves with the app, so it must exist first.
+        import src.app  # noqa: F401
+    record(
+        'setup_db_from_csv.unchanged',
+        lambda: setup_db_from_csv(str(roasters_csv), str(beans_csv), str(db_path)),
+    )
+
+    record('write_snapshots', lambda: write_snapshots(str(db_path), force=True))
+    # Typed loads read the columnar snapshot the build just wrote.
+    record('load_beans_dataframe', data_helpers.load_beans_dataframe)
+    record('load_roasters_dataframe', data_helpers.load_roasters_dataframe)
+    record('load_beans_dataframe.typed', lambda: data_helpers.load_beans_dataframe(typed=True))
+    record('load_roasters_dataframe.typed', lambda: data_helpers.load_roasters_dataframe(typed=True))
+    # Resident size of the frames themselves, what a worker holding them pays.
+    for name, loader in (
+        ('load_beans_dataframe', data_helpers.load_beans_dataframe),
+        ('load_beans_dataframe.typed', lambda: data_helpers.load_beans_dataframe(typed=True)),
+        ('load_roasters_dataframe', data_helpers.load_roasters_dataframe),
+        ('load_roasters_dataframe.typed', lambda: data_helpers.load_roasters_dataframe(typed=True)),
+    ):
+        results[name]['frame_mb'] = float(data_helpers.memory_report(loader()).loc['total', 'MiB'])
+    roasters_df = data_helpers.load_roasters_dataframe()
+    record('plots.build_roaster_cluster_index', lambda: plots.build_roaster_cluster_index(roasters_df))
+
+    consumption_log = data_helpers.load_beans_dataframe(columns=[
+        BEANS_COL_ID, BEANS_COL_PURCHASE_DATE, BEANS_COL_WEIGHT_GRAMS, BEANS_COL_ROASTER
+    ], typed=True)
+    record('consumption.build', lambda: ConsumptionEngine(consumption_log))
+    # Everything but the last tenth of purchase days, then the rest appended.
+    cutoff = consumption_log[BEANS_COL_PURCHASE_DATE].quantile(0.9)
+    history = ConsumptionEngine(consumption_log[consumption_log[BEANS_COL_PURCHASE_DATE] <= cutoff])
+    record('consumption.refresh_append', lambda: refresh_engine(history, consumption_log))
+
+    # The inputs each plot builder is fed by the dashboard.
+    builder_inputs = {
+        'make_roaster_distribution': data_helpers.load_roaster_counts,
+        'make_roast_level_pie': data_helpers.load_roast_level_counts,
+        'make_cumulative_weight_line': data_helpers.load_cumulative_weight,
+        'make_coffee_notes_distribution': data_helpers.load_top_tasting_notes,
+        'make_daily_consumption_line': lambda: ConsumptionEngine(consumption_log).daily(),
+        'make_roaster_consumption_area': lambda: ConsumptionEngine(consumption_log).by_roaster(),
+        'make_roaster_location_map':
+            lambda: plots.build_roaster_cluster_index(data_helpers.load_roasters_dataframe()),
+    }
+    for name in sorted(n for n in dir(plots) if n.startswith('make_')):
+        loader = builder_inputs.get(name)
+        if loader is None:
+            print(f"  plots.{name}: no input loader registered in benchmarks/run.py, skipped")
+            continue
+        frame = loader()
+        builder = getattr(plots, name)
+        record(f'plots.{name}', lambda: builder(frame), setup=clear_figure_cache)
+
+    from src.pages import coffee_beans, daily_consumption
+
+    def clear_caches():
+        clear_data_cache()
+        clear_figure_cache()
+        daily_consumption._engine = None
+
+    record('coffee_beans.layout.cold', coffee_beans.layout, setup=clear_caches)
+    record('coffee_beans.layout.warm', coffee_beans.layout)
+    record('daily_consumption.layout.cold', daily_consumption.layout, setup=clear_caches)
+
+    record('filter_cube.build', coffee_beans._build_filter_cube)
+    cube = coffee_beans._build_filter_cube()
+    # The last year of one roaster's beans from one origin, bypassing the memo.
+    last_month = cube.month_range[1]
+    key = cube.key((last_month - 11, last_month), cube.roasters[:1], (), cube.origins[:1])
+    record('filter_cube.select', lambda: cube._select(key))
+    results['filter_cube.select']['cells'] = cube.size
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--beans', type=int, default=10_000)
+    parser.add_argument('--roasters', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--build-repeats', type=int, default=1,
+                        help='cold database builds to time; they dominate runtime at scale')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='baseline results file to check for regressions')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch directory')
+    args = parser.parse_args(argv)
+
+    work_dir = Path(tempfile.mkdtemp(prefix='coffee-canary-bench-'))
+    try:
+        print(f"Generating {args.beans:,} beans / {args.roasters:,} roasters in {work_dir}")
+        start = time.perf_counter()
+        roasters_csv, beans_csv = generate_dataset(work_dir, args.beans, args.roasters, args.seed)
+        print(f"  generated in {time.perf_counter() - start:.1f} s")
+
+        print("Running benchmarks:")
+        results = run_benchmarks(roasters_csv, beans_csv, work_dir, args.repeats, args.build_repeats)
+    finally:
+        if args.keep:
+            print(f"Scratch files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': {'beans': args.beans, 'roasters': args.roasters, 'seed': args.seed},
+        },
+        'results': results,
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n", encoding='utf-8')
+    print(f"Wrote {output}")
+
+    if args.compare:
+        return compare.main([args.compare, str(output)])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
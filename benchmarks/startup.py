@@ -0,0 +1,258 @@
+"""Profile worker startup and hold it to a time budget.
+
+    python -m benchmarks.startup                  # report, written as JSON
+    python -m benchmarks.startup --budget 1.5     # exits 1 over budget
+
+Each measurement is a fresh interpreter importing `src.app` the way a
+gunicorn worker does (the database already built, read-only), so module
+caches never hide a cost. The report breaks import time down by package
+(from `python -X importtime`), lists the app's own startup phases, and times
+each page's first layout build, the cost moved from startup to first request,
+against its cached rebuild.
+
+The check fails when the median import exceeds the budget, or when one of
+DEFERRED_MODULES is imported at startup by the app's own code.
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from .generate_data import generate_dataset
+from .run import _git_commit
+
+DEFAULT_OUTPUT = 'benchmarks/results/startup.json'
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# Seconds for a worker to import src.app; roomy for a small VM.
+STARTUP_BUDGET_SECONDS = 1.5
+# Imported on first use only; a `src` module importing one at startup is a regression.
+DEFERRED_MODULES = (
+    'pandas', 'sqlalchemy', 'plotly.express', 'requests', 'src.db.build_db', 'src.db.importer',
+)
+
+# Runs in the measured interpreter; prints its results as JSON on stdout.
+_PROFILE_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import src.app
+import_seconds = time.perf_counter() - start
+
+import dash
+from src.utils.startup import startup_phases
+
+client = src.app.server.test_client()
+start = time.perf_counter()
+client.get('/')
+first_request_seconds = time.perf_counter() - start
+
+pages = {}
+for page in dash.page_registry.values():
+    layout = page['layout']
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        if callable(layout):
+            layout()
+        timings.append(time.perf_counter() - start)
+    pages[page['path']] = {'first_seconds': timings[0], 'cached_seconds': timings[1]}
+
+print(json.dumps({
+    'import_seconds': import_seconds,
+    'phases': dict(startup_phases()),
+    'first_request_seconds': first_request_seconds,
+    'pages': pages,
+}))
+'''
+
+
+def _worker_environment(work_dir: Path, roasters_csv: Path, beans_csv: Path) -> dict:
+    db_path = work_dir / 'coffee_canary.db'
+    return {
+        **os.environ,
+        'DB_PATH': str(db_path),
+        'DB_URL': f'sqlite:///{db_path}',
+        'COFFEE_ROASTERS_CSV': str(roasters_csv),
+        'COFFEE_BEANS_CSV': str(beans_csv),
+        'GOOGLE_MAPS_API_KEY': '',
+        'FIGURE_CACHE_DIR': '',
+        'DEBUG': 'False',
+        # Render-free: the prerendered bundles have their own build step.
+        'PRERENDER_ENABLED': 'False',
+    }
+
+
+def _profile_once(env: dict, importtime: bool = False) -> tuple[dict, str]:
+    """(results, importtime log) from one fresh interpreter."""
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', _PROFILE_SCRIPT]
+    completed = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"profiling src.app failed:\n{completed.stderr[-2000:]}")
+    # The app prints its own progress first; the results are the last line.
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def parse_importtime(log: str) -> list[tuple[str, float, str]]:
+    """(module, self seconds, importing module) per line of `-X importtime` output."""
+    modules = []
+    pending = []  # (depth, index) of modules whose importer is not yet known
+    for line in log.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        # Nesting is two spaces per level after the separator's own space.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append([name.strip(), int(self_us) / 1e6, None])
+        # Lines come after everything they imported, one level deeper.
+        while pending and pending[-1][0] > depth:
+            child_depth, index = pending.pop()
+            if child_depth == depth + 1:
+                modules[index][2] = name.strip()
+        pending.append((depth, len(modules) - 1))
+    return [tuple(module) for module in modules]
+
+
+def _package(module: str) -> str:
+    """Group for the breakdown: the top-level package, or the module itself for the app's own code."""
+    return module if module.startswith('src.') else module.split('.')[0]
+
+
+def import_breakdown(modules, top: int = 15) -> dict:
+    """Seconds of import time per package, largest first."""
+    totals = {}
+    for module, seconds, _ in modules:
+        totals[_package(module)] = totals.get(_package(module), 0.0) + seconds
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return {package: round(seconds, 4) for package, seconds in ranked[:top]}
+
+
+def deferred_violations(modules) -> dict:
+    """{deferred module: importing src module} for those the app imports at startup."""
+    return {
+        module: importer
+        for module, _, importer in modules
+        if module in DEFERRED_MODULES and importer and importer.startswith('src')
+    }
+
+
+def profile_startup(env: dict, repeats: int = 3) -> dict:
+    runs = [_profile_once(env)[0] for _ in range(repeats)]
+    traced, log = _profile_once(env, importtime=True)
+    modules = parse_importtime(log)
+    # Everything after src.app itself was imported by the page builds, on first use.
+    names = [module for module, _, _ in modules]
+    startup = modules[:names.index('src.app') + 1] if 'src.app' in names else modules
+    loaded = {module for module, _, _ in startup}
+    return {
+        'repeats': repeats,
+        'import_seconds': {
+            'median': statistics.median([run['import_seconds'] for run in runs]),
+            'min': min(run['import_seconds'] for run in runs),
+            'max': max(run['import_seconds'] for run in runs),
+        },
+        'phases': {
+            name: statistics.median([run['phases'].get(name, 0.0) for run in runs]) for name in runs[0]['phases']
+        },
+        'first_request_seconds': statistics.median([run['first_request_seconds'] for run in runs]),
+        'pages': {
+            path: {
+                key: statistics.median([run['pages'][path][key] for run in runs])
+                for key in ('first_seconds', 'cached_seconds')
+            }
+            for path in runs[0]['pages']
+        },
+        'imports_by_package': import_breakdown(startup),
+        'first_use_imports_by_package': import_breakdown(modules[len(startup):]),
+        'imported_at_startup': sorted(module for module in DEFERRED_MODULES if module in loaded),
+        'deferred_violations': deferred_violations(startup),
+        'traced_import_seconds': traced['import_seconds'],
+    }
+
+
+def _print_report(report: dict, budget: float):
+    ms = lambda seconds: f"{seconds * 1000:9.1f} ms"
+    imports = report['import_seconds']
+    print(f"\nImporting src.app: {imports['median']:.2f} s median of {report['repeats']} "
+          f"(min {imports['min']:.2f} s, budget {budget:.2f} s)")
+    for name, seconds in report['phases'].items():
+        print(f"  {name:<28}{ms(seconds)}")
+    print("Import time by package (self time, under -X importtime):")
+    for package, seconds in report['imports_by_package'].items():
+        print(f"  {package:<28}{ms(seconds)}")
+    print("Imported later, on first page build:")
+    for package, seconds in list(report['first_use_imports_by_package'].items())[:5]:
+        print(f"  {package:<28}{ms(seconds)}")
+    print(f"First request: {ms(report['first_request_seconds']).strip()}")
+    print("Page init (first build / cached):")
+    for path, timing in report['pages'].items():
+        print(f"  {path:<28}{ms(timing['first_seconds'])} / {ms(timing['cached_seconds']).strip()}")
+    for module, importer in report['deferred_violations'].items():
+        print(f"  {module} imported at startup by {importer}; it should load on first use")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_SECONDS,
+                        help='most seconds a worker may take to import src.app')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--beans', type=int, default=10_000)
+    parser.add_argument('--roasters', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch directory')
+    args = parser.parse_args(argv)
+
+    work_dir = Path(tempfile.mkdtemp(prefix='coffee-canary-startup-'))
+    try:
+        print(f"Generating {args.beans:,} beans / {args.roasters:,} roasters in {work_dir}")
+        roasters_csv, beans_csv = generate_dataset(work_dir, args.beans, args.roasters, args.seed)
+        env = _worker_environment(work_dir, roasters_csv, beans_csv)
+        # Built once up front, as the gunicorn master does before forking.
+        subprocess.run(
+            [sys.executable, '-m', 'src.db.build_db'],
+            cwd=REPO_ROOT, env=env, check=True, stdout=subprocess.DEVNULL
+        )
+        env.update({'BUILD_DB_ON_STARTUP': 'False', 'DB_READ_ONLY': 'True'})
+        print("Profiling startup ...")
+        results = profile_startup(env, args.repeats)
+    finally:
+        if args.keep:
+            print(f"Scratch files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    _print_report(results, args.budget)
+    over_budget = results['import_seconds']['median'] > args.budget
+    report = {
+        'meta': {
+            'timestamp': dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': {'beans': args.beans, 'roasters': args.roasters, 'seed': args.seed},
+            'budget_seconds': args.budget,
+        },
+        'results': results,
+        'passed': not over_budget and not results['deferred_violations'],
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n", encoding='utf-8')
+    print(f"Wrote {output}")
+
+    if over_budget:
+        print(f"FAIL: src.app took {results['import_seconds']['median']:.2f} s to import, "
+              f"over the {args.budget:.2f} s budget")
+    if results['deferred_violations']:
+        print(f"FAIL: {', '.join(results['deferred_violations'])} imported at startup")
+    return 0 if report['passed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
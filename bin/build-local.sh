@@ -29,5 +29,6 @@ if $DEV; then
 else
   echo "→ PROD mode (gunicorn)"
   : "${DEBUG:=False}"   # default DEBUG to False if not set in .env
-  exec "$GUNICORN" -b "${HOST:-127.0.0.1}:${PORT:-8050}" src.app:server
+  # gunicorn.conf.py builds the database once in the master before forking workers
+  exec "$GUNICORN" -c gunicorn.conf.py -b "${HOST:-127.0.0.1}:${PORT:-8050}" src.app:server
 fi
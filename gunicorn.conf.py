@@ -0,0 +1,47 @@
+"""Gunicorn settings for Coffee Canary.
+
+Gunicorn loads this file automatically from the working directory. The
+master process builds the database once before any worker is forked, so
+workers only open the finished database read-only, and then prerenders the
+read-only pages (see src/utils/prerender.py).
+"""
+import os
+import subprocess
+import sys
+import time
+
+# Worker model; gunicorn's own defaults unless set. Measure before changing
+# them: python -m benchmarks.loadtest sweeps all three.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+
+def on_starting(server):
+    from src.db.build_db import build_db_once
+
+    start = time.perf_counter()
+    ok = build_db_once(
+        roasters_csv=os.getenv('COFFEE_ROASTERS_CSV', 'data/coffee_roasters.csv'),
+        beans_csv=os.getenv('COFFEE_BEANS_CSV', 'data/coffee_beans.csv'),
+        db_path=os.getenv('DB_PATH', 'data/coffee_canary.db')
+    )
+    server.log.info(
+        "Database build %s in %.3fs", "finished" if ok else "failed", time.perf_counter() - start
+    )
+
+    if ok and os.getenv('PRERENDER_ENABLED', 'True') == 'True':
+        start = time.perf_counter()
+        # In a child process, so the master never imports the app its workers load.
+        result = subprocess.run(
+            [sys.executable, '-m', 'src.utils.prerender'],
+            env={**os.environ, 'BUILD_DB_ON_STARTUP': 'False', 'DB_READ_ONLY': 'True'},
+        )
+        server.log.info(
+            "Prerender %s in %.3fs", "finished" if result.returncode == 0 else "failed",
+            time.perf_counter() - start
+        )
+
+    # Inherited by every worker forked after this hook.
+    os.environ['BUILD_DB_ON_STARTUP'] = 'False'
+    os.environ['DB_READ_ONLY'] = 'True'
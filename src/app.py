@@ -1,16 +1,44 @@
 import os
 import dash
 import dash_bootstrap_components as dbc
+# Component libraries must be imported before the first request: Dash only
+# serves the JavaScript of those it has seen, and refuses any first imported
+# inside a callback. utils.plots itself imports dash_leaflet lazily.
+import dash_leaflet  # noqa: F401
 from dash import html, dcc
-from src.db.build_db import setup_db_from_csv
+from src.utils.startup import startup_phase, report_startup
+from src.utils.metrics import install_metrics
+from src.utils.bulk_import import install_import
+from src.utils.http_cache import install_http_cache
+from src.utils.prerender import install_prerender
 
-setup_db_from_csv()
-app = dash.Dash(
-    __name__,
-    use_pages=True,
-)
+# Under gunicorn the master builds the database once (see gunicorn.conf.py)
+# and turns this off for the workers it forks.
+if os.getenv('BUILD_DB_ON_STARTUP', 'True') == 'True':
+    # Imported here so workers, which never build, skip the whole pipeline.
+    from src.db.build_db import build_db_once
+
+    with startup_phase('build_db'):
+        build_db_once(
+            roasters_csv=os.getenv('COFFEE_ROASTERS_CSV', 'data/coffee_roasters.csv'),
+            beans_csv=os.getenv('COFFEE_BEANS_CSV', 'data/coffee_beans.csv'),
+            db_path=os.getenv('DB_PATH', 'data/coffee_canary.db')
+        )
+
+with startup_phase('dash_app_and_pages'):
+    app = dash.Dash(
+        __name__,
+        use_pages=True,
+        # Otherwise every page load inlines all pages' layouts (figures included)
+        # for the renderer's dev-tools callback checks, which only run in debug.
+        suppress_callback_exceptions=os.getenv('DEBUG', 'False') != 'True',
+    )
 app.title = "Coffee Canary"
 server = app.server
+install_metrics(server)
+install_import(server)
+install_http_cache(server)
+install_prerender(app)
 
 navbar = html.Nav([
     html.A(
@@ -38,12 +66,18 @@ navbar = html.Nav([
         href="/brew_tools",
         style={"marginRight": "1rem"}
     ),
+    html.A(
+        "Search Beans",
+        href="/search",
+        style={"marginRight": "1rem"}
+    ),
 ])
 
 app.layout = html.Div([
     navbar,
     html.Div(dash.page_container, id="page-container", className="p-3"),
 ])
+report_startup()
 
 if __name__ == "__main__":
     app.run(
@@ -0,0 +1,25 @@
+// Drawing for the server-clustered roaster map (see src/utils/map_clusters.py).
+window.coffeeCanary = Object.assign({}, window.coffeeCanary, {
+    roasterMap: {
+        pointToLayer: function (feature, latlng) {
+            var props = feature.properties;
+            if (!props.cluster) {
+                return L.marker(latlng);
+            }
+            var size = props.count < 10 ? 'small' : props.count < 100 ? 'medium' : 'large';
+            var marker = L.marker(latlng, {
+                icon: L.divIcon({
+                    html: '<div><span>' + props.count + '</span></div>',
+                    className: 'marker-cluster marker-cluster-' + size,
+                    iconSize: L.point(40, 40)
+                })
+            });
+            // Zoom towards a cluster on click; the viewport callback re-clusters.
+            marker.on('click', function (e) {
+                var map = e.target._map;
+                map.setView(latlng, Math.min(map.getZoom() + 2, map.getMaxZoom()));
+            });
+            return marker;
+        }
+    }
+});
@@ -1,3 +1,52 @@
 import os
 
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', 'No Key Found')
+
+DB_PATH = os.getenv('DB_PATH', 'data/coffee_canary.db')
+
+# Geocoding
+GEOCODE_TIMEOUT_SECONDS = float(os.getenv('GEOCODE_TIMEOUT_SECONDS', 5))
+GEOCODE_MAX_WORKERS = int(os.getenv('GEOCODE_MAX_WORKERS', 4))
+GEOCODE_CACHE_TTL_DAYS = float(os.getenv('GEOCODE_CACHE_TTL_DAYS', 90))
+GEOCODE_NEGATIVE_TTL_HOURS = float(os.getenv('GEOCODE_NEGATIVE_TTL_HOURS', 24))
+
+# SQLite connection tuning, applied to every pooled connection
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024))  # negative = KiB
+SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# Metrics and profiling
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 250))
+# Only honored with DEBUG=True: writes a cProfile dump per request to PROFILE_DIR.
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', 'False') == 'True'
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/coffee-canary-profiles')
+
+# Most points a line chart sends to the browser; longer series are downsampled (LTTB).
+LINE_MAX_POINTS = int(os.getenv('LINE_MAX_POINTS', 1000))
+
+# Columnar snapshot (needs pyarrow); defaults to a directory next to the database
+SNAPSHOT_ENABLED = os.getenv('SNAPSHOT_ENABLED', 'True') == 'True'
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', '')
+
+# Bulk import over HTTP (POST /api/import/beans); disabled unless a token is set
+IMPORT_TOKEN = os.getenv('IMPORT_TOKEN', '')
+IMPORT_DIR = os.getenv('IMPORT_DIR', '/tmp/coffee-canary-imports')
+
+# Response compression and ETags (gzip, or brotli when the package is installed)
+COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'True') == 'True'
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+RESPONSE_CACHE_MB = float(os.getenv('RESPONSE_CACHE_MB', 64))
+
+# Static prerender of the read-only pages; empty dir = next to the database
+PRERENDER_ENABLED = os.getenv('PRERENDER_ENABLED', 'True') == 'True'
+PRERENDER_DIR = os.getenv('PRERENDER_DIR', '')
+PRERENDER_PATHS = [
+    path.strip()
+    for path in os.getenv('PRERENDER_PATHS', '/,/coffee_beans,/brew_tools,/daily_consumption').split(',')
+    if path.strip()
+]
+PRERENDER_MAX_AGE = int(os.getenv('PRERENDER_MAX_AGE', 60))
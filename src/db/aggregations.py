@@ -0,0 +1,142 @@
+from .schema import (
+    BEANS_TABLE,
+    BEANS_COL_ID,
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_BLEND_NAME,
+    BEANS_COL_ROAST_LEVEL,
+    BEANS_COL_WEIGHT_GRAMS,
+    BEANS_COL_ROASTER_ID,
+
+    ROASTERS_TABLE,
+    ROASTERS_COL_ID,
+    ROASTERS_COL_NAME,
+    ROASTERS_COL_CITY,
+    ROASTERS_COL_STATE,
+
+    BEAN_TASTING_NOTES_TABLE,
+    BEAN_ORIGINS_TABLE,
+    TOKENS_COL_BEAN_ID,
+    TASTING_NOTES_COL_NOTE,
+    ORIGINS_COL_COUNTRY
+)
+
+# Column names of the aggregated result sets the plots consume.
+AGG_COL_ROAST_LEVEL = 'Roast Level'
+AGG_COL_ROASTER = 'Roaster'
+AGG_COL_COUNT = 'Count'
+AGG_COL_LOCATION = 'Location'
+AGG_COL_CUMULATIVE_WEIGHT = 'cumulative_weight_g'
+AGG_COL_ROASTERS = 'roasters'
+AGG_COL_BLEND_NAMES = 'blend_names'
+AGG_COL_TASTING_NOTE = 'Tasting Note'
+AGG_COL_ORIGIN = 'Origin'
+
+# Values are stripped at ingest, so grouping on the bare column reads the
+# roast_level index in order instead of sorting the table.
+ROAST_LEVEL_COUNTS = f'''
+SELECT
+    {BEANS_COL_ROAST_LEVEL} AS "{AGG_COL_ROAST_LEVEL}",
+    COUNT(*) AS "{AGG_COL_COUNT}"
+FROM {BEANS_TABLE}
+WHERE {BEANS_COL_ROAST_LEVEL} IS NOT NULL AND {BEANS_COL_ROAST_LEVEL} <> ''
+GROUP BY {BEANS_COL_ROAST_LEVEL}
+ORDER BY "{AGG_COL_COUNT}" DESC, "{AGG_COL_ROAST_LEVEL}"
+'''
+
+# Beans linked to a roaster are counted off the (roaster_id, ...) index and
+# joined by id, so spellings of one roaster share a row under its own name;
+# beans naming an unknown roaster are counted by name.
+ROASTER_COUNTS = f'''
+SELECT
+    COALESCE(r.{ROASTERS_COL_NAME}, c.roaster) AS "{AGG_COL_ROASTER}",
+    c.bean_count AS "{AGG_COL_COUNT}",
+    r.{ROASTERS_COL_CITY} || ', ' || r.{ROASTERS_COL_STATE} AS "{AGG_COL_LOCATION}"
+FROM (
+    SELECT {BEANS_COL_ROASTER_ID} AS roaster_id, NULL AS roaster, COUNT(*) AS bean_count
+    FROM {BEANS_TABLE}
+    WHERE {BEANS_COL_ROASTER_ID} IS NOT NULL
+    GROUP BY {BEANS_COL_ROASTER_ID}
+    UNION ALL
+    SELECT NULL, {BEANS_COL_ROASTER}, COUNT(*)
+    FROM {BEANS_TABLE}
+    WHERE {BEANS_COL_ROASTER_ID} IS NULL AND {BEANS_COL_ROASTER} IS NOT NULL
+    GROUP BY {BEANS_COL_ROASTER}
+) AS c
+LEFT JOIN {ROASTERS_TABLE} AS r ON r.{ROASTERS_COL_ID} = c.roaster_id
+ORDER BY c.bean_count DESC, "{AGG_COL_ROASTER}"
+'''
+
+# One row per purchase day with a running total, rather than one per bag.
+CUMULATIVE_WEIGHT_BY_DAY = f'''
+SELECT
+    {BEANS_COL_PURCHASE_DATE},
+    {BEANS_COL_WEIGHT_GRAMS},
+    SUM({BEANS_COL_WEIGHT_GRAMS}) OVER (
+        ORDER BY {BEANS_COL_PURCHASE_DATE}
+        ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+    ) AS {AGG_COL_CUMULATIVE_WEIGHT},
+    {AGG_COL_ROASTERS},
+    {AGG_COL_BLEND_NAMES}
+FROM (
+    SELECT
+        {BEANS_COL_PURCHASE_DATE},
+        SUM({BEANS_COL_WEIGHT_GRAMS}) AS {BEANS_COL_WEIGHT_GRAMS},
+        GROUP_CONCAT({BEANS_COL_ROASTER}, '; ') AS {AGG_COL_ROASTERS},
+        GROUP_CONCAT({BEANS_COL_BLEND_NAME}, '; ') AS {AGG_COL_BLEND_NAMES}
+    FROM (
+        SELECT * FROM {BEANS_TABLE}
+        WHERE {BEANS_COL_PURCHASE_DATE} IS NOT NULL
+        ORDER BY {BEANS_COL_ID}
+    )
+    GROUP BY {BEANS_COL_PURCHASE_DATE}
+)
+ORDER BY {BEANS_COL_PURCHASE_DATE}
+'''
+
+# PostgreSQL spelling: string_agg orders its input itself.
+CUMULATIVE_WEIGHT_BY_DAY_POSTGRES = f'''
+SELECT
+    {BEANS_COL_PURCHASE_DATE},
+    {BEANS_COL_WEIGHT_GRAMS},
+    SUM({BEANS_COL_WEIGHT_GRAMS}) OVER (
+        ORDER BY {BEANS_COL_PURCHASE_DATE}
+        ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+    ) AS {AGG_COL_CUMULATIVE_WEIGHT},
+    {AGG_COL_ROASTERS},
+    {AGG_COL_BLEND_NAMES}
+FROM (
+    SELECT
+        {BEANS_COL_PURCHASE_DATE},
+        SUM({BEANS_COL_WEIGHT_GRAMS}) AS {BEANS_COL_WEIGHT_GRAMS},
+        string_agg({BEANS_COL_ROASTER}, '; ' ORDER BY {BEANS_COL_ID}) AS {AGG_COL_ROASTERS},
+        string_agg({BEANS_COL_BLEND_NAME}, '; ' ORDER BY {BEANS_COL_ID}) AS {AGG_COL_BLEND_NAMES}
+    FROM {BEANS_TABLE}
+    WHERE {BEANS_COL_PURCHASE_DATE} IS NOT NULL
+    GROUP BY {BEANS_COL_PURCHASE_DATE}
+) AS daily
+ORDER BY {BEANS_COL_PURCHASE_DATE}
+'''
+
+# Both are index scans over the (token, bean_id) indexes built at ingest.
+TOP_TASTING_NOTES = f'''
+SELECT {TASTING_NOTES_COL_NOTE} AS "{AGG_COL_TASTING_NOTE}", COUNT(*) AS "{AGG_COL_COUNT}"
+FROM {BEAN_TASTING_NOTES_TABLE}
+GROUP BY {TASTING_NOTES_COL_NOTE}
+ORDER BY "{AGG_COL_COUNT}" DESC, "{AGG_COL_TASTING_NOTE}"
+LIMIT :limit
+'''
+
+TOP_ORIGINS = f'''
+SELECT {ORIGINS_COL_COUNTRY} AS "{AGG_COL_ORIGIN}", COUNT(*) AS "{AGG_COL_COUNT}"
+FROM {BEAN_ORIGINS_TABLE}
+GROUP BY {ORIGINS_COL_COUNTRY}
+ORDER BY "{AGG_COL_COUNT}" DESC, "{AGG_COL_ORIGIN}"
+LIMIT :limit
+'''
+
+# Every (bean, note) pair, for the dashboard's filterable tasting-note cube.
+TASTING_NOTE_PAIRS = f'''
+SELECT {TOKENS_COL_BEAN_ID}, {TASTING_NOTES_COL_NOTE}
+FROM {BEAN_TASTING_NOTES_TABLE}
+'''
@@ -1,102 +1,493 @@
+from contextlib import contextmanager
 from pathlib import Path
+from itertools import islice
+import argparse
 import csv
+import fcntl
+import hashlib
+import os
+import sys
+import time
 
 import sqlite3
 
 from src.db.queries import (
     CREATE_COFFEE_BEANS_TABLE,
     CREATE_COFFEE_ROASTER_TABLE,
+    CREATE_GEOCODE_CACHE_TABLE,
+    CREATE_CSV_FINGERPRINTS_TABLE,
     INSERT_INTO_BEANS_TABLE,
-    INSERT_INTO_ROASTERS_TABLE
-)
-from src.db.schema import (
-    BEANS_TABLE,
-    ROASTERS_TABLE
+    INSERT_INTO_ROASTERS_TABLE,
+    UPDATE_BEANS_ROW,
+    UPDATE_ROASTERS_ROW,
+    SELECT_BEANS_ROW_KEYS,
+    SELECT_ROASTERS_ROW_KEYS,
+    DELETE_BEANS_ROW,
+    DELETE_ROASTERS_ROW,
+    SELECT_CSV_FINGERPRINT,
+    UPSERT_CSV_FINGERPRINT,
+    SELECT_ROASTER_LOCATIONS,
+    UPDATE_ROASTER_COORDINATES,
+    BEAN_TOKEN_TABLES,
+    CREATE_BEAN_TOKEN_TABLES,
+    CREATE_BEAN_TOKEN_TRIGGERS,
+    CREATE_BEANS_TOKENS_PENDING_INDEX,
+    SELECT_BEANS_PENDING_TOKENS,
+    INSERT_BEAN_TOKENS,
+    MARK_BEAN_TOKENS_INDEXED,
+    CREATE_BEANS_FTS_TABLE,
+    CREATE_BEANS_FTS_TRIGGERS,
+    REBUILD_BEANS_FTS,
+    CREATE_ROASTERS_NAME_KEY_INDEX,
+    CREATE_BEANS_INDEXES,
+    CREATE_ROASTER_ID_TRIGGERS,
+    SELECT_UNRESOLVED_BEAN_ROASTERS,
+    SELECT_ROASTER_NAME_KEYS,
+    CREATE_ROASTER_RESOLUTION_TABLE,
+    INSERT_ROASTER_RESOLUTION,
+    APPLY_ROASTER_RESOLUTION,
+    DROP_ROASTER_RESOLUTION_TABLE
 )
+from src.db.schema import BEANS_FTS_TABLE
+from src.config import SQLITE_JOURNAL_MODE
+from src.db.migrations import migrate
+from src.db.normalize import canonical_name, split_multi_value
+from src.db.snapshot import write_snapshots
+from src.utils.db import is_postgres_url
+from src.utils.geocode_cache import geocode_locations
+
+LOAD_CHUNK_SIZE = 5000
 
 
 def create_db(db_path='data/coffee_canary.db'):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
+    # Persistent in the file, so read-only workers inherit it.
+    cursor.execute(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
     cursor.execute(CREATE_COFFEE_ROASTER_TABLE)
     cursor.execute(CREATE_COFFEE_BEANS_TABLE)
+    cursor.execute(CREATE_GEOCODE_CACHE_TABLE)
+    cursor.execute(CREATE_CSV_FINGERPRINTS_TABLE)
+    conn.commit()
+    migrate(conn)
+    for statement in (
+        *CREATE_BEAN_TOKEN_TABLES,
+        *CREATE_BEAN_TOKEN_TRIGGERS,
+        CREATE_BEANS_TOKENS_PENDING_INDEX,
+        CREATE_ROASTERS_NAME_KEY_INDEX,
+        *CREATE_BEANS_INDEXES,
+        *CREATE_ROASTER_ID_TRIGGERS,
+    ):
+        cursor.execute(statement)
+
+    fts_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (BEANS_FTS_TABLE,)
+    ).fetchone()
+    cursor.execute(CREATE_BEANS_FTS_TABLE)
+    for statement in CREATE_BEANS_FTS_TRIGGERS:
+        cursor.execute(statement)
+    if not fts_exists:
+        # Index beans loaded before the search index existed.
+        cursor.execute(REBUILD_BEANS_FTS)
     conn.commit()
     conn.close()
 
 
-def load_roasters_from_csv(
-    csv_path='data/coffee_roasters.csv',
-    db_path='data/coffee_canary.db'
-):
+def _clean(value):
+    return value.strip() if value else None
+
+
+def _row_hash(values) -> str:
+    return hashlib.sha1(
+        "\x1f".join("" if v is None else str(v) for v in values).encode('utf-8')
+    ).hexdigest()
+
+
+def _chunks(iterable, size=LOAD_CHUNK_SIZE):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def csv_fingerprint(cursor, csv_path, select_sql=SELECT_CSV_FINGERPRINT):
+    """Return (unchanged, fingerprint) for a CSV against the last loaded version.
+
+    Size and mtime are checked first; the content hash is only computed when
+    they differ, so a touched-but-identical file is still skipped. The
+    fingerprint is None when the stored one is already current.
+    """
+    stat = Path(csv_path).stat()
+    key = str(Path(csv_path).resolve())
+    stored = cursor.execute(select_sql, (key,)).fetchone()
+    if stored and stored[0] == stat.st_size and stored[1] == stat.st_mtime_ns:
+        return True, None
+
+    sha256 = _file_sha256(csv_path)
+    fingerprint = (key, stat.st_size, stat.st_mtime_ns, sha256)
+    return bool(stored and stored[2] == sha256), fingerprint
+
+
+def _sync_rows(cursor, existing_rows, rows, insert_sql, update_sql, delete_sql):
+    """Diff keyed CSV rows against the table and write only what changed.
+
+    `existing_rows` yields (id, key, hash) for rows owned by this CSV and
+    `rows` yields (key, hash, insert_params, update_params_without_id).
+    Rows that are no longer present in the CSV are deleted.
+    """
+    existing = {}
+    stale_ids = []
+    for row_id, key, row_hash in existing_rows:
+        if key is None or key in existing:
+            stale_ids.append(row_id)
+        else:
+            existing[key] = (row_id, row_hash)
+
+    stats = {'inserted': 0, 'updated': 0, 'skipped': 0, 'deleted': 0}
+    for chunk in _chunks(rows):
+        inserts, updates = [], []
+        for key, row_hash, insert_params, update_params in chunk:
+            current = existing.pop(key, None)
+            if current is None:
+                inserts.append(insert_params)
+            elif current[1] != row_hash:
+                updates.append((*update_params, current[0]))
+            else:
+                stats['skipped'] += 1
+        cursor.executemany(insert_sql, inserts)
+        cursor.executemany(update_sql, updates)
+        stats['inserted'] += len(inserts)
+        stats['updated'] += len(updates)
+
+    stale_ids.extend(row_id for row_id, _ in existing.values())
+    for chunk in _chunks(stale_ids):
+        cursor.executemany(delete_sql, [(row_id,) for row_id in chunk])
+    stats['deleted'] = len(stale_ids)
+    return stats
+
+
+def _load_csv_incrementally(csv_path, db_path, label, sync, force=False):
+    """Run `sync(cursor, reader)` in one transaction unless the CSV is unchanged.
+
+    Returns the load's row counts, or None when the CSV is missing or unchanged.
+    """
     if not Path(csv_path).exists():
         print(f"CSV file {csv_path} does not exist.")
-        return
+        return None
 
-    print("loading roasters from csv...")
-    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path, timeout=30)
     cursor = conn.cursor()
-    cursor.execute(f'DELETE FROM {ROASTERS_TABLE}')
-
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            cursor.execute(INSERT_INTO_ROASTERS_TABLE, (
-                row['name'].strip(),
-                row['city'].strip() if row['city'] else None,
-                row['state'].strip() if row['state'] else None,
-                row['website'].strip() if row['website'] else None
-            ))
+    try:
+        unchanged, fingerprint = csv_fingerprint(cursor, csv_path)
+        if unchanged and not force:
+            print(f"{label} csv unchanged, skipping load.")
+            stats = None
+        else:
+            print(f"loading {label} from csv...")
+            with open(csv_path, 'r', encoding='utf-8') as f:
+                stats = sync(cursor, csv.DictReader(f))
+        # Left untouched otherwise: any write would invalidate the snapshot.
+        if fingerprint is not None:
+            cursor.execute(UPSERT_CSV_FINGERPRINT, (*fingerprint, time.time()))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
-    conn.commit()
-    count = cursor.execute(f'SELECT COUNT(*) FROM {ROASTERS_TABLE}').fetchone()[0]
-    conn.close()
+    return report_load(label, stats, start) if stats is not None else None
+
+
+def report_load(label, stats, start):
+    stats['seconds'] = round(time.perf_counter() - start, 4)
+    print(
+        f"Loaded {label}: {stats['inserted']} inserted, {stats['updated']} updated, "
+        f"{stats['skipped']} skipped, {stats['deleted']} deleted in {stats['seconds']}s"
+    )
+    return stats
+
+
+def roaster_rows(reader):
+    """Key roasters by canonical name; later rows repeating a name are skipped."""
+    seen = set()
+    for row in reader:
+        values = (
+            row['name'].strip(),
+            _clean(row['city']),
+            _clean(row['state']),
+            _clean(row['website'])
+        )
+        name_key = canonical_name(values[0])
+        if name_key is None or name_key in seen:
+            continue
+        seen.add(name_key)
+        row_hash = _row_hash(values)
+        _, city, state, _ = values
+        yield (
+            name_key,
+            row_hash,
+            (*values, row_hash, name_key),
+            (*values, row_hash, name_key, city, state, city, state)
+        )
+
+
+def bean_rows(reader, source):
+    """Key beans by (purchase_date, roaster, blend_name) plus an occurrence count,
+    so a repeat purchase of the same blend on the same day stays distinct."""
+    occurrences = {}
+    for row in reader:
+        values = (
+            _clean(row['purchase_date']),
+            _clean(row['roaster']),
+            _clean(row['blend_name']),
+            _clean(row['roast_level']),
+            _clean(row['roast_date']),
+            float(row['weight_grams']) if row['weight_grams'] else None,
+            _clean(row['tasting_notes']),
+            _clean(row['origin_country']),
+            _clean(row['processing_method'])
+        )
+        natural_key = "\x1f".join(v or "" for v in values[:3])
+        occurrence = occurrences.get(natural_key, 0)
+        occurrences[natural_key] = occurrence + 1
+        row_key = f"{natural_key}\x1f{occurrence}"
+        row_hash = _row_hash(values)
+        yield (
+            row_key,
+            row_hash,
+            (*values, row_key, row_hash, source),
+            (*values, row_hash)
+        )
+
+
+def load_roasters_from_csv(
+    csv_path='data/coffee_roasters.csv',
+    db_path='data/coffee_canary.db',
+    force=False
+):
+    def sync(cursor, reader):
+        return _sync_rows(
+            cursor,
+            cursor.execute(SELECT_ROASTERS_ROW_KEYS).fetchall(),
+            roaster_rows(reader),
+            INSERT_INTO_ROASTERS_TABLE,
+            UPDATE_ROASTERS_ROW,
+            DELETE_ROASTERS_ROW
+        )
 
-    print(f"Loaded roasters into database. Total roasters: {count}")
+    return _load_csv_incrementally(csv_path, db_path, 'roasters', sync, force)
 
 
 def load_beans_from_csv(
     csv_path='data/coffee_beans.csv',
-    db_path='data/coffee_canary.db'
+    db_path='data/coffee_canary.db',
+    force=False
 ):
-    if not Path(csv_path).exists():
-        print(f"CSV file {csv_path} does not exist.")
-        return
+    source = Path(csv_path).name
 
-    print("loading beans from csv...")
-    conn = sqlite3.connect(db_path)
+    def sync(cursor, reader):
+        return _sync_rows(
+            cursor,
+            cursor.execute(SELECT_BEANS_ROW_KEYS, (source,)).fetchall(),
+            bean_rows(reader, source),
+            INSERT_INTO_BEANS_TABLE,
+            UPDATE_BEANS_ROW,
+            DELETE_BEANS_ROW
+        )
+
+    return _load_csv_incrementally(csv_path, db_path, 'coffee beans', sync, force)
+
+
+def index_bean_tokens(db_path='data/coffee_canary.db'):
+    """Split tasting notes, origins and processing methods of new or changed
+    beans into their normalized junction tables."""
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path, timeout=30)
     cursor = conn.cursor()
-    cursor.execute(f'DELETE FROM {BEANS_TABLE}')
-
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            cursor.execute(INSERT_INTO_BEANS_TABLE, (
-                row['purchase_date'].strip() if row['purchase_date'] else None,
-                row['roaster'].strip() if row['roaster'] else None,
-                row['blend_name'].strip() if row['blend_name'] else None,
-                row['roast_level'].strip() if row['roast_level'] else None,
-                row['roast_date'].strip() if row['roast_date'] else None,
-                float(row['weight_grams']) if row['weight_grams'] else None,
-                row['tasting_notes'].strip() if row['tasting_notes'] else None,
-                row['origin_country'].strip() if row['origin_country'] else None,
-                row['processing_method'].strip() if row['processing_method'] else None
-            ))
+    indexed, last_id = 0, 0
+    while rows := cursor.execute(SELECT_BEANS_PENDING_TOKENS, (last_id, LOAD_CHUNK_SIZE)).fetchall():
+        for i, (table, _, _) in enumerate(BEAN_TOKEN_TABLES, start=1):
+            cursor.executemany(INSERT_BEAN_TOKENS[table], [
+                (row[0], token)
+                for row in rows
+                for token in split_multi_value(row[i])
+            ])
+        cursor.executemany(MARK_BEAN_TOKENS_INDEXED, [(row[0],) for row in rows])
+        indexed += len(rows)
+        last_id = rows[-1][0]
+    conn.commit()
+    conn.close()
+
+    if indexed:
+        print(f"Indexed tokens for {indexed} beans in {time.perf_counter() - start:.4f}s")
+
 
+def resolve_bean_roasters(db_path='data/coffee_canary.db'):
+    """Point beans without a roaster_id at the roaster sharing their canonical name.
+
+    Each distinct roaster spelling is canonicalized once in Python; the
+    update itself is a single join in SQLite. Beans naming an unknown
+    roaster stay unlinked and are retried on the next pass.
+    """
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path, timeout=30)
+    cursor = conn.cursor()
+    roaster_ids = dict(cursor.execute(SELECT_ROASTER_NAME_KEYS).fetchall())
+    matches = []
+    for (roaster,) in cursor.execute(SELECT_UNRESOLVED_BEAN_ROASTERS).fetchall():
+        roaster_id = roaster_ids.get(canonical_name(roaster))
+        if roaster_id is not None:
+            matches.append((roaster, roaster_id))
+    resolved = 0
+    if matches:
+        cursor.execute(CREATE_ROASTER_RESOLUTION_TABLE)
+        cursor.executemany(INSERT_ROASTER_RESOLUTION, matches)
+        resolved = cursor.execute(APPLY_ROASTER_RESOLUTION).rowcount
+        cursor.execute(DROP_ROASTER_RESOLUTION_TABLE)
     conn.commit()
-    count = cursor.execute(f'SELECT COUNT(*) FROM {BEANS_TABLE}').fetchone()[0]
     conn.close()
 
-    print(f"Loaded coffee beans into database. Total beans: {count}")
+    if resolved:
+        print(f"Linked {resolved} beans to roasters in {time.perf_counter() - start:.4f}s")
+
+
+def geocode_roasters(db_path='data/coffee_canary.db'):
+    """Fill roaster lat/lon from the geocode cache, fetching only uncached locations."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    city_states = cursor.execute(SELECT_ROASTER_LOCATIONS).fetchall()
+    if not city_states:
+        conn.close()
+        return
+    coords = geocode_locations(
+        [f"{city}, {state}" for city, state in city_states],
+        db_path=db_path
+    )
+    cursor.executemany(UPDATE_ROASTER_COORDINATES, [
+        (*coords.get(f"{city}, {state}", (None, None)), city, state)
+        for city, state in city_states
+    ])
+    conn.commit()
+    located = sum(1 for lat, lon in coords.values() if lat is not None)
+    conn.close()
+
+    print(f"Geocoded roaster locations: {located}/{len(city_states)}")
 
 
 def setup_db_from_csv(
     roasters_csv='data/coffee_roasters.csv',
     beans_csv='data/coffee_beans.csv',
-    db_path='data/coffee_canary.db'
-):
-    create_db()
+    db_path='data/coffee_canary.db',
+    force=False
+) -> bool:
+    create_db(db_path)
     try:
-        load_roasters_from_csv()
-        load_beans_from_csv()
+        load_roasters_from_csv(roasters_csv, db_path, force)
+        load_beans_from_csv(beans_csv, db_path, force)
+        index_bean_tokens(db_path)
+        resolve_bean_roasters(db_path)
+        geocode_roasters(db_path)
+        write_snapshots(db_path)
     except Exception as e:
-        print(f"Error setting up database: {e}")
\ No newline at end of file
+        print(f"Error setting up database: {e}")
+        return False
+    return True
+
+
+@contextmanager
+def build_lock(db_path):
+    """Hold an exclusive lock next to the database file for the duration of a build.
+
+    Yields True to the process that acquired the lock without waiting, and
+    False to processes that had to wait for another build to finish. Bulk
+    imports hold it too, so they never interleave with a build.
+    """
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{db_path}.lock", 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            acquired = True
+        except BlockingIOError:
+            print(f"Waiting for database build in another process (pid {os.getpid()})...")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            acquired = False
+        try:
+            yield acquired
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def build_db_once(
+    roasters_csv='data/coffee_roasters.csv',
+    beans_csv='data/coffee_beans.csv',
+    db_path='data/coffee_canary.db',
+    force=False,
+    db_url=None
+) -> bool:
+    """Build the database, one process at a time.
+
+    Processes that start while a build is running wait for it and then run
+    their own: with the CSVs already loaded it only checks fingerprints,
+    and if the other build failed this one retries it instead of reporting
+    success. `db_url` defaults to DB_URL; a PostgreSQL URL builds there
+    instead, keeping only the geocode cache in the SQLite file at `db_path`.
+    """
+    db_url = os.getenv('DB_URL', '') if db_url is None else db_url
+    if is_postgres_url(db_url):
+        from src.db import postgres
+        return postgres.build_db_once(db_url, roasters_csv, beans_csv, force, geocode_cache_path=db_path)
+
+    with build_lock(db_path):
+        return setup_db_from_csv(roasters_csv, beans_csv, db_path, force)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Coffee Canary database from CSV.")
+    parser.add_argument('--db-path', default=os.getenv('DB_PATH', 'data/coffee_canary.db'))
+    parser.add_argument('--db-url', default=os.getenv('DB_URL', ''),
+                        help="build into this PostgreSQL database instead of the SQLite file")
+    parser.add_argument('--roasters-csv', default=os.getenv('COFFEE_ROASTERS_CSV', 'data/coffee_roasters.csv'))
+    parser.add_argument('--beans-csv', default=os.getenv('COFFEE_BEANS_CSV', 'data/coffee_beans.csv'))
+    parser.add_argument('--force', action='store_true', help="reload CSVs even if unchanged")
+    parser.add_argument('--import', dest='import_path', metavar='PATH',
+                        help="append beans from a CSV or NDJSON file ('-' for stdin) instead of building")
+    parser.add_argument('--format', choices=('csv', 'ndjson'),
+                        help="import format; guessed from the file extension by default")
+    parser.add_argument('--source', default='import', help="source tag stored on imported rows")
+    parser.add_argument('--rejects', metavar='PATH', help="write rejected import rows to this CSV")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.import_path:
+        # Imported lazily: the importer builds on this module.
+        from src.db.importer import import_beans
+        if is_postgres_url(args.db_url):
+            from src.db import postgres
+            with postgres.connect(args.db_url) as conn:
+                postgres.create_db(conn)
+        else:
+            create_db(args.db_path)
+        try:
+            import_beans(args.import_path, args.format, args.db_path, args.source, args.rejects,
+                         db_url=args.db_url)
+        except (OSError, ValueError) as e:
+            print(f"Import failed: {e}")
+            return 1
+        return 0
+
+    ok = build_db_once(args.roasters_csv, args.beans_csv, args.db_path, args.force, args.db_url)
+    print(f"Database build {'finished' if ok else 'failed'} in {time.perf_counter() - start:.3f}s")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
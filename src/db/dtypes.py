@@ -0,0 +1,95 @@
+import pandas as pd
+
+from .schema import (
+    BEANS_TABLE,
+    BEANS_COL_ID,
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_BLEND_NAME,
+    BEANS_COL_ROAST_LEVEL,
+    BEANS_COL_ROAST_DATE,
+    BEANS_COL_WEIGHT_GRAMS,
+    BEANS_COL_TASTING_NOTES,
+    BEANS_COL_ORIGIN_COUNTRY,
+    BEANS_COL_PROCESSING_METHOD,
+    BEANS_COL_ROW_KEY,
+    BEANS_COL_ROW_HASH,
+    BEANS_COL_SOURCE,
+    BEANS_COL_TOKENS_INDEXED,
+    BEANS_COL_ROASTER_ID,
+    ROASTERS_TABLE,
+    ROASTERS_COL_ID,
+    ROASTERS_COL_NAME,
+    ROASTERS_COL_CITY,
+    ROASTERS_COL_STATE,
+    ROASTERS_COL_COUNTRY,
+    ROASTERS_COL_LAT,
+    ROASTERS_COL_LON,
+    ROASTERS_COL_WEBSITE,
+    ROASTERS_COL_ROW_HASH,
+    ROASTERS_COL_NAME_KEY,
+    BEAN_TASTING_NOTES_TABLE,
+    TOKENS_COL_BEAN_ID,
+    TASTING_NOTES_COL_NOTE
+)
+
+# Declared column types for typed loading and the columnar snapshot.
+# Low-cardinality text is categorical, dates are parsed once at load rather
+# than in every plot. 'str' is Arrow-backed when pyarrow is installed.
+BEANS_DTYPES = {
+    BEANS_COL_ID: 'int64',
+    BEANS_COL_PURCHASE_DATE: 'datetime64[ns]',
+    BEANS_COL_ROASTER: 'category',
+    BEANS_COL_BLEND_NAME: 'category',
+    BEANS_COL_ROAST_LEVEL: 'category',
+    BEANS_COL_ROAST_DATE: 'datetime64[ns]',
+    BEANS_COL_WEIGHT_GRAMS: 'float32',
+    BEANS_COL_TASTING_NOTES: 'str',
+    BEANS_COL_ORIGIN_COUNTRY: 'category',
+    BEANS_COL_PROCESSING_METHOD: 'category',
+    BEANS_COL_ROW_KEY: 'str',
+    BEANS_COL_ROW_HASH: 'str',
+    BEANS_COL_SOURCE: 'category',
+    BEANS_COL_TOKENS_INDEXED: 'int8',
+    BEANS_COL_ROASTER_ID: 'int64',
+}
+ROASTERS_DTYPES = {
+    ROASTERS_COL_ID: 'int64',
+    ROASTERS_COL_NAME: 'str',
+    ROASTERS_COL_CITY: 'category',
+    ROASTERS_COL_STATE: 'category',
+    ROASTERS_COL_COUNTRY: 'category',
+    ROASTERS_COL_LAT: 'float64',
+    ROASTERS_COL_LON: 'float64',
+    ROASTERS_COL_WEBSITE: 'str',
+    ROASTERS_COL_ROW_HASH: 'str',
+    ROASTERS_COL_NAME_KEY: 'str',
+}
+BEAN_TASTING_NOTES_DTYPES = {
+    TOKENS_COL_BEAN_ID: 'int64',
+    TASTING_NOTES_COL_NOTE: 'category',
+}
+TABLE_DTYPES = {
+    BEANS_TABLE: BEANS_DTYPES,
+    ROASTERS_TABLE: ROASTERS_DTYPES,
+    BEAN_TASTING_NOTES_TABLE: BEAN_TASTING_NOTES_DTYPES,
+}
+
+
+def apply_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """Cast the declared columns present in `df`; unparseable values become missing."""
+    converted = {}
+    for col in df.columns:
+        dtype = dtypes.get(col)
+        if dtype is None or str(df[col].dtype) == dtype:
+            continue
+        if dtype.startswith('datetime64'):
+            # Pin the unit so every load path agrees on the dtype.
+            converted[col] = pd.to_datetime(df[col], errors='coerce', format='ISO8601').astype(dtype)
+        elif dtype.startswith(('float', 'int')):
+            values = pd.to_numeric(df[col], errors='coerce')
+            # Integer columns with gaps can only be held as floats.
+            converted[col] = values if dtype.startswith('int') and values.isna().any() else values.astype(dtype)
+        else:
+            converted[col] = df[col].astype(dtype)
+    return df.assign(**converted) if converted else df
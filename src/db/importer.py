@@ -0,0 +1,237 @@
+"""Streaming bulk import of bean purchases from CSV or NDJSON.
+
+Input is read in chunks of IMPORT_CHUNK_SIZE rows. Each chunk is validated
+and coerced with vectorized pandas operations and committed as its own
+transaction, so memory stays flat however long the input is, and with WAL
+the dashboard keeps reading throughout. Rows that fail validation are
+reported with their row number and reason instead of failing the import.
+
+Imported rows are tagged with their own `source`, so the CSV sync in
+build_db never treats them as rows deleted from coffee_beans.csv.
+
+Given a PostgreSQL `db_url`, each chunk is sent with COPY instead of
+batched INSERTs, along with its search tokens and roaster links.
+"""
+import csv
+import io
+from contextlib import closing
+import sqlite3
+import sys
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from src.db.build_db import build_lock, index_bean_tokens, resolve_bean_roasters
+from src.db.queries import INSERT_INTO_BEANS_TABLE
+from src.db.snapshot import write_snapshots
+from src.utils.db import is_postgres_url
+from src.db.schema import (
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_BLEND_NAME,
+    BEANS_COL_ROAST_LEVEL,
+    BEANS_COL_ROAST_DATE,
+    BEANS_COL_WEIGHT_GRAMS,
+    BEANS_COL_TASTING_NOTES,
+    BEANS_COL_ORIGIN_COUNTRY,
+    BEANS_COL_PROCESSING_METHOD
+)
+
+IMPORT_CHUNK_SIZE = 20_000
+IMPORT_FORMATS = ('csv', 'ndjson')
+DEFAULT_IMPORT_SOURCE = 'import'
+
+# In INSERT_INTO_BEANS_TABLE order.
+IMPORT_COLUMNS = [
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_BLEND_NAME,
+    BEANS_COL_ROAST_LEVEL,
+    BEANS_COL_ROAST_DATE,
+    BEANS_COL_WEIGHT_GRAMS,
+    BEANS_COL_TASTING_NOTES,
+    BEANS_COL_ORIGIN_COUNTRY,
+    BEANS_COL_PROCESSING_METHOD,
+]
+REQUIRED_COLUMNS = [BEANS_COL_PURCHASE_DATE, BEANS_COL_ROASTER]
+DATE_COLUMNS = [BEANS_COL_PURCHASE_DATE, BEANS_COL_ROAST_DATE]
+
+
+def format_for(name: str, default: str = 'csv') -> str:
+    """Import format implied by a file name or content type."""
+    name = (name or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in name or 'jsonl' in name:
+        return 'ndjson'
+    if name.endswith('.csv') or 'csv' in name:
+        return 'csv'
+    return default
+
+
+def _read_chunks(stream, fmt: str, chunk_size: int):
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or not hasattr(stream, 'encoding'):
+        stream = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        # Everything as text; coercion happens per chunk with row-level rejects.
+        try:
+            return pd.read_csv(stream, chunksize=chunk_size, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            return iter(())
+    if fmt == 'ndjson':
+        return pd.read_json(stream, lines=True, chunksize=chunk_size, dtype=False, convert_dates=False)
+    raise ValueError(f"Unsupported import format '{fmt}'; expected one of {', '.join(IMPORT_FORMATS)}")
+
+
+def _text(series: pd.Series) -> pd.Series:
+    text = series.astype('string').str.strip()
+    return text.mask(text == '')
+
+
+def _coerce_chunk(chunk: pd.DataFrame, first_row: int):
+    """(valid rows, their positions in the chunk, rejects) for one chunk.
+
+    Rejects are (row, reason) pairs, rows numbered from 1 over data rows only.
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+    if missing:
+        raise ValueError(f"Import is missing required columns: {', '.join(missing)}")
+
+    df = chunk.reindex(columns=IMPORT_COLUMNS)
+    values = {col: _text(df[col]) for col in IMPORT_COLUMNS}
+    dates = {
+        col: pd.to_datetime(values[col], errors='coerce', format='ISO8601')
+        for col in DATE_COLUMNS
+    }
+    weight = pd.to_numeric(values[BEANS_COL_WEIGHT_GRAMS], errors='coerce')
+
+    present = {col: values[col].notna().to_numpy(dtype=bool) for col in IMPORT_COLUMNS}
+    rules = [
+        (~present[BEANS_COL_PURCHASE_DATE], f'{BEANS_COL_PURCHASE_DATE} is required'),
+        (present[BEANS_COL_PURCHASE_DATE] & dates[BEANS_COL_PURCHASE_DATE].isna().to_numpy(),
+         f'{BEANS_COL_PURCHASE_DATE} is not a date'),
+        (~present[BEANS_COL_ROASTER], f'{BEANS_COL_ROASTER} is required'),
+        (present[BEANS_COL_ROAST_DATE] & dates[BEANS_COL_ROAST_DATE].isna().to_numpy(),
+         f'{BEANS_COL_ROAST_DATE} is not a date'),
+        (present[BEANS_COL_WEIGHT_GRAMS] & ~(weight > 0).fillna(False).to_numpy(dtype=bool),
+         f'{BEANS_COL_WEIGHT_GRAMS} must be a positive number'),
+    ]
+    rejected = np.logical_or.reduce([mask for mask, _ in rules])
+    rejects = [
+        (first_row + int(pos), '; '.join(reason for mask, reason in rules if mask[pos]))
+        for pos in np.flatnonzero(rejected)
+    ]
+
+    for col in DATE_COLUMNS:
+        values[col] = dates[col].dt.strftime('%Y-%m-%d')
+    values[BEANS_COL_WEIGHT_GRAMS] = weight
+    valid = pd.DataFrame(values)[~rejected]
+    return valid.astype(object).where(valid.notna(), None), np.flatnonzero(~rejected), rejects
+
+
+def iter_import(stream, fmt: str = 'csv', db_path='data/coffee_canary.db',
+                source: str = DEFAULT_IMPORT_SOURCE, chunk_size: int = IMPORT_CHUNK_SIZE,
+                db_url=None):
+    """Import beans from `stream`, yielding event dicts as it goes.
+
+    Events are {'event': 'reject', 'row', 'reason'} per rejected row and
+    {'event': 'progress', ...} after each committed chunk; the last is
+    {'event': 'done', ...} with the final counts. `stream` may be text or bytes.
+    `db_path` is written unless `db_url` names a PostgreSQL database.
+
+    The whole import, post-processing included, holds the build lock, so it
+    waits for a running build or import and neither sees the other's half.
+    """
+    start = time.perf_counter()
+    # Keys only need to be unique; tie each row to this import and its position.
+    import_id = uuid.uuid4().hex[:12]
+    report = {'source': source, 'rows': 0, 'inserted': 0, 'rejected': 0}
+    postgres = None
+    if is_postgres_url(db_url):
+        from src.db import postgres
+        connection = postgres.connect(db_url)
+    else:
+        connection = closing(sqlite3.connect(db_path, timeout=30))
+    with connection as conn, (postgres.build_lock(conn) if postgres else build_lock(db_path)):
+        for chunk in _read_chunks(stream, fmt, chunk_size):
+            first_row = report['rows'] + 1
+            valid, positions, rejects = _coerce_chunk(chunk, first_row)
+            rows = list(valid.itertuples(index=False, name=None))
+            hashes = pd.util.hash_pandas_object(valid, index=False).to_numpy()
+            params = [
+                (*row, f"{row[0]}\x1f{row[1]}\x1f{row[2] or ''}\x1f{import_id}:{first_row + pos}",
+                 format(int(row_hash), '016x'), source)
+                for pos, row, row_hash in zip(positions, rows, hashes)
+            ]
+            if postgres is not None:
+                postgres.insert_beans(conn, params)
+            else:
+                with conn:
+                    conn.executemany(INSERT_INTO_BEANS_TABLE, params)
+
+            report['rows'] += len(chunk)
+            report['inserted'] += len(params)
+            report['rejected'] += len(rejects)
+            for row, reason in rejects:
+                yield {'event': 'reject', 'row': row, 'reason': reason}
+            yield {'event': 'progress', **report, 'seconds': round(time.perf_counter() - start, 3)}
+
+        # On PostgreSQL each chunk was written with its tokens and roaster links.
+        if report['inserted'] and postgres is None:
+            # Search tokens, roaster links and the columnar snapshot follow the new rows.
+            index_bean_tokens(db_path)
+            resolve_bean_roasters(db_path)
+            write_snapshots(db_path)
+    yield {'event': 'done', **report, 'seconds': round(time.perf_counter() - start, 3)}
+
+
+def import_beans(path, fmt=None, db_path='data/coffee_canary.db',
+                 source: str = DEFAULT_IMPORT_SOURCE, rejects_path=None,
+                 chunk_size: int = IMPORT_CHUNK_SIZE, db_url=None) -> dict:
+    """Import a CSV/NDJSON file ('-' for stdin), printing progress; returns the final counts.
+
+    Rejected rows go to `rejects_path` as CSV (row, reason) if given,
+    otherwise the first few are printed.
+    """
+    fmt = fmt or format_for(str(path))
+    stream = sys.stdin.buffer if str(path) == '-' else open(path, 'rb')
+    rejects_file = open(rejects_path, 'w', newline='', encoding='utf-8') if rejects_path else None
+    rejects_writer = csv.writer(rejects_file) if rejects_file else None
+    if rejects_writer:
+        rejects_writer.writerow(['row', 'reason'])
+    printed_rejects = 0
+    report = None
+    try:
+        for event in iter_import(stream, fmt, db_path, source, chunk_size, db_url):
+            if event['event'] == 'reject':
+                if rejects_writer:
+                    rejects_writer.writerow([event['row'], event['reason']])
+                elif printed_rejects < 20:
+                    print(f"  row {event['row']} rejected: {event['reason']}")
+                    printed_rejects += 1
+            elif event['event'] == 'progress':
+                print(
+                    f"  {event['rows']:,} rows read, {event['inserted']:,} imported, "
+                    f"{event['rejected']:,} rejected ({event['seconds']:.1f}s)"
+                )
+            else:
+                report = event
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+        if rejects_file:
+            rejects_file.close()
+
+    print(
+        f"Imported beans from {path}: {report['inserted']} inserted, "
+        f"{report['rejected']} rejected in {report['seconds']}s"
+    )
+    return report
+
+
+__all__ = [
+    'IMPORT_FORMATS',
+    'format_for',
+    'iter_import',
+    'import_beans',
+]
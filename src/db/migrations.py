@@ -0,0 +1,110 @@
+"""In-place upgrades for database files built by earlier versions.
+
+`PRAGMA user_version` records the last step applied. Each step brings a
+database at the previous version up to its own; steps are idempotent, so an
+interrupted upgrade can simply run again. New files go through every step
+too, which for them is a no-op apart from stamping the version.
+"""
+import sqlite3
+
+from src.db.normalize import canonical_name
+from src.db.schema import (
+    BEANS_TABLE,
+    BEANS_COL_ROW_KEY,
+    BEANS_COL_ROW_HASH,
+    BEANS_COL_SOURCE,
+    BEANS_COL_TOKENS_INDEXED,
+    BEANS_COL_ROASTER_ID,
+    ROASTERS_TABLE,
+    ROASTERS_COL_ID,
+    ROASTERS_COL_NAME,
+    ROASTERS_COL_LAT,
+    ROASTERS_COL_LON,
+    ROASTERS_COL_ROW_HASH,
+    ROASTERS_COL_NAME_KEY
+)
+
+
+def _add_missing_columns(cursor, table, columns):
+    """Add columns introduced after a database file was first created."""
+    existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+    for name, col_type in columns.items():
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {col_type}')
+
+
+def _incremental_load_columns(cursor):
+    _add_missing_columns(cursor, ROASTERS_TABLE, {
+        ROASTERS_COL_LAT: 'REAL',
+        ROASTERS_COL_LON: 'REAL',
+        ROASTERS_COL_ROW_HASH: 'TEXT',
+    })
+    _add_missing_columns(cursor, BEANS_TABLE, {
+        BEANS_COL_ROW_KEY: 'TEXT',
+        BEANS_COL_ROW_HASH: 'TEXT',
+        BEANS_COL_SOURCE: 'TEXT',
+        BEANS_COL_TOKENS_INDEXED: 'INTEGER NOT NULL DEFAULT 0',
+    })
+
+
+def _roaster_keys(cursor):
+    """Canonical roaster names and the beans -> roasters foreign key.
+
+    Roasters sharing a canonical name are collapsed to the oldest row, as a
+    CSV reload would do, so the unique index on name_key can be built.
+    Beans are linked afterwards by the regular resolve pass.
+    """
+    _add_missing_columns(cursor, ROASTERS_TABLE, {ROASTERS_COL_NAME_KEY: 'TEXT'})
+    _add_missing_columns(cursor, BEANS_TABLE, {
+        BEANS_COL_ROASTER_ID: f'INTEGER REFERENCES {ROASTERS_TABLE}({ROASTERS_COL_ID})',
+    })
+    keys, seen, duplicates = {}, set(), []
+    rows = cursor.execute(
+        f'SELECT {ROASTERS_COL_ID}, {ROASTERS_COL_NAME} FROM {ROASTERS_TABLE} ORDER BY {ROASTERS_COL_ID}'
+    ).fetchall()
+    for roaster_id, name in rows:
+        key = canonical_name(name)
+        if key is not None and key in seen:
+            duplicates.append((roaster_id,))
+            continue
+        seen.add(key)
+        keys[roaster_id] = key
+    cursor.executemany(f'DELETE FROM {ROASTERS_TABLE} WHERE {ROASTERS_COL_ID} = ?', duplicates)
+    cursor.executemany(
+        f'UPDATE {ROASTERS_TABLE} SET {ROASTERS_COL_NAME_KEY} = ? WHERE {ROASTERS_COL_ID} = ?',
+        [(key, roaster_id) for roaster_id, key in keys.items()]
+    )
+    if duplicates:
+        print(f"Removed {len(duplicates)} roasters duplicating another roaster's name")
+
+
+# (version, description, step); append only, never renumber.
+MIGRATIONS = [
+    (1, 'incremental load columns', _incremental_load_columns),
+    (2, 'roaster name keys and roaster_id', _roaster_keys),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations to an open database; returns the version it started at."""
+    cursor = conn.cursor()
+    current = cursor.execute('PRAGMA user_version').fetchone()[0]
+    if current > SCHEMA_VERSION:
+        print(f"Database schema v{current} is newer than this code (v{SCHEMA_VERSION}); not migrating.")
+        return current
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step(cursor)
+        cursor.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+        print(f"Migrated database schema to v{version}: {description}")
+    return current
+
+
+__all__ = [
+    'MIGRATIONS',
+    'SCHEMA_VERSION',
+    'migrate',
+]
@@ -0,0 +1,30 @@
+import unicodedata
+
+
+def normalize_token(value: str) -> str:
+    """Collapse whitespace and case so 'Milk  Chocolate' and 'milk chocolate' match."""
+    return " ".join(value.split()).casefold()
+
+
+def split_multi_value(value, sep: str = ';') -> list[str]:
+    """Split a semicolon-packed field into unique, normalized tokens in order."""
+    if not value or not isinstance(value, str):
+        return []
+    tokens = []
+    for part in value.split(sep):
+        token = normalize_token(part)
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def canonical_name(value) -> str | None:
+    """Matching key for a roaster name: 'Blue Bottle', 'bluebottle' and 'BLUE  BOTTLE' agree.
+
+    Case, spacing, punctuation and '&' versus 'and' are ignored.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    text = unicodedata.normalize('NFKC', value).casefold().replace('&', ' and ')
+    key = ''.join(ch for ch in text if ch.isalnum())
+    return key or None
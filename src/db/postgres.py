@@ -0,0 +1,413 @@
+"""PostgreSQL backend for the database build and bulk import.
+
+Selected whenever DB_URL names a PostgreSQL database; the dashboard itself
+reads through SQLAlchemy either way. Rows are computed exactly as for
+SQLite (same keys, hashes and canonical names), into the schema queries.py
+defines for both backends, but written in bulk:
+
+- CSV loads and imports COPY rows into a temp staging table, then apply
+  them with set-based DELETE, UPDATE and INSERT statements in one
+  transaction. Beans are staged with their roaster_id already resolved.
+- The tokens of the beans just written are read back through a
+  server-side cursor and COPYed into the junction tables in the same
+  transaction, so no bean row is rewritten after its load.
+
+The schema is created at the current version (migrations.py upgrades SQLite
+files only). Builds are serialized with an advisory lock instead of a lock
+file, there is no Arrow snapshot, and the geocode cache stays in the local
+SQLite file at DB_PATH, shared with SQLite builds.
+"""
+import csv
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from src.db.build_db import LOAD_CHUNK_SIZE, bean_rows, csv_fingerprint, report_load, roaster_rows
+from src.db.normalize import canonical_name, split_multi_value
+from src.db.queries import (
+    BEAN_TOKEN_TABLES,
+    BEANS_INSERT_COLUMNS,
+    ROASTERS_INSERT_COLUMNS,
+    CREATE_TABLES_POSTGRES,
+    CREATE_INDEXES_POSTGRES,
+    ROASTERS_STAGE_TABLE,
+    BEANS_STAGE_TABLE,
+    CREATE_ROASTERS_STAGE,
+    CREATE_BEANS_STAGE,
+    CREATE_TOUCHED_BEANS,
+    DELETE_STALE_ROASTERS,
+    UPDATE_CHANGED_ROASTERS,
+    INSERT_NEW_ROASTERS,
+    DELETE_STALE_BEANS,
+    UPDATE_CHANGED_BEANS,
+    DELETE_TOUCHED_BEAN_TOKENS,
+    INSERT_STAGED_BEANS,
+    INSERT_NEW_STAGED_BEANS,
+    SELECT_TOUCHED_BEAN_TOKENS,
+    SELECT_BEANS_PENDING_TOKENS_POSTGRES,
+    DELETE_PENDING_BEAN_TOKENS,
+    MARK_BEAN_TOKENS_INDEXED_POSTGRES,
+    SELECT_CSV_FINGERPRINT,
+    UPSERT_CSV_FINGERPRINT,
+    SELECT_ROASTER_LOCATIONS,
+    UPDATE_ROASTER_COORDINATES,
+    SELECT_UNRESOLVED_BEAN_ROASTERS,
+    SELECT_ROASTER_NAME_KEYS,
+    CREATE_ROASTER_RESOLUTION_TABLE,
+    APPLY_ROASTER_RESOLUTION,
+    DROP_ROASTER_RESOLUTION_TABLE
+)
+from src.db.schema import BEANS_TABLE, BEANS_COL_ROASTER_ID, ROASTERS_TABLE, TOKENS_COL_BEAN_ID
+from src.utils.db import engine_url, is_postgres_url
+from src.utils.geocode_cache import geocode_locations
+
+# Any constant works, as long as every process building the same database uses it.
+BUILD_LOCK_KEY = zlib.crc32(b'coffee_canary.build')
+
+def _pg(sql: str) -> str:
+    """A statement shared with SQLite, with psycopg's placeholders."""
+    return sql.replace('?', '%s')
+
+
+@contextmanager
+def connect(db_url: str):
+    """A psycopg connection from a SQLAlchemy engine for `db_url`, closed on exit.
+
+    COPY is driver-specific, so the build works on the DBAPI connection
+    underneath the engine.
+    """
+    engine = create_engine(engine_url(db_url), poolclass=NullPool)
+    if engine.dialect.driver != 'psycopg':
+        raise ValueError(
+            f"PostgreSQL builds need the psycopg 3 driver, not {engine.dialect.driver}; "
+            "use a postgresql+psycopg:// URL"
+        )
+    raw = engine.raw_connection()
+    try:
+        yield raw.driver_connection
+    finally:
+        raw.close()
+        engine.dispose()
+
+
+def copy_rows(cursor, table: str, columns: list[str], rows) -> int:
+    """Stream `rows` into `table` with COPY FROM STDIN; returns how many were sent."""
+    count = 0
+    with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+            count += 1
+    return count
+
+
+def create_db(conn, defer_indexes=False):
+    """Create missing tables and indexes.
+
+    With `defer_indexes`, a database without beans gets its indexes from
+    `create_indexes` after the first load instead: building them once over
+    the loaded rows is faster than maintaining them row by row.
+    """
+    with conn.cursor() as cursor:
+        for statement in CREATE_TABLES_POSTGRES:
+            cursor.execute(statement)
+        empty = cursor.execute(f'SELECT NOT EXISTS (SELECT 1 FROM {BEANS_TABLE})').fetchone()[0]
+    conn.commit()
+    if not (defer_indexes and empty):
+        create_indexes(conn)
+
+
+def create_indexes(conn):
+    with conn.cursor() as cursor:
+        for statement in CREATE_INDEXES_POSTGRES:
+            cursor.execute(statement)
+    conn.commit()
+
+
+def vacuum_analyze(conn):
+    """Refresh planner statistics and the visibility map after a load, so the
+    covering indexes answer with index-only scans straight away."""
+    conn.commit()
+    conn.autocommit = True
+    try:
+        for table in (ROASTERS_TABLE, BEANS_TABLE, *(table for table, _, _ in BEAN_TOKEN_TABLES)):
+            conn.execute(f'VACUUM (ANALYZE) {table}')
+    finally:
+        conn.autocommit = False
+
+
+def _load_csv_incrementally(conn, csv_path, label, sync, force=False):
+    """Run `sync(cursor, reader)` in one transaction unless the CSV is unchanged.
+
+    Returns the load's row counts, or None when the CSV is missing or unchanged.
+    """
+    if not Path(csv_path).exists():
+        print(f"CSV file {csv_path} does not exist.")
+        return None
+
+    start = time.perf_counter()
+    try:
+        with conn.cursor() as cursor:
+            unchanged, fingerprint = csv_fingerprint(cursor, csv_path, _pg(SELECT_CSV_FINGERPRINT))
+            if unchanged and not force:
+                print(f"{label} csv unchanged, skipping load.")
+                stats = None
+            else:
+                print(f"loading {label} from csv...")
+                with open(csv_path, 'r', encoding='utf-8') as f:
+                    stats = sync(cursor, csv.DictReader(f))
+            if fingerprint is not None:
+                cursor.execute(_pg(UPSERT_CSV_FINGERPRINT), (*fingerprint, time.time()))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return report_load(label, stats, start) if stats is not None else None
+
+
+def load_roasters_from_csv(conn, csv_path='data/coffee_roasters.csv', force=False):
+    def sync(cursor, reader):
+        cursor.execute(CREATE_ROASTERS_STAGE)
+        staged = copy_rows(cursor, ROASTERS_STAGE_TABLE, ROASTERS_INSERT_COLUMNS, (
+            insert_params for _, _, insert_params, _ in roaster_rows(reader)
+        ))
+        deleted = cursor.execute(DELETE_STALE_ROASTERS).fetchone()[0]
+        updated = cursor.execute(UPDATE_CHANGED_ROASTERS).rowcount
+        inserted = cursor.execute(INSERT_NEW_ROASTERS).rowcount
+        return {'inserted': inserted, 'updated': updated, 'skipped': staged - inserted - updated,
+                'deleted': deleted}
+
+    return _load_csv_incrementally(conn, csv_path, 'roasters', sync, force)
+
+
+def _with_roaster_ids(rows, roaster_ids: dict):
+    """Append each bean's roaster_id, canonicalizing every roaster spelling once."""
+    resolved = {}
+    for row in rows:
+        roaster = row[1]
+        if roaster not in resolved:
+            resolved[roaster] = roaster_ids.get(canonical_name(roaster))
+        yield (*row, resolved[roaster])
+
+
+def _stage_beans(cursor, rows) -> int:
+    """COPY bean insert rows, with their roaster ids, into a fresh staging table."""
+    roaster_ids = dict(cursor.execute(SELECT_ROASTER_NAME_KEYS).fetchall())
+    cursor.execute(CREATE_BEANS_STAGE)
+    cursor.execute(CREATE_TOUCHED_BEANS)
+    staged = copy_rows(
+        cursor, BEANS_STAGE_TABLE, [*BEANS_INSERT_COLUMNS, BEANS_COL_ROASTER_ID], _with_roaster_ids(rows, roaster_ids)
+    )
+    cursor.execute(f'ANALYZE {BEANS_STAGE_TABLE}')
+    return staged
+
+
+def _copy_bean_tokens(cursor, rows):
+    """COPY the tokens of (id, tasting_notes, origin_country, processing_method) rows."""
+    for i, (table, column, _) in enumerate(BEAN_TOKEN_TABLES, start=1):
+        copy_rows(cursor, table, [TOKENS_COL_BEAN_ID, column], (
+            (row[0], token)
+            for row in rows
+            for token in split_multi_value(row[i])
+        ))
+
+
+def _index_touched_beans(cursor):
+    """Write the tokens of every bean recorded in touched_beans.
+
+    Beans are read back through a server-side cursor, LOAD_CHUNK_SIZE at a
+    time, so a full load never holds its token rows in memory.
+    """
+    with cursor.connection.cursor(name='touched_bean_tokens') as touched:
+        touched.itersize = LOAD_CHUNK_SIZE
+        touched.execute(SELECT_TOUCHED_BEAN_TOKENS)
+        while rows := touched.fetchmany(LOAD_CHUNK_SIZE):
+            _copy_bean_tokens(cursor, rows)
+
+
+def load_beans_from_csv(conn, csv_path='data/coffee_beans.csv', force=False):
+    source = Path(csv_path).name
+    params = {'source': source}
+
+    def sync(cursor, reader):
+        staged = _stage_beans(cursor, (
+            insert_params for _, _, insert_params, _ in bean_rows(reader, source)
+        ))
+        deleted = cursor.execute(DELETE_STALE_BEANS, params).rowcount
+        updated = cursor.execute(UPDATE_CHANGED_BEANS, params).rowcount
+        for statement in DELETE_TOUCHED_BEAN_TOKENS:
+            cursor.execute(statement)
+        inserted = cursor.execute(INSERT_NEW_STAGED_BEANS, params).rowcount
+        _index_touched_beans(cursor)
+        return {'inserted': inserted, 'updated': updated, 'skipped': staged - inserted - updated,
+                'deleted': deleted}
+
+    return _load_csv_incrementally(conn, csv_path, 'coffee beans', sync, force)
+
+
+def insert_beans(conn, rows) -> int:
+    """Append bean insert rows (BEANS_INSERT_COLUMNS order) with their tokens and
+    roaster links, in one transaction; returns how many were inserted."""
+    with conn.cursor() as cursor:
+        _stage_beans(cursor, rows)
+        inserted = cursor.execute(INSERT_STAGED_BEANS).rowcount
+        _index_touched_beans(cursor)
+    conn.commit()
+    return inserted
+
+
+def index_bean_tokens(conn):
+    """Index beans still flagged as pending, e.g. rows written by other tools;
+    the loaders above write tokens along with their beans."""
+    start = time.perf_counter()
+    indexed = 0
+    with conn.cursor() as cursor, conn.cursor(name='pending_bean_tokens') as pending:
+        for statement in DELETE_PENDING_BEAN_TOKENS:
+            cursor.execute(statement)
+        pending.itersize = LOAD_CHUNK_SIZE
+        pending.execute(SELECT_BEANS_PENDING_TOKENS_POSTGRES)
+        while rows := pending.fetchmany(LOAD_CHUNK_SIZE):
+            _copy_bean_tokens(cursor, rows)
+            cursor.execute(MARK_BEAN_TOKENS_INDEXED_POSTGRES, ([row[0] for row in rows],))
+            indexed += len(rows)
+    conn.commit()
+
+    if indexed:
+        print(f"Indexed tokens for {indexed} beans in {time.perf_counter() - start:.4f}s")
+
+
+def resolve_bean_roasters(conn):
+    """Point beans without a roaster_id at the roaster sharing their canonical name."""
+    start = time.perf_counter()
+    resolved = 0
+    with conn.cursor() as cursor:
+        roaster_ids = dict(cursor.execute(SELECT_ROASTER_NAME_KEYS).fetchall())
+        matches = []
+        for (roaster,) in cursor.execute(SELECT_UNRESOLVED_BEAN_ROASTERS).fetchall():
+            roaster_id = roaster_ids.get(canonical_name(roaster))
+            if roaster_id is not None:
+                matches.append((roaster, roaster_id))
+        if matches:
+            cursor.execute(CREATE_ROASTER_RESOLUTION_TABLE)
+            copy_rows(cursor, 'roaster_resolution', ['roaster', 'roaster_id'], matches)
+            resolved = cursor.execute(APPLY_ROASTER_RESOLUTION).rowcount
+            cursor.execute(DROP_ROASTER_RESOLUTION_TABLE)
+    conn.commit()
+
+    if resolved:
+        print(f"Linked {resolved} beans to roasters in {time.perf_counter() - start:.4f}s")
+
+
+def geocode_roasters(conn, geocode_cache_path='data/coffee_canary.db'):
+    """Fill roaster lat/lon through the SQLite geocode cache at `geocode_cache_path`."""
+    with conn.cursor() as cursor:
+        city_states = cursor.execute(SELECT_ROASTER_LOCATIONS).fetchall()
+        if not city_states:
+            conn.rollback()
+            return
+        Path(geocode_cache_path).parent.mkdir(parents=True, exist_ok=True)
+        coords = geocode_locations(
+            [f"{city}, {state}" for city, state in city_states],
+            db_path=geocode_cache_path
+        )
+        cursor.executemany(_pg(UPDATE_ROASTER_COORDINATES), [
+            (*coords.get(f"{city}, {state}", (None, None)), city, state)
+            for city, state in city_states
+        ])
+    conn.commit()
+    located = sum(1 for lat, lon in coords.values() if lat is not None)
+
+    print(f"Geocoded roaster locations: {located}/{len(city_states)}")
+
+
+def setup_db_from_csv(
+    db_url,
+    roasters_csv='data/coffee_roasters.csv',
+    beans_csv='data/coffee_beans.csv',
+    force=False,
+    geocode_cache_path='data/coffee_canary.db'
+) -> bool:
+    try:
+        with connect(db_url) as conn:
+            _setup(conn, roasters_csv, beans_csv, force, geocode_cache_path)
+    except Exception as e:
+        print(f"Error setting up database: {e}")
+        return False
+    return True
+
+
+@contextmanager
+def build_lock(conn):
+    """Hold the build advisory lock on `conn`, the counterpart of `build_db.build_lock`.
+
+    Yields False if another session held it first and this one had to wait.
+    """
+    acquired = conn.execute('SELECT pg_try_advisory_lock(%s)', (BUILD_LOCK_KEY,)).fetchone()[0]
+    conn.commit()
+    if not acquired:
+        print("Waiting for database build in another process...")
+        conn.execute('SELECT pg_advisory_lock(%s)', (BUILD_LOCK_KEY,))
+        conn.commit()
+    try:
+        yield acquired
+    finally:
+        conn.rollback()
+        conn.execute('SELECT pg_advisory_unlock(%s)', (BUILD_LOCK_KEY,))
+        conn.commit()
+
+
+def _setup(conn, roasters_csv, beans_csv, force, geocode_cache_path):
+    create_db(conn, defer_indexes=True)
+    loads = [
+        load_roasters_from_csv(conn, roasters_csv, force),
+        load_beans_from_csv(conn, beans_csv, force),
+    ]
+    create_indexes(conn)
+    index_bean_tokens(conn)
+    resolve_bean_roasters(conn)
+    geocode_roasters(conn, geocode_cache_path)
+    if any(stats and (stats['inserted'] or stats['updated'] or stats['deleted']) for stats in loads):
+        vacuum_analyze(conn)
+
+
+def build_db_once(
+    db_url,
+    roasters_csv='data/coffee_roasters.csv',
+    beans_csv='data/coffee_beans.csv',
+    force=False,
+    geocode_cache_path='data/coffee_canary.db'
+) -> bool:
+    """Build the database, one process at a time.
+
+    Processes that start while a build holds the advisory lock wait for it
+    and then run their own, as `build_db.build_db_once` does: unchanged
+    CSVs are skipped by fingerprint, and a failed build is retried.
+    """
+    try:
+        with connect(db_url) as conn, build_lock(conn):
+            _setup(conn, roasters_csv, beans_csv, force, geocode_cache_path)
+    except Exception as e:
+        print(f"Error setting up database: {e}")
+        return False
+    return True
+
+
+__all__ = [
+    'is_postgres_url',
+    'connect',
+    'copy_rows',
+    'create_db',
+    'create_indexes',
+    'load_roasters_from_csv',
+    'load_beans_from_csv',
+    'insert_beans',
+    'index_bean_tokens',
+    'resolve_bean_roasters',
+    'geocode_roasters',
+    'setup_db_from_csv',
+    'build_lock',
+    'build_db_once',
+]
@@ -12,63 +12,738 @@ from .schema import (
     BEANS_COL_TASTING_NOTES,
     BEANS_COL_ORIGIN_COUNTRY,
     BEANS_COL_PROCESSING_METHOD,
+    BEANS_COL_ROW_KEY,
+    BEANS_COL_ROW_HASH,
+    BEANS_COL_SOURCE,
+    BEANS_COL_TOKENS_INDEXED,
+    BEANS_COL_ROASTER_ID,
+    BEANS_FTS_TABLE,
 
     ROASTERS_TABLE,
     ROASTERS_COL_ID,
     ROASTERS_COL_NAME,
     ROASTERS_COL_CITY,
     ROASTERS_COL_STATE,
-    ROASTERS_COL_WEBSITE
+    ROASTERS_COL_LAT,
+    ROASTERS_COL_LON,
+    ROASTERS_COL_WEBSITE,
+    ROASTERS_COL_ROW_HASH,
+    ROASTERS_COL_NAME_KEY,
+
+    GEOCODE_CACHE_TABLE,
+    GEOCODE_COL_LOCATION_KEY,
+    GEOCODE_COL_LAT,
+    GEOCODE_COL_LON,
+    GEOCODE_COL_FOUND,
+    GEOCODE_COL_FETCHED_AT,
+
+    CSV_FINGERPRINTS_TABLE,
+    FINGERPRINT_COL_PATH,
+    FINGERPRINT_COL_SIZE,
+    FINGERPRINT_COL_MTIME_NS,
+    FINGERPRINT_COL_SHA256,
+    FINGERPRINT_COL_LOADED_AT,
+
+    BEAN_TASTING_NOTES_TABLE,
+    BEAN_ORIGINS_TABLE,
+    BEAN_PROCESSING_METHODS_TABLE,
+    TOKENS_COL_BEAN_ID,
+    TASTING_NOTES_COL_NOTE,
+    ORIGINS_COL_COUNTRY,
+    PROCESSING_METHODS_COL_METHOD
 )
 
-CREATE_COFFEE_BEANS_TABLE = f'''
-CREATE TABLE IF NOT EXISTS {BEANS_TABLE} (
-    {BEANS_COL_ID} INTEGER PRIMARY KEY AUTOINCREMENT,
-    {BEANS_COL_PURCHASE_DATE} TEXT,
-    {BEANS_COL_ROASTER} TEXT,
-    {BEANS_COL_BLEND_NAME} TEXT,
-    {BEANS_COL_ROAST_LEVEL} TEXT,
-    {BEANS_COL_ROAST_DATE} TEXT,
-    {BEANS_COL_WEIGHT_GRAMS} REAL,
-    {BEANS_COL_TASTING_NOTES} TEXT,
-    {BEANS_COL_ORIGIN_COUNTRY} TEXT,
-    {BEANS_COL_PROCESSING_METHOD} TEXT
+SQLITE = 'sqlite'
+POSTGRES = 'postgresql'
+
+# Portable column types as each backend spells them. Dates stay ISO text on
+# both, so every query and dtype works unchanged.
+COLUMN_TYPES = {
+    SQLITE: {
+        'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'integer': 'INTEGER',
+        'flag': 'INTEGER',
+        'real': 'REAL',
+        'text': 'TEXT',
+    },
+    POSTGRES: {
+        'id': 'BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY',
+        'integer': 'BIGINT',
+        'flag': 'SMALLINT',
+        'real': 'DOUBLE PRECISION',
+        'text': 'TEXT',
+    },
+}
+
+
+def create_table(table: str, columns, dialect: str = SQLITE, primary_key=()) -> str:
+    """CREATE TABLE IF NOT EXISTS for (name, type, constraints, references) columns.
+
+    References are declared on SQLite only, where foreign_keys is off. On
+    PostgreSQL a checked reference costs a lookup and a row lock per COPYed
+    row, so neither backend enforces them: the loads clear token rows and
+    roaster links themselves.
+    """
+    definitions = []
+    for name, kind, constraints, references in columns:
+        parts = [name, COLUMN_TYPES[dialect][kind], constraints]
+        if references and dialect == SQLITE:
+            parts.append(f'REFERENCES {references}')
+        definitions.append(' '.join(part for part in parts if part))
+    if primary_key:
+        definitions.append(f'PRIMARY KEY ({", ".join(primary_key)})')
+    body = ",\n    ".join(definitions)
+    return f'''
+CREATE TABLE IF NOT EXISTS {table} (
+    {body}
 )
 '''
 
-CREATE_COFFEE_ROASTER_TABLE = f'''
-CREATE TABLE IF NOT EXISTS {ROASTERS_TABLE} (
-    {ROASTERS_COL_ID} INTEGER PRIMARY KEY AUTOINCREMENT,
-    {ROASTERS_COL_NAME} TEXT,
-    {ROASTERS_COL_CITY} TEXT,
-    {ROASTERS_COL_STATE} TEXT,
-    {ROASTERS_COL_WEBSITE} TEXT
+
+BEANS_COLUMNS = (
+    (BEANS_COL_ID, 'id', '', None),
+    (BEANS_COL_PURCHASE_DATE, 'text', '', None),
+    (BEANS_COL_ROASTER, 'text', '', None),
+    (BEANS_COL_BLEND_NAME, 'text', '', None),
+    (BEANS_COL_ROAST_LEVEL, 'text', '', None),
+    (BEANS_COL_ROAST_DATE, 'text', '', None),
+    (BEANS_COL_WEIGHT_GRAMS, 'real', '', None),
+    (BEANS_COL_TASTING_NOTES, 'text', '', None),
+    (BEANS_COL_ORIGIN_COUNTRY, 'text', '', None),
+    (BEANS_COL_PROCESSING_METHOD, 'text', '', None),
+    (BEANS_COL_ROW_KEY, 'text', '', None),
+    (BEANS_COL_ROW_HASH, 'text', '', None),
+    (BEANS_COL_SOURCE, 'text', '', None),
+    (BEANS_COL_TOKENS_INDEXED, 'flag', 'NOT NULL DEFAULT 0', None),
+    (BEANS_COL_ROASTER_ID, 'integer', '', f'{ROASTERS_TABLE}({ROASTERS_COL_ID})'),
 )
-'''
+
+ROASTERS_COLUMNS = (
+    (ROASTERS_COL_ID, 'id', '', None),
+    (ROASTERS_COL_NAME, 'text', '', None),
+    (ROASTERS_COL_CITY, 'text', '', None),
+    (ROASTERS_COL_STATE, 'text', '', None),
+    (ROASTERS_COL_WEBSITE, 'text', '', None),
+    (ROASTERS_COL_LAT, 'real', '', None),
+    (ROASTERS_COL_LON, 'real', '', None),
+    (ROASTERS_COL_ROW_HASH, 'text', '', None),
+    (ROASTERS_COL_NAME_KEY, 'text', '', None),
+)
+
+GEOCODE_CACHE_COLUMNS = (
+    (GEOCODE_COL_LOCATION_KEY, 'text', 'PRIMARY KEY', None),
+    (GEOCODE_COL_LAT, 'real', '', None),
+    (GEOCODE_COL_LON, 'real', '', None),
+    (GEOCODE_COL_FOUND, 'integer', 'NOT NULL', None),
+    (GEOCODE_COL_FETCHED_AT, 'real', 'NOT NULL', None),
+)
+
+CSV_FINGERPRINTS_COLUMNS = (
+    (FINGERPRINT_COL_PATH, 'text', 'PRIMARY KEY', None),
+    (FINGERPRINT_COL_SIZE, 'integer', 'NOT NULL', None),
+    (FINGERPRINT_COL_MTIME_NS, 'integer', 'NOT NULL', None),
+    (FINGERPRINT_COL_SHA256, 'text', 'NOT NULL', None),
+    (FINGERPRINT_COL_LOADED_AT, 'real', 'NOT NULL', None),
+)
+
+CREATE_COFFEE_BEANS_TABLE = create_table(BEANS_TABLE, BEANS_COLUMNS)
+CREATE_COFFEE_ROASTER_TABLE = create_table(ROASTERS_TABLE, ROASTERS_COLUMNS)
+CREATE_GEOCODE_CACHE_TABLE = create_table(GEOCODE_CACHE_TABLE, GEOCODE_CACHE_COLUMNS)
+CREATE_CSV_FINGERPRINTS_TABLE = create_table(CSV_FINGERPRINTS_TABLE, CSV_FINGERPRINTS_COLUMNS)
+
+# Parameter order of the bean and roaster INSERTs, shared by the CSV sync,
+# the importer and PostgreSQL's COPY. A bean's own fields come first.
+BEANS_VALUE_COLUMNS = [
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_BLEND_NAME,
+    BEANS_COL_ROAST_LEVEL,
+    BEANS_COL_ROAST_DATE,
+    BEANS_COL_WEIGHT_GRAMS,
+    BEANS_COL_TASTING_NOTES,
+    BEANS_COL_ORIGIN_COUNTRY,
+    BEANS_COL_PROCESSING_METHOD,
+]
+BEANS_INSERT_COLUMNS = [*BEANS_VALUE_COLUMNS, BEANS_COL_ROW_KEY, BEANS_COL_ROW_HASH, BEANS_COL_SOURCE]
+ROASTERS_INSERT_COLUMNS = [
+    ROASTERS_COL_NAME,
+    ROASTERS_COL_CITY,
+    ROASTERS_COL_STATE,
+    ROASTERS_COL_WEBSITE,
+    ROASTERS_COL_ROW_HASH,
+    ROASTERS_COL_NAME_KEY,
+]
 
 INSERT_INTO_BEANS_TABLE = f'''
-INSERT INTO {BEANS_TABLE} (
-    {BEANS_COL_PURCHASE_DATE},
-    {BEANS_COL_ROASTER},
-    {BEANS_COL_BLEND_NAME},
-    {BEANS_COL_ROAST_LEVEL},
-    {BEANS_COL_ROAST_DATE},
-    {BEANS_COL_WEIGHT_GRAMS},
-    {BEANS_COL_TASTING_NOTES},
-    {BEANS_COL_ORIGIN_COUNTRY},
-    {BEANS_COL_PROCESSING_METHOD}
-) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+INSERT INTO {BEANS_TABLE} ({", ".join(BEANS_INSERT_COLUMNS)})
+VALUES ({", ".join("?" for _ in BEANS_INSERT_COLUMNS)})
 '''
 
+UPDATE_BEANS_ROW = f'''
+UPDATE {BEANS_TABLE} SET
+    {", ".join(f"{col} = ?" for col in (*BEANS_VALUE_COLUMNS, BEANS_COL_ROW_HASH))}
+WHERE {BEANS_COL_ID} = ?
+'''
+
+def _owned_by_csv(source_param: str, alias: str = '') -> str:
+    """Beans a CSV load may update or delete. Rows without a source predate
+    incremental loading and belong to the CSV."""
+    return f'({alias}{BEANS_COL_SOURCE} = {source_param} OR {alias}{BEANS_COL_SOURCE} IS NULL)'
+
+
+SELECT_BEANS_ROW_KEYS = f'''
+SELECT {BEANS_COL_ID}, {BEANS_COL_ROW_KEY}, {BEANS_COL_ROW_HASH}
+FROM {BEANS_TABLE}
+WHERE {_owned_by_csv('?')}
+'''
+
+DELETE_BEANS_ROW = f'DELETE FROM {BEANS_TABLE} WHERE {BEANS_COL_ID} = ?'
+
 INSERT_INTO_ROASTERS_TABLE = f'''
-INSERT INTO {ROASTERS_TABLE} (
-    {ROASTERS_COL_NAME},
-    {ROASTERS_COL_CITY},
-    {ROASTERS_COL_STATE},
-    {ROASTERS_COL_WEBSITE}
-) VALUES (?, ?, ?, ?)
+INSERT INTO {ROASTERS_TABLE} ({", ".join(ROASTERS_INSERT_COLUMNS)})
+VALUES ({", ".join("?" for _ in ROASTERS_INSERT_COLUMNS)})
+'''
+
+# Coordinates are kept unless the roaster moved; parameters are
+# (name, city, state, website, row_hash, name_key, city, state, city, state, id).
+UPDATE_ROASTERS_ROW = f'''
+UPDATE {ROASTERS_TABLE} SET
+    {ROASTERS_COL_NAME} = ?,
+    {ROASTERS_COL_CITY} = ?,
+    {ROASTERS_COL_STATE} = ?,
+    {ROASTERS_COL_WEBSITE} = ?,
+    {ROASTERS_COL_ROW_HASH} = ?,
+    {ROASTERS_COL_NAME_KEY} = ?,
+    {ROASTERS_COL_LAT} = CASE WHEN {ROASTERS_COL_CITY} IS ? AND {ROASTERS_COL_STATE} IS ?
+        THEN {ROASTERS_COL_LAT} END,
+    {ROASTERS_COL_LON} = CASE WHEN {ROASTERS_COL_CITY} IS ? AND {ROASTERS_COL_STATE} IS ?
+        THEN {ROASTERS_COL_LON} END
+WHERE {ROASTERS_COL_ID} = ?
 '''
 
+SELECT_ROASTERS_ROW_KEYS = f'''
+SELECT {ROASTERS_COL_ID}, {ROASTERS_COL_NAME_KEY}, {ROASTERS_COL_ROW_HASH}
+FROM {ROASTERS_TABLE}
+'''
+
+DELETE_ROASTERS_ROW = f'DELETE FROM {ROASTERS_TABLE} WHERE {ROASTERS_COL_ID} = ?'
+
+SELECT_CSV_FINGERPRINT = f'''
+SELECT {FINGERPRINT_COL_SIZE}, {FINGERPRINT_COL_MTIME_NS}, {FINGERPRINT_COL_SHA256}
+FROM {CSV_FINGERPRINTS_TABLE}
+WHERE {FINGERPRINT_COL_PATH} = ?
+'''
+
+UPSERT_CSV_FINGERPRINT = f'''
+INSERT INTO {CSV_FINGERPRINTS_TABLE} (
+    {FINGERPRINT_COL_PATH},
+    {FINGERPRINT_COL_SIZE},
+    {FINGERPRINT_COL_MTIME_NS},
+    {FINGERPRINT_COL_SHA256},
+    {FINGERPRINT_COL_LOADED_AT}
+) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT({FINGERPRINT_COL_PATH}) DO UPDATE SET
+    {FINGERPRINT_COL_SIZE} = excluded.{FINGERPRINT_COL_SIZE},
+    {FINGERPRINT_COL_MTIME_NS} = excluded.{FINGERPRINT_COL_MTIME_NS},
+    {FINGERPRINT_COL_SHA256} = excluded.{FINGERPRINT_COL_SHA256},
+    {FINGERPRINT_COL_LOADED_AT} = excluded.{FINGERPRINT_COL_LOADED_AT}
+'''
+
+UPSERT_GEOCODE_CACHE = f'''
+INSERT INTO {GEOCODE_CACHE_TABLE} (
+    {GEOCODE_COL_LOCATION_KEY},
+    {GEOCODE_COL_LAT},
+    {GEOCODE_COL_LON},
+    {GEOCODE_COL_FOUND},
+    {GEOCODE_COL_FETCHED_AT}
+) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT({GEOCODE_COL_LOCATION_KEY}) DO UPDATE SET
+    {GEOCODE_COL_LAT} = excluded.{GEOCODE_COL_LAT},
+    {GEOCODE_COL_LON} = excluded.{GEOCODE_COL_LON},
+    {GEOCODE_COL_FOUND} = excluded.{GEOCODE_COL_FOUND},
+    {GEOCODE_COL_FETCHED_AT} = excluded.{GEOCODE_COL_FETCHED_AT}
+'''
+
+# Formatted with a comma-separated run of "?" placeholders per batch.
+SELECT_GEOCODE_CACHE_BATCH = f'''
+SELECT
+    {GEOCODE_COL_LOCATION_KEY},
+    {GEOCODE_COL_LAT},
+    {GEOCODE_COL_LON},
+    {GEOCODE_COL_FOUND},
+    {GEOCODE_COL_FETCHED_AT}
+FROM {GEOCODE_CACHE_TABLE}
+WHERE {GEOCODE_COL_LOCATION_KEY} IN ({{placeholders}})
+'''
+
+SELECT_ROASTER_LOCATIONS = f'''
+SELECT DISTINCT {ROASTERS_COL_CITY}, {ROASTERS_COL_STATE}
+FROM {ROASTERS_TABLE}
+WHERE {ROASTERS_COL_CITY} IS NOT NULL AND {ROASTERS_COL_STATE} IS NOT NULL
+    AND ({ROASTERS_COL_LAT} IS NULL OR {ROASTERS_COL_LON} IS NULL)
+'''
+
+UPDATE_ROASTER_COORDINATES = f'''
+UPDATE {ROASTERS_TABLE}
+SET {ROASTERS_COL_LAT} = ?, {ROASTERS_COL_LON} = ?
+WHERE {ROASTERS_COL_CITY} = ? AND {ROASTERS_COL_STATE} = ?
+'''
+
+# One roaster row per canonical name, so beans resolve to exactly one roaster.
+CREATE_ROASTERS_NAME_KEY_INDEX = f'''
+CREATE UNIQUE INDEX IF NOT EXISTS idx_{ROASTERS_TABLE}_{ROASTERS_COL_NAME_KEY}
+ON {ROASTERS_TABLE}({ROASTERS_COL_NAME_KEY})
+'''
+
+# Covering indexes: date-range weight sums, per-roaster counts and timelines,
+# and roast level counts read the index alone, never the table.
+CREATE_BEANS_INDEXES = [
+    f'''CREATE INDEX IF NOT EXISTS idx_{BEANS_TABLE}_{BEANS_COL_PURCHASE_DATE}
+    ON {BEANS_TABLE}({BEANS_COL_PURCHASE_DATE}, {BEANS_COL_WEIGHT_GRAMS})''',
+    f'''CREATE INDEX IF NOT EXISTS idx_{BEANS_TABLE}_{BEANS_COL_ROASTER_ID}_{BEANS_COL_PURCHASE_DATE}
+    ON {BEANS_TABLE}({BEANS_COL_ROASTER_ID}, {BEANS_COL_PURCHASE_DATE}, {BEANS_COL_WEIGHT_GRAMS})''',
+    f'''CREATE INDEX IF NOT EXISTS idx_{BEANS_TABLE}_{BEANS_COL_ROAST_LEVEL}
+    ON {BEANS_TABLE}({BEANS_COL_ROAST_LEVEL})''',
+]
+
+# A bean whose roaster text changes, or whose roaster row is renamed or
+# deleted, loses its roaster_id until the next resolve pass.
+CREATE_ROASTER_ID_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {BEANS_TABLE}_roaster_update
+    AFTER UPDATE OF {BEANS_COL_ROASTER} ON {BEANS_TABLE}
+    BEGIN
+    UPDATE {BEANS_TABLE} SET {BEANS_COL_ROASTER_ID} = NULL WHERE {BEANS_COL_ID} = new.{BEANS_COL_ID};
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {ROASTERS_TABLE}_name_update
+    AFTER UPDATE OF {ROASTERS_COL_NAME_KEY} ON {ROASTERS_TABLE}
+    BEGIN
+    UPDATE {BEANS_TABLE} SET {BEANS_COL_ROASTER_ID} = NULL WHERE {BEANS_COL_ROASTER_ID} = old.{ROASTERS_COL_ID};
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {ROASTERS_TABLE}_delete
+    AFTER DELETE ON {ROASTERS_TABLE}
+    BEGIN
+    UPDATE {BEANS_TABLE} SET {BEANS_COL_ROASTER_ID} = NULL WHERE {BEANS_COL_ROASTER_ID} = old.{ROASTERS_COL_ID};
+    END
+    ''',
+]
+
+SELECT_UNRESOLVED_BEAN_ROASTERS = f'''
+SELECT DISTINCT {BEANS_COL_ROASTER}
+FROM {BEANS_TABLE}
+WHERE {BEANS_COL_ROASTER_ID} IS NULL AND {BEANS_COL_ROASTER} IS NOT NULL
+'''
+
+SELECT_ROASTER_NAME_KEYS = f'''
+SELECT {ROASTERS_COL_NAME_KEY}, {ROASTERS_COL_ID}
+FROM {ROASTERS_TABLE}
+WHERE {ROASTERS_COL_NAME_KEY} IS NOT NULL
+'''
+
+# Filled with (roaster text, roaster id) pairs, then applied in one pass.
+# Unqualified, the temp table shadows any other of that name on both backends.
+CREATE_ROASTER_RESOLUTION_TABLE = '''
+CREATE TEMP TABLE IF NOT EXISTS roaster_resolution (
+    roaster TEXT PRIMARY KEY,
+    roaster_id BIGINT NOT NULL
+)
+'''
+
+INSERT_ROASTER_RESOLUTION = 'INSERT INTO roaster_resolution (roaster, roaster_id) VALUES (?, ?)'
+
+APPLY_ROASTER_RESOLUTION = f'''
+UPDATE {BEANS_TABLE} SET {BEANS_COL_ROASTER_ID} = m.roaster_id
+FROM roaster_resolution AS m
+WHERE {BEANS_TABLE}.{BEANS_COL_ROASTER_ID} IS NULL AND {BEANS_TABLE}.{BEANS_COL_ROASTER} = m.roaster
+'''
+
+DROP_ROASTER_RESOLUTION_TABLE = 'DROP TABLE IF EXISTS roaster_resolution'
+
+# Tokenized multi-value bean fields: (table, token column, source bean column).
+BEAN_TOKEN_TABLES = (
+    (BEAN_TASTING_NOTES_TABLE, TASTING_NOTES_COL_NOTE, BEANS_COL_TASTING_NOTES),
+    (BEAN_ORIGINS_TABLE, ORIGINS_COL_COUNTRY, BEANS_COL_ORIGIN_COUNTRY),
+    (BEAN_PROCESSING_METHODS_TABLE, PROCESSING_METHODS_COL_METHOD, BEANS_COL_PROCESSING_METHOD),
+)
+
+def _token_columns(column: str):
+    return (
+        (TOKENS_COL_BEAN_ID, 'integer', 'NOT NULL', f'{BEANS_TABLE}({BEANS_COL_ID})'),
+        (column, 'text', 'NOT NULL', None),
+    )
+
+
+# (token, bean_id) covers top-N counts and token -> beans lookups.
+CREATE_BEAN_TOKEN_INDEXES = [
+    f'CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column}, {TOKENS_COL_BEAN_ID})'
+    for table, column, _ in BEAN_TOKEN_TABLES
+]
+
+CREATE_BEAN_TOKEN_TABLES = [
+    *(
+        create_table(table, _token_columns(column), primary_key=(TOKENS_COL_BEAN_ID, column))
+        for table, column, _ in BEAN_TOKEN_TABLES
+    ),
+    *CREATE_BEAN_TOKEN_INDEXES,
+]
+
+# Any write to a tokenized field drops the bean's tokens and queues it for
+# re-indexing, whichever process made the change.
+_DELETE_BEAN_TOKENS = "\n    ".join(
+    f'DELETE FROM {table} WHERE {TOKENS_COL_BEAN_ID} = old.{BEANS_COL_ID};'
+    for table, _, _ in BEAN_TOKEN_TABLES
+)
+
+CREATE_BEAN_TOKEN_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {BEANS_TABLE}_tokens_update
+    AFTER UPDATE OF {BEANS_COL_TASTING_NOTES}, {BEANS_COL_ORIGIN_COUNTRY}, {BEANS_COL_PROCESSING_METHOD}
+    ON {BEANS_TABLE}
+    BEGIN
+    {_DELETE_BEAN_TOKENS}
+    UPDATE {BEANS_TABLE} SET {BEANS_COL_TOKENS_INDEXED} = 0 WHERE {BEANS_COL_ID} = new.{BEANS_COL_ID};
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {BEANS_TABLE}_tokens_delete
+    AFTER DELETE ON {BEANS_TABLE}
+    BEGIN
+    {_DELETE_BEAN_TOKENS}
+    END
+    ''',
+]
+
+CREATE_BEANS_TOKENS_PENDING_INDEX = f'''
+CREATE INDEX IF NOT EXISTS idx_{BEANS_TABLE}_tokens_pending
+ON {BEANS_TABLE}({BEANS_COL_ID}) WHERE {BEANS_COL_TOKENS_INDEXED} = 0
+'''
+
+SELECT_BEANS_PENDING_TOKENS = f'''
+SELECT {BEANS_COL_ID}, {", ".join(source for _, _, source in BEAN_TOKEN_TABLES)}
+FROM {BEANS_TABLE}
+WHERE {BEANS_COL_TOKENS_INDEXED} = 0 AND {BEANS_COL_ID} > ?
+ORDER BY {BEANS_COL_ID}
+LIMIT ?
+'''
+
+INSERT_BEAN_TOKENS = {
+    table: f'INSERT OR IGNORE INTO {table} ({TOKENS_COL_BEAN_ID}, {column}) VALUES (?, ?)'
+    for table, column, _ in BEAN_TOKEN_TABLES
+}
+
+MARK_BEAN_TOKENS_INDEXED = f'''
+UPDATE {BEANS_TABLE} SET {BEANS_COL_TOKENS_INDEXED} = 1 WHERE {BEANS_COL_ID} = ?
+'''
+
+BEANS_FTS_COLUMNS = (
+    BEANS_COL_BLEND_NAME,
+    BEANS_COL_ROASTER,
+    BEANS_COL_TASTING_NOTES,
+    BEANS_COL_ORIGIN_COUNTRY,
+)
+_FTS_COLUMN_LIST = ", ".join(BEANS_FTS_COLUMNS)
+_FTS_NEW_VALUES = ", ".join(f"new.{col}" for col in BEANS_FTS_COLUMNS)
+_FTS_OLD_VALUES = ", ".join(f"old.{col}" for col in BEANS_FTS_COLUMNS)
+
+# External-content FTS5 index: the text lives only in coffee_beans. Prefix
+# indexes on 2-4 characters keep search-as-you-type lookups fast.
+CREATE_BEANS_FTS_TABLE = f'''
+CREATE VIRTUAL TABLE IF NOT EXISTS {BEANS_FTS_TABLE} USING fts5(
+    {_FTS_COLUMN_LIST},
+    content='{BEANS_TABLE}',
+    content_rowid='{BEANS_COL_ID}',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3 4'
+)
+'''
+
+REBUILD_BEANS_FTS = f"INSERT INTO {BEANS_FTS_TABLE}({BEANS_FTS_TABLE}) VALUES ('rebuild')"
+
+CREATE_BEANS_FTS_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {BEANS_FTS_TABLE}_insert AFTER INSERT ON {BEANS_TABLE}
+    BEGIN
+    INSERT INTO {BEANS_FTS_TABLE}(rowid, {_FTS_COLUMN_LIST})
+    VALUES (new.{BEANS_COL_ID}, {_FTS_NEW_VALUES});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {BEANS_FTS_TABLE}_delete AFTER DELETE ON {BEANS_TABLE}
+    BEGIN
+    INSERT INTO {BEANS_FTS_TABLE}({BEANS_FTS_TABLE}, rowid, {_FTS_COLUMN_LIST})
+    VALUES ('delete', old.{BEANS_COL_ID}, {_FTS_OLD_VALUES});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {BEANS_FTS_TABLE}_update
+    AFTER UPDATE OF {_FTS_COLUMN_LIST} ON {BEANS_TABLE}
+    BEGIN
+    INSERT INTO {BEANS_FTS_TABLE}({BEANS_FTS_TABLE}, rowid, {_FTS_COLUMN_LIST})
+    VALUES ('delete', old.{BEANS_COL_ID}, {_FTS_OLD_VALUES});
+    INSERT INTO {BEANS_FTS_TABLE}(rowid, {_FTS_COLUMN_LIST})
+    VALUES (new.{BEANS_COL_ID}, {_FTS_NEW_VALUES});
+    END
+    ''',
+]
+
+# Newest matches first: FTS5 walks its doclists in rowid order, so this stays
+# fast however many beans match. Relevance ranking happens on this window.
+# Columns where a match usually means the bean the person is looking for;
+# search.py weighs them highest.
+BEANS_SEARCH_NAME_COLUMNS = (BEANS_COL_BLEND_NAME, BEANS_COL_ROASTER)
+_SEARCH_RESULT_COLUMNS = (
+    BEANS_COL_ID,
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_BLEND_NAME,
+    BEANS_COL_ROAST_LEVEL,
+    BEANS_COL_TASTING_NOTES,
+    BEANS_COL_ORIGIN_COUNTRY,
+)
+
+# The newest matches of :name_match (the terms restricted to the name
+# columns) and of :match (any column), newest first. Name matches are
+# fetched separately so a popular tasting note cannot crowd an old bean
+# whose blend name matches out of the candidates.
+SEARCH_BEANS_CANDIDATES = f'''
+SELECT {", ".join(f"b.{col}" for col in _SEARCH_RESULT_COLUMNS)}
+FROM {BEANS_TABLE} AS b
+WHERE b.{BEANS_COL_ID} IN (
+    SELECT rowid FROM (
+        SELECT rowid FROM {BEANS_FTS_TABLE} WHERE {BEANS_FTS_TABLE} MATCH :name_match
+        ORDER BY rowid DESC LIMIT :candidates
+    )
+    UNION
+    SELECT rowid FROM (
+        SELECT rowid FROM {BEANS_FTS_TABLE} WHERE {BEANS_FTS_TABLE} MATCH :match
+        ORDER BY rowid DESC LIMIT :candidates
+    )
+)
+ORDER BY b.{BEANS_COL_ID} DESC
+'''
+
+def _search_vector(columns) -> str:
+    return "to_tsvector('simple', {})".format(" || ' ' || ".join(f"coalesce({col}, '')" for col in columns))
+
+
+# PostgreSQL has no FTS5; the same columns go through GIN expression indexes
+# on these documents instead. The 'simple' configuration lowercases words and
+# neither stems nor drops stop words, close to unicode61.
+BEANS_SEARCH_VECTOR = _search_vector(BEANS_FTS_COLUMNS)
+BEANS_SEARCH_NAME_VECTOR = _search_vector(BEANS_SEARCH_NAME_COLUMNS)
+
+# Ordering on `id + 0` keeps the planner off a backward walk of the primary
+# key, which evaluates the document for every row until enough match.
+SEARCH_BEANS_CANDIDATES_POSTGRES = f'''
+SELECT {", ".join(_SEARCH_RESULT_COLUMNS)}
+FROM {BEANS_TABLE}
+WHERE {BEANS_COL_ID} IN (
+    (SELECT {BEANS_COL_ID} FROM {BEANS_TABLE}
+     WHERE {BEANS_SEARCH_NAME_VECTOR} @@ to_tsquery('simple', :match)
+     ORDER BY {BEANS_COL_ID} + 0 DESC LIMIT :candidates)
+    UNION
+    (SELECT {BEANS_COL_ID} FROM {BEANS_TABLE}
+     WHERE {BEANS_SEARCH_VECTOR} @@ to_tsquery('simple', :match)
+     ORDER BY {BEANS_COL_ID} + 0 DESC LIMIT :candidates)
+)
+ORDER BY {BEANS_COL_ID} DESC
+'''
+
+# PostgreSQL builds: the same tables, created from the column lists above,
+# loaded by COPY into temp staging tables and merged with set-based
+# statements. These mirror the SQLite row-by-row sync in build_db.
+CREATE_TABLES_POSTGRES = [
+    create_table(ROASTERS_TABLE, ROASTERS_COLUMNS, POSTGRES),
+    create_table(BEANS_TABLE, BEANS_COLUMNS, POSTGRES),
+    create_table(CSV_FINGERPRINTS_TABLE, CSV_FINGERPRINTS_COLUMNS, POSTGRES),
+    *(
+        create_table(table, _token_columns(column), POSTGRES, primary_key=(TOKENS_COL_BEAN_ID, column))
+        for table, column, _ in BEAN_TOKEN_TABLES
+    ),
+]
+
+CREATE_INDEXES_POSTGRES = [
+    CREATE_ROASTERS_NAME_KEY_INDEX,
+    *CREATE_BEANS_INDEXES,
+    CREATE_BEANS_TOKENS_PENDING_INDEX,
+    # The merge joins staged rows to beans on row_key.
+    f'CREATE INDEX IF NOT EXISTS idx_{BEANS_TABLE}_{BEANS_COL_ROW_KEY} ON {BEANS_TABLE}({BEANS_COL_ROW_KEY})',
+    f'''CREATE INDEX IF NOT EXISTS idx_{BEANS_TABLE}_search
+    ON {BEANS_TABLE} USING GIN (({BEANS_SEARCH_VECTOR}))''',
+    f'''CREATE INDEX IF NOT EXISTS idx_{BEANS_TABLE}_search_names
+    ON {BEANS_TABLE} USING GIN (({BEANS_SEARCH_NAME_VECTOR}))''',
+    *CREATE_BEAN_TOKEN_INDEXES,
+]
+
+# Staging tables live for one load transaction. `position` keeps CSV order,
+# so new rows get ids in the order they appear in the file.
+ROASTERS_STAGE_TABLE = 'roasters_stage'
+BEANS_STAGE_TABLE = 'beans_stage'
+
+CREATE_ROASTERS_STAGE = f'''
+CREATE TEMP TABLE {ROASTERS_STAGE_TABLE} (
+    position BIGINT GENERATED ALWAYS AS IDENTITY,
+    {", ".join(f"{col} TEXT" for col in ROASTERS_INSERT_COLUMNS)}
+) ON COMMIT DROP
+'''
+
+CREATE_BEANS_STAGE = f'''
+CREATE TEMP TABLE {BEANS_STAGE_TABLE} (
+    position BIGINT GENERATED ALWAYS AS IDENTITY,
+    {", ".join(
+        f"{col} {'DOUBLE PRECISION' if col == BEANS_COL_WEIGHT_GRAMS else 'TEXT'}"
+        for col in BEANS_INSERT_COLUMNS
+    )},
+    {BEANS_COL_ROASTER_ID} BIGINT
+) ON COMMIT DROP
+'''
+
+# Ids of the beans a merge or import deleted or wrote, whose tokens it then
+# deletes and rewrites.
+TOUCHED_BEANS_TABLE = 'touched_beans'
+CREATE_TOUCHED_BEANS = f'CREATE TEMP TABLE {TOUCHED_BEANS_TABLE} (id BIGINT PRIMARY KEY) ON COMMIT DROP'
+
+# Roasters no longer in the CSV (and rows without a key); their beans lose
+# the link until a roaster of that name returns.
+DELETE_STALE_ROASTERS = f'''
+WITH gone AS (
+    DELETE FROM {ROASTERS_TABLE} AS r
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {ROASTERS_STAGE_TABLE} AS s WHERE s.{ROASTERS_COL_NAME_KEY} = r.{ROASTERS_COL_NAME_KEY}
+    )
+    RETURNING r.{ROASTERS_COL_ID}
+), unlinked AS (
+    UPDATE {BEANS_TABLE} AS b SET {BEANS_COL_ROASTER_ID} = NULL
+    FROM gone WHERE b.{BEANS_COL_ROASTER_ID} = gone.{ROASTERS_COL_ID}
+)
+SELECT COUNT(*) FROM gone
+'''
+
+# Coordinates are kept unless the roaster moved.
+UPDATE_CHANGED_ROASTERS = f'''
+UPDATE {ROASTERS_TABLE} AS r SET
+    {ROASTERS_COL_NAME} = s.{ROASTERS_COL_NAME},
+    {ROASTERS_COL_CITY} = s.{ROASTERS_COL_CITY},
+    {ROASTERS_COL_STATE} = s.{ROASTERS_COL_STATE},
+    {ROASTERS_COL_WEBSITE} = s.{ROASTERS_COL_WEBSITE},
+    {ROASTERS_COL_ROW_HASH} = s.{ROASTERS_COL_ROW_HASH},
+    {ROASTERS_COL_LAT} = CASE
+        WHEN r.{ROASTERS_COL_CITY} IS NOT DISTINCT FROM s.{ROASTERS_COL_CITY}
+            AND r.{ROASTERS_COL_STATE} IS NOT DISTINCT FROM s.{ROASTERS_COL_STATE}
+        THEN r.{ROASTERS_COL_LAT} END,
+    {ROASTERS_COL_LON} = CASE
+        WHEN r.{ROASTERS_COL_CITY} IS NOT DISTINCT FROM s.{ROASTERS_COL_CITY}
+            AND r.{ROASTERS_COL_STATE} IS NOT DISTINCT FROM s.{ROASTERS_COL_STATE}
+        THEN r.{ROASTERS_COL_LON} END
+FROM {ROASTERS_STAGE_TABLE} AS s
+WHERE s.{ROASTERS_COL_NAME_KEY} = r.{ROASTERS_COL_NAME_KEY}
+    AND r.{ROASTERS_COL_ROW_HASH} IS DISTINCT FROM s.{ROASTERS_COL_ROW_HASH}
+'''
+
+INSERT_NEW_ROASTERS = f'''
+INSERT INTO {ROASTERS_TABLE} ({", ".join(ROASTERS_INSERT_COLUMNS)})
+SELECT {", ".join(f"s.{col}" for col in ROASTERS_INSERT_COLUMNS)}
+FROM {ROASTERS_STAGE_TABLE} AS s
+WHERE NOT EXISTS (
+    SELECT 1 FROM {ROASTERS_TABLE} AS r WHERE r.{ROASTERS_COL_NAME_KEY} = s.{ROASTERS_COL_NAME_KEY}
+)
+ORDER BY s.position
+'''
+
+_OWNED_BY_CSV = _owned_by_csv('%(source)s', 'b.')
+
+# Deleted beans are recorded as touched too, so their token rows go with
+# the rewritten beans' old ones.
+DELETE_STALE_BEANS = f'''
+WITH gone AS (
+    DELETE FROM {BEANS_TABLE} AS b
+    WHERE {_OWNED_BY_CSV}
+        AND NOT EXISTS (SELECT 1 FROM {BEANS_STAGE_TABLE} AS s WHERE s.{BEANS_COL_ROW_KEY} = b.{BEANS_COL_ROW_KEY})
+    RETURNING b.{BEANS_COL_ID}
+)
+INSERT INTO {TOUCHED_BEANS_TABLE} (id) SELECT {BEANS_COL_ID} FROM gone
+'''
+
+# Beans are written with their roaster link and marked as indexed, because
+# their tokens follow in the same transaction: every bean row is written
+# once, never revisited by an UPDATE.
+UPDATE_CHANGED_BEANS = f'''
+WITH changed AS (
+    UPDATE {BEANS_TABLE} AS b SET
+        {", ".join(f"{col} = s.{col}" for col in BEANS_VALUE_COLUMNS)},
+        {BEANS_COL_ROW_HASH} = s.{BEANS_COL_ROW_HASH},
+        {BEANS_COL_ROASTER_ID} = s.{BEANS_COL_ROASTER_ID},
+        {BEANS_COL_TOKENS_INDEXED} = 1
+    FROM {BEANS_STAGE_TABLE} AS s
+    WHERE s.{BEANS_COL_ROW_KEY} = b.{BEANS_COL_ROW_KEY}
+        AND {_OWNED_BY_CSV}
+        AND b.{BEANS_COL_ROW_HASH} IS DISTINCT FROM s.{BEANS_COL_ROW_HASH}
+    RETURNING b.{BEANS_COL_ID}
+)
+INSERT INTO {TOUCHED_BEANS_TABLE} (id) SELECT {BEANS_COL_ID} FROM changed
+'''
+
+DELETE_TOUCHED_BEAN_TOKENS = [
+    f'''
+    DELETE FROM {table} AS t USING {TOUCHED_BEANS_TABLE} AS b
+    WHERE t.{TOKENS_COL_BEAN_ID} = b.id
+    '''
+    for table, _, _ in BEAN_TOKEN_TABLES
+]
+
+_INSERT_STAGED_BEANS = f'''
+WITH added AS (
+    INSERT INTO {BEANS_TABLE} ({", ".join(BEANS_INSERT_COLUMNS)}, {BEANS_COL_ROASTER_ID}, {BEANS_COL_TOKENS_INDEXED})
+    SELECT {", ".join(f"s.{col}" for col in BEANS_INSERT_COLUMNS)}, s.{BEANS_COL_ROASTER_ID}, 1
+    FROM {BEANS_STAGE_TABLE} AS s
+    {{where}}
+    ORDER BY s.position
+    RETURNING {BEANS_COL_ID}
+)
+INSERT INTO {TOUCHED_BEANS_TABLE} (id) SELECT {BEANS_COL_ID} FROM added
+'''
+
+INSERT_STAGED_BEANS = _INSERT_STAGED_BEANS.format(where='')
+
+INSERT_NEW_STAGED_BEANS = _INSERT_STAGED_BEANS.format(where=f'''WHERE NOT EXISTS (
+        SELECT 1 FROM {BEANS_TABLE} AS b
+        WHERE b.{BEANS_COL_ROW_KEY} = s.{BEANS_COL_ROW_KEY} AND {_OWNED_BY_CSV}
+    )''')
+
+_TOKEN_SOURCE_COLUMNS = ", ".join(f"b.{source}" for _, _, source in BEAN_TOKEN_TABLES)
+
+SELECT_TOUCHED_BEAN_TOKENS = f'''
+SELECT b.{BEANS_COL_ID}, {_TOKEN_SOURCE_COLUMNS}
+FROM {TOUCHED_BEANS_TABLE} AS t
+JOIN {BEANS_TABLE} AS b ON b.{BEANS_COL_ID} = t.id
+ORDER BY b.{BEANS_COL_ID}
+'''
+
+SELECT_BEANS_PENDING_TOKENS_POSTGRES = f'''
+SELECT {BEANS_COL_ID}, {", ".join(source for _, _, source in BEAN_TOKEN_TABLES)}
+FROM {BEANS_TABLE}
+WHERE {BEANS_COL_TOKENS_INDEXED} = 0
+ORDER BY {BEANS_COL_ID}
+'''
+
+# Leftovers of a bean's previous values, or of an interrupted pass.
+DELETE_PENDING_BEAN_TOKENS = [
+    f'''
+    DELETE FROM {table} AS t USING {BEANS_TABLE} AS b
+    WHERE t.{TOKENS_COL_BEAN_ID} = b.{BEANS_COL_ID} AND b.{BEANS_COL_TOKENS_INDEXED} = 0
+    '''
+    for table, _, _ in BEAN_TOKEN_TABLES
+]
+
+MARK_BEAN_TOKENS_INDEXED_POSTGRES = f'''
+UPDATE {BEANS_TABLE} SET {BEANS_COL_TOKENS_INDEXED} = 1 WHERE {BEANS_COL_ID} = ANY(%s)
+'''
+
+
 def preview_table(conn, table: str, limit: int = 5):
     cursor = conn.cursor()
     cursor.execute(f'SELECT * FROM {table} LIMIT {limit}')
@@ -9,6 +9,13 @@ BEANS_COL_WEIGHT_GRAMS = 'weight_grams'
 BEANS_COL_TASTING_NOTES = 'tasting_notes'
 BEANS_COL_ORIGIN_COUNTRY = 'origin_country'
 BEANS_COL_PROCESSING_METHOD = 'processing_method'
+BEANS_COL_ROW_KEY = 'row_key'
+BEANS_COL_ROW_HASH = 'row_hash'
+BEANS_COL_SOURCE = 'source'
+BEANS_COL_TOKENS_INDEXED = 'tokens_indexed'
+BEANS_COL_ROASTER_ID = 'roaster_id'
+
+BEANS_FTS_TABLE = 'coffee_beans_fts'
 
 ROASTERS_TABLE = 'coffee_roasters'
 ROASTERS_COL_ID = 'id'
@@ -19,3 +26,27 @@ ROASTERS_COL_COUNTRY = 'country'
 ROASTERS_COL_LAT = 'lat'
 ROASTERS_COL_LON = 'lon'
 ROASTERS_COL_WEBSITE = 'website'
+ROASTERS_COL_ROW_HASH = 'row_hash'
+ROASTERS_COL_NAME_KEY = 'name_key'
+
+GEOCODE_CACHE_TABLE = 'geocode_cache'
+GEOCODE_COL_LOCATION_KEY = 'location_key'
+GEOCODE_COL_LAT = 'lat'
+GEOCODE_COL_LON = 'lon'
+GEOCODE_COL_FOUND = 'found'
+GEOCODE_COL_FETCHED_AT = 'fetched_at'
+
+CSV_FINGERPRINTS_TABLE = 'csv_fingerprints'
+FINGERPRINT_COL_PATH = 'path'
+FINGERPRINT_COL_SIZE = 'size'
+FINGERPRINT_COL_MTIME_NS = 'mtime_ns'
+FINGERPRINT_COL_SHA256 = 'sha256'
+FINGERPRINT_COL_LOADED_AT = 'loaded_at'
+
+BEAN_TASTING_NOTES_TABLE = 'bean_tasting_notes'
+BEAN_ORIGINS_TABLE = 'bean_origins'
+BEAN_PROCESSING_METHODS_TABLE = 'bean_processing_methods'
+TOKENS_COL_BEAN_ID = 'bean_id'
+TASTING_NOTES_COL_NOTE = 'note'
+ORIGINS_COL_COUNTRY = 'country'
+PROCESSING_METHODS_COL_METHOD = 'method'
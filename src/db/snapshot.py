@@ -0,0 +1,154 @@
+"""Columnar (Arrow IPC) snapshots of the beans, roasters and tasting-note tables.
+
+The build writes one uncompressed Arrow file per table after each ingest.
+Loaders memory-map it, so numeric columns are zero-copy views and every
+worker reading the same file shares the same page-cache pages instead of
+holding its own copy.
+
+A snapshot records the SQLite file signature it was taken from and is only
+served while the database is unchanged. pyarrow is optional; without it the
+loaders simply keep reading SQL or CSV.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional dependency
+    pa = None
+
+from src.config import SNAPSHOT_ENABLED, SNAPSHOT_DIR
+from .dtypes import TABLE_DTYPES, apply_dtypes
+
+_SIGNATURE_KEY = b'coffee_canary.source'
+
+
+def snapshots_available() -> bool:
+    return SNAPSHOT_ENABLED and pa is not None
+
+
+def snapshot_dir(db_path) -> Path:
+    """SNAPSHOT_DIR if set, otherwise a directory next to the database file."""
+    return Path(SNAPSHOT_DIR) if SNAPSHOT_DIR else Path(f"{db_path}-snapshot")
+
+
+def snapshot_path(db_path, table: str) -> Path:
+    return snapshot_dir(db_path) / f"{table}.arrow"
+
+
+def source_signature(db_path) -> dict:
+    """Identity of the database contents a snapshot was taken from."""
+    files = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            files.append(None)
+            continue
+        # An empty WAL holds no data; readers may create one without writing.
+        files.append([stat.st_mtime_ns, stat.st_size] if stat.st_size else None)
+    return {'db': os.path.abspath(db_path), 'files': files}
+
+
+def _stored_signature(path: Path) -> Optional[dict]:
+    try:
+        schema = pa.ipc.open_file(pa.memory_map(str(path), 'r')).schema
+        return json.loads(schema.metadata[_SIGNATURE_KEY])
+    except (OSError, KeyError, TypeError, ValueError, pa.ArrowException):
+        return None
+
+
+def _write_table(df: pd.DataFrame, path: Path, signature: dict):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        _SIGNATURE_KEY: json.dumps(signature).encode('utf-8'),
+    })
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so a worker never maps a half-written file.
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    os.close(fd)
+    try:
+        # Uncompressed, so readers can map buffers instead of decoding them.
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def write_snapshots(db_path='data/coffee_canary.db', force=False) -> bool:
+    """Snapshot every table in TABLE_DTYPES, skipping tables whose snapshot is current.
+
+    Returns False when snapshots are disabled or pyarrow is missing.
+    """
+    if not snapshots_available():
+        if SNAPSHOT_ENABLED:
+            print("pyarrow not installed; skipping columnar snapshot.")
+        return False
+
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    try:
+        # Fold the WAL into the main file first, so a later checkpoint cannot
+        # change the file signature without the data changing too.
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        signature = source_signature(db_path)
+        stale = [
+            table for table in TABLE_DTYPES
+            if force or _stored_signature(snapshot_path(db_path, table)) != signature
+        ]
+        frames = {
+            table: apply_dtypes(pd.read_sql(f'SELECT * FROM {table}', conn), TABLE_DTYPES[table])
+            for table in stale
+        }
+    finally:
+        conn.close()
+
+    for table, df in frames.items():
+        _write_table(df, snapshot_path(db_path, table), signature)
+    if stale:
+        print(f"Wrote columnar snapshot of {', '.join(stale)} in {time.perf_counter() - start:.2f}s")
+    else:
+        print("Columnar snapshot up to date.")
+    return True
+
+
+def read_snapshot(db_path, table: str, columns=None) -> Optional[pd.DataFrame]:
+    """Memory-mapped frame for `table`, or None if there is no current snapshot."""
+    if not snapshots_available():
+        return None
+    path = snapshot_path(db_path, table)
+    if not path.exists():
+        return None
+    try:
+        # The mapping stays alive as long as the frame's buffers reference it.
+        reader = pa.ipc.open_file(pa.memory_map(str(path), 'r'))
+        stored = json.loads(reader.schema.metadata[_SIGNATURE_KEY])
+        if stored != source_signature(db_path):
+            return None
+        arrow_table = reader.read_all()
+        if columns is not None:
+            arrow_table = arrow_table.select(list(columns))
+        df = arrow_table.to_pandas(split_blocks=True)
+    except (OSError, KeyError, TypeError, ValueError, pa.ArrowException) as e:
+        print(f"Error reading snapshot {path}: {e}")
+        return None
+    return apply_dtypes(df, TABLE_DTYPES[table])
+
+
+__all__ = [
+    'snapshots_available',
+    'snapshot_path',
+    'write_snapshots',
+    'read_snapshot',
+]
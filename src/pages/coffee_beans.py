@@ -1,47 +1,252 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import html, dcc
+from dash import html, dcc, callback, ctx, Input, Output
 
-from src.utils.data_helpers import (
-    load_beans_dataframe,
-    load_roasters_dataframe,
+# The loaders, filter cube and plot builders (pandas and plotly with them) are
+# imported where they are used, so the page costs nothing until first drawn.
+from src.utils.data_cache import get_cached
+from src.utils.component_ids import ROASTER_MAP_ID, ROASTER_CLUSTERS_ID, CUMULATIVE_WEIGHT_GRAPH_ID
+from src.db.aggregations import AGG_COL_ROASTER, AGG_COL_LOCATION
+from src.db.schema import (
+    BEANS_COL_ID,
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_ROAST_LEVEL,
+    BEANS_COL_WEIGHT_GRAMS,
+    BEANS_COL_ORIGIN_COUNTRY,
+    BEANS_COL_ROASTER_ID,
+    ROASTERS_COL_NAME,
+    ROASTERS_COL_CITY,
+    ROASTERS_COL_STATE,
+    ROASTERS_COL_LAT,
+    ROASTERS_COL_LON
 )
-from src.utils import plots
 
 dash.register_page(__name__, path='/coffee_beans', name='Coffee Beans')
 
-beans_df = load_beans_dataframe()
-roasters_df = load_roasters_dataframe()
-
-layout = dbc.Container([
-    dbc.Row(html.H2("Antonio's Coffee Bean Purchase Dashboard")),
-    html.Div(
-        children=[
-            html.H3("Roaster Locations"),
-            plots.make_roaster_location_map(roasters_df),
-        ],
-        style={'width': '75%', 'marginLeft': 'auto', 'marginRight': 'auto'}
-    ),
-    dbc.Row(
-        children=[
+MONTH_RANGE_ID = 'filter-months'
+ROASTER_FILTER_ID = 'filter-roasters'
+ROAST_LEVEL_FILTER_ID = 'filter-roast-levels'
+ORIGIN_FILTER_ID = 'filter-origins'
+ROAST_LEVEL_GRAPH_ID = 'roast-level-graph'
+ROASTER_GRAPH_ID = 'roaster-graph'
+TASTING_NOTES_GRAPH_ID = 'tasting-notes-graph'
+
+FILTER_INPUTS = [
+    Input(MONTH_RANGE_ID, 'value'),
+    Input(ROASTER_FILTER_ID, 'value'),
+    Input(ROAST_LEVEL_FILTER_ID, 'value'),
+    Input(ORIGIN_FILTER_ID, 'value'),
+]
+
+# roaster_id resolves the roaster dimension to the names the roaster chart uses.
+CUBE_BEAN_COLUMNS = [
+    BEANS_COL_ID, BEANS_COL_PURCHASE_DATE, BEANS_COL_ROASTER, BEANS_COL_ROASTER_ID,
+    BEANS_COL_ROAST_LEVEL, BEANS_COL_WEIGHT_GRAMS, BEANS_COL_ORIGIN_COUNTRY
+]
+
+
+# Only what the map needs; typed loads come from the shared columnar snapshot.
+MAP_ROASTER_COLUMNS = [
+    ROASTERS_COL_NAME, ROASTERS_COL_CITY, ROASTERS_COL_STATE, ROASTERS_COL_LAT, ROASTERS_COL_LON
+]
+
+
+def _load_map_roasters():
+    from src.utils.data_helpers import load_roasters_dataframe
+
+    return load_roasters_dataframe(columns=MAP_ROASTER_COLUMNS, typed=True)
+
+
+def _build_cluster_index():
+    from src.utils import plots
+
+    roasters_df = get_cached('roasters_df', _load_map_roasters, background=False)
+    return plots.build_roaster_cluster_index(roasters_df)
+
+
+def _build_filter_cube():
+    import pandas as pd
+    from src.utils.data_helpers import (
+        load_beans_dataframe, load_roaster_counts, load_tasting_note_pairs, with_roaster_names
+    )
+    from src.utils.filter_cube import FilterCube
+
+    beans_df = with_roaster_names(load_beans_dataframe(columns=CUBE_BEAN_COLUMNS, typed=True))
+    if beans_df.empty:
+        beans_df = pd.DataFrame(columns=CUBE_BEAN_COLUMNS)
+    roaster_counts = get_cached('roaster_counts', load_roaster_counts, background=False)
+    locations = roaster_counts.set_index(AGG_COL_ROASTER)[AGG_COL_LOCATION]
+    return FilterCube(beans_df, load_tasting_note_pairs(), locations)
+
+
+def _month_marks(month_range) -> dict:
+    from src.utils.filter_cube import month_start
+
+    first, last = month_range
+    # One mark per January, or per month when the data spans under two years.
+    step = 1 if last - first < 24 else 12
+    return {
+        month: month_start(month).strftime('%b %Y' if step == 1 else '%Y')
+        for month in range(first, last + 1)
+        if step == 1 or month % 12 == 0
+    }
+
+
+def _filters(cube):
+    """Month slider and label dropdowns spanning a `FilterCube`'s contents."""
+    month_range = cube.month_range or (0, 0)
+    dropdown = lambda id, labels, placeholder: dcc.Dropdown(
+        id=id, options=sorted(labels), multi=True, placeholder=placeholder
+    )
+    return dbc.Row([
+        dbc.Col(dcc.RangeSlider(
+            id=MONTH_RANGE_ID,
+            min=month_range[0],
+            max=month_range[1],
+            step=1,
+            value=list(month_range),
+            marks=_month_marks(month_range),
+            disabled=cube.month_range is None,
+        ), width=12),
+        dbc.Col(dropdown(ROASTER_FILTER_ID, cube.roasters, 'All roasters'), md=4),
+        dbc.Col(dropdown(ROAST_LEVEL_FILTER_ID, cube.roast_levels, 'All roast levels'), md=4),
+        dbc.Col(dropdown(ORIGIN_FILTER_ID, cube.origins, 'All origins'), md=4),
+    ], className='g-2 my-3')
+
+
+def _build_layout():
+    from src.utils import plots
+    from src.utils.data_helpers import (
+        load_roast_level_counts, load_roaster_counts, load_cumulative_weight, load_top_tasting_notes
+    )
+
+    # Already off the request path when refreshing, so load inline rather than
+    # risk building the new layout from stale frames.
+    cluster_index = get_cached('roaster_cluster_index', _build_cluster_index, background=False)
+    roast_level_counts = get_cached('roast_level_counts', load_roast_level_counts, background=False)
+    roaster_counts = get_cached('roaster_counts', load_roaster_counts, background=False)
+    cumulative_weight = get_cached('cumulative_weight', load_cumulative_weight, background=False)
+    top_tasting_notes = get_cached('top_tasting_notes', load_top_tasting_notes, background=False)
+    filter_cube = get_cached('filter_cube', _build_filter_cube, background=False)
+
+    return dbc.Container([
+        dbc.Row(html.H2("Antonio's Coffee Bean Purchase Dashboard")),
+        html.Div(
+            children=[
+                html.H3("Roaster Locations"),
+                plots.make_roaster_location_map(cluster_index),
+            ],
+            style={'width': '75%', 'marginLeft': 'auto', 'marginRight': 'auto'}
+        ),
+        _filters(filter_cube),
+        dbc.Row(
+            children=[
+                dcc.Graph(
+                    id=ROAST_LEVEL_GRAPH_ID,
+                    figure=plots.make_roast_level_pie(roast_level_counts),
+                    style={'display': 'inline-block', 'width': '48%'}
+                ),
+                dcc.Graph(
+                    id=CUMULATIVE_WEIGHT_GRAPH_ID,
+                    figure=plots.make_cumulative_weight_line(cumulative_weight),
+                    style={'display': 'inline-block', 'width': '48%'}
+                )
+            ]
+        ),
+        dbc.Row(children=[
             dcc.Graph(
-                figure=plots.make_roast_level_pie(beans_df),
+                id=ROASTER_GRAPH_ID,
+                figure=plots.make_roaster_distribution(roaster_counts),
                 style={'display': 'inline-block', 'width': '48%'}
             ),
-            dcc.Graph(
-                figure=plots.make_cumulative_weight_line(beans_df),
-                style={'display': 'inline-block', 'width': '48%'}
-            )
-        ]
-    ),
-    dbc.Row(children=[
         dcc.Graph(
-            figure=plots.make_roaster_distribution(beans_df, roasters_df),
+            id=TASTING_NOTES_GRAPH_ID,
+            figure=plots.make_coffee_notes_distribution(top_tasting_notes),
             style={'display': 'inline-block', 'width': '48%'}
-        ),
-    dcc.Graph(
-        figure=plots.make_coffee_notes_distribution(beans_df),
-        style={'display': 'inline-block', 'width': '48%'}
+        )
+        ])
+    ], fluid=True)
+
+
+def layout(**kwargs):
+    """Rebuilt only when the underlying data changes; otherwise served from cache."""
+    return get_cached('coffee_beans_layout', _build_layout)
+
+
+@callback(
+    Output(ROASTER_CLUSTERS_ID, 'data'),
+    Input(ROASTER_MAP_ID, 'bounds'),
+    Input(ROASTER_MAP_ID, 'zoom'),
+    prevent_initial_call=True,
+)
+def update_roaster_clusters(bounds, zoom):
+    """Send only the clusters inside the visible map, re-clustered for its zoom."""
+    cluster_index = get_cached('roaster_cluster_index', _build_cluster_index)
+    return cluster_index.query(bounds, zoom)
+
+
+def _filter_view(months, roasters, roast_levels, origins):
+    """The cube's memoized view for the current filters, or None when nothing is filtered."""
+    cube = get_cached('filter_cube', _build_filter_cube)
+    key = cube.key(months, roasters, roast_levels, origins)
+    return None if key.unfiltered else cube.select(key)
+
+
+@callback(
+    Output(ROAST_LEVEL_GRAPH_ID, 'figure'),
+    Output(ROASTER_GRAPH_ID, 'figure'),
+    Output(TASTING_NOTES_GRAPH_ID, 'figure'),
+    *FILTER_INPUTS,
+    prevent_initial_call=True,
+)
+def filter_charts(months, roasters, roast_levels, origins):
+    """Redraw the count charts from the filter cube; cost scales with cube cells, not beans."""
+    from src.utils import plots
+    from src.utils.data_helpers import load_roast_level_counts, load_roaster_counts, load_top_tasting_notes
+
+    view = _filter_view(months, roasters, roast_levels, origins)
+    if view is None:
+        return (
+            plots.make_roast_level_pie(get_cached('roast_level_counts', load_roast_level_counts)),
+            plots.make_roaster_distribution(get_cached('roaster_counts', load_roaster_counts)),
+            plots.make_coffee_notes_distribution(get_cached('top_tasting_notes', load_top_tasting_notes)),
+        )
+    return (
+        plots.make_roast_level_pie(view.roast_level_counts),
+        plots.make_roaster_distribution(view.roaster_counts),
+        plots.make_coffee_notes_distribution(view.top_tasting_notes),
     )
-    ])
-], fluid=True)
\ No newline at end of file
+
+
+def _zoom_range(relayout_data):
+    """The x window of the graph's last relayout: (start, end), or None for the full range."""
+    relayout_data = relayout_data or {}
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
+
+
+@callback(
+    Output(CUMULATIVE_WEIGHT_GRAPH_ID, 'figure'),
+    Input(CUMULATIVE_WEIGHT_GRAPH_ID, 'relayoutData'),
+    *FILTER_INPUTS,
+    prevent_initial_call=True,
+)
+def update_cumulative_weight(relayout_data, months, roasters, roast_levels, origins):
+    """Redraw for the filters (monthly, from the cube) or a zoom (full daily detail).
+
+    The daily series is still capped at LINE_MAX_POINTS.
+    """
+    from src.utils import plots
+    from src.utils.data_helpers import load_cumulative_weight
+
+    if ctx.triggered_id == CUMULATIVE_WEIGHT_GRAPH_ID:
+        relayout_data = relayout_data or {}
+        if _zoom_range(relayout_data) is None and not relayout_data.get('xaxis.autorange'):
+            return dash.no_update
+    view = _filter_view(months, roasters, roast_levels, origins)
+    series = view.monthly_weight if view is not None else get_cached('cumulative_weight', load_cumulative_weight)
+    return plots.make_cumulative_weight_line(series, _zoom_range(relayout_data))
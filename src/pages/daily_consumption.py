@@ -1,17 +1,70 @@
 import dash
 from dash import html, dcc
 import dash_bootstrap_components as dbc
-from src.utils.data_helpers import (
-    load_beans_dataframe,
-    load_roasters_dataframe,
+# The loaders, engine and plot builders (pandas and plotly with them) are
+# imported where they are used, so the page costs nothing until first drawn.
+from src.utils.data_cache import get_cached
+from src.db.schema import (
+    BEANS_COL_ID,
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_WEIGHT_GRAMS,
+    BEANS_COL_ROASTER_ID
 )
 
 dash.register_page(__name__, path="/daily_consumption", name="Daily Consumption")
 
+CONSUMPTION_COLUMNS = [
+    BEANS_COL_ID, BEANS_COL_PURCHASE_DATE, BEANS_COL_WEIGHT_GRAMS, BEANS_COL_ROASTER, BEANS_COL_ROASTER_ID
+]
+TOP_ROASTERS = 8
 
+# The last engine built; a data change that only appends purchases extends it.
+_engine = None
 
-layout = dbc.Container([
-    dbc.Row([
-        dbc.Col(html.H2("Antonio's Daily Coffee Consumption Trends"), width=12)
-    ]),
-], fluid=True)
\ No newline at end of file
+
+def _load_engine():
+    from src.utils.consumption import refresh_engine
+    from src.utils.data_helpers import load_beans_dataframe, with_roaster_names
+
+    global _engine
+    purchases = with_roaster_names(load_beans_dataframe(columns=CONSUMPTION_COLUMNS, typed=True))
+    _engine = refresh_engine(_engine, purchases)
+    return _engine
+
+
+def _stat(label, value):
+    return dbc.Col(dbc.Card(dbc.CardBody([html.H6(label), html.H4(value)])), md=4)
+
+
+def _build_layout():
+    from src.utils import plots
+    from src.utils.consumption import rolling_col
+
+    engine = get_cached('consumption_engine', _load_engine, background=False)
+    daily = engine.daily()
+    stats = []
+    if not daily.empty:
+        stats = [
+            _stat("Last 30 days", f"{daily[rolling_col(30)].iloc[-1]:.1f} g/day"),
+            _stat("All time", f"{engine.total_grams / len(daily):.1f} g/day"),
+            _stat("Bags logged", f"{engine.bag_count:,}"),
+        ]
+
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(html.H2("Antonio's Daily Coffee Consumption Trends"), width=12)
+        ]),
+        html.P(
+            "Each purchase is assumed to be drunk evenly until the next one; "
+            "the latest is spread over the typical gap between purchases."
+        ),
+        dbc.Row(stats, className='g-2 mb-3'),
+        dcc.Graph(figure=plots.make_daily_consumption_line(daily)),
+        dcc.Graph(figure=plots.make_roaster_consumption_area(engine.by_roaster(TOP_ROASTERS))),
+    ], fluid=True)
+
+
+def layout(**kwargs):
+    """Rebuilt only when the underlying data changes; otherwise served from cache."""
+    return get_cached('daily_consumption_layout', _build_layout)
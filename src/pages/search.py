@@ -0,0 +1,44 @@
+import dash
+import dash_bootstrap_components as dbc
+from dash import html, dcc, callback, Input, Output
+
+dash.register_page(__name__, path='/search', name='Search Beans')
+
+layout = dbc.Container([
+    dbc.Row(html.H2("Search Coffee Beans")),
+    dbc.Row(
+        dcc.Input(
+            id='bean-search-input',
+            type='search',
+            placeholder='Blend, roaster, tasting note or origin...',
+            debounce=0.25,
+            autoFocus=True,
+            style={'width': '100%'}
+        ),
+        className='mb-3'
+    ),
+    html.Div(id='bean-search-status', className='text-muted mb-2'),
+    html.Div(id='bean-search-results'),
+], fluid=True)
+
+
+@callback(
+    Output('bean-search-results', 'children'),
+    Output('bean-search-status', 'children'),
+    Input('bean-search-input', 'value'),
+)
+def update_search_results(query):
+    if not query or not query.strip():
+        return None, ''
+    # On first use: search pulls in pandas and the database engine.
+    from src.utils.search import search_beans
+
+    results = search_beans(query)
+    if results.empty:
+        return None, f"No beans match '{query}'."
+
+    results.columns = [col.replace('_', ' ').title() for col in results.columns]
+    table = dbc.Table.from_dataframe(results, striped=True, hover=True, size='sm')
+    # No timing in the output: the response is cached and tagged on the query
+    # alone (http_cache), and search latency is in /metrics per callback.
+    return table, f"{len(results)} results"
@@ -0,0 +1,179 @@
+"""HTTP bulk import: POST a CSV or NDJSON body of beans to IMPORT_ROUTE.
+
+The body is streamed to a job directory under IMPORT_DIR in fixed-size
+blocks and imported by a separate process (`python -m src.utils.bulk_import
+<job dir>`), so an upload of any size holds a worker only while the bytes
+arrive, and a worker restart does not cut an import short. Progress goes to
+the job's status.json, with the importing process's pid, and rejected rows
+to its rejects.csv; both live on disk so any worker on the host can answer
+the status request. A job whose process is gone before it finished is
+reported as failed.
+
+The routes exist only when IMPORT_TOKEN is set, and every request must send
+it as `Authorization: Bearer <token>`.
+"""
+import csv
+import hmac
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import uuid
+from pathlib import Path
+
+from src.config import DB_PATH, IMPORT_TOKEN, IMPORT_DIR
+
+IMPORT_ROUTE = '/api/import/beans'
+UPLOAD_BLOCK_SIZE = 1 << 20
+# States an import can still leave; any other is final.
+PENDING_STATES = ('queued', 'running')
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _job_dir(job_id: str) -> Path:
+    return Path(IMPORT_DIR) / job_id
+
+
+def _write_status(job_dir: Path, status: dict):
+    # Replace atomically so a status request never reads a partial file.
+    tmp_path = job_dir / 'status.json.tmp'
+    tmp_path.write_text(json.dumps(status))
+    os.replace(tmp_path, job_dir / 'status.json')
+
+
+def _read_status(job_dir: Path) -> dict:
+    return json.loads((job_dir / 'status.json').read_text())
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _run_job(job_dir: Path):
+    """Import the job's upload, recording progress in its status.json."""
+    from src.db.importer import iter_import
+
+    status = _read_status(job_dir)
+    status.update(state='running', pid=os.getpid())
+    _write_status(job_dir, status)
+    upload = job_dir / f"upload.{status['format']}"
+    try:
+        with open(upload, 'rb') as stream, \
+                open(job_dir / 'rejects.csv', 'w', newline='', encoding='utf-8') as rejects_file:
+            rejects = csv.writer(rejects_file)
+            rejects.writerow(['row', 'reason'])
+            events = iter_import(stream, status['format'], DB_PATH, status['source'], db_url=os.getenv('DB_URL'))
+            for event in events:
+                if event['event'] == 'reject':
+                    rejects.writerow([event['row'], event['reason']])
+                    continue
+                rejects_file.flush()
+                status.update({k: v for k, v in event.items() if k != 'event'})
+                if event['event'] == 'done':
+                    status['state'] = 'done'
+                _write_status(job_dir, status)
+    except Exception as e:
+        status.update(state='failed', error=str(e))
+        _write_status(job_dir, status)
+        print(f"Import {job_dir.name} failed: {e}")
+    finally:
+        upload.unlink(missing_ok=True)
+
+
+def _fail_if_exited(job_dir: Path, status: dict) -> dict:
+    """Mark a pending job failed once its process is gone without finishing it."""
+    if status['state'] not in PENDING_STATES or 'pid' not in status or _process_alive(status['pid']):
+        return status
+    # It may have finished between the two reads.
+    status = _read_status(job_dir)
+    if status['state'] in PENDING_STATES:
+        status.update(state='failed', error='import process exited before finishing')
+        _write_status(job_dir, status)
+    return status
+
+
+def _start_job(job_dir: Path):
+    """Run the import in its own session, so it outlives this worker."""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'src.utils.bulk_import', str(job_dir)],
+        cwd=REPO_ROOT, start_new_session=True
+    )
+
+    def reap():
+        # Waiting also keeps the finished process from lingering as a zombie.
+        if process.wait() != 0:
+            _fail_if_exited(job_dir, {**_read_status(job_dir), 'pid': process.pid})
+
+    threading.Thread(target=reap, name=f'import-{job_dir.name}', daemon=True).start()
+
+
+def install_import(server):
+    """Attach the bulk import routes to a Flask app when IMPORT_TOKEN is configured."""
+    from flask import abort, jsonify, request, send_file, url_for
+
+    if not IMPORT_TOKEN:
+        return
+    # Only once the routes exist; the importer pulls in the whole build pipeline.
+    from src.db.importer import IMPORT_FORMATS, DEFAULT_IMPORT_SOURCE, format_for
+
+    def _check_token():
+        expected = f"Bearer {IMPORT_TOKEN}"
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            abort(401)
+
+    @server.route(IMPORT_ROUTE, methods=['POST'])
+    def start_import():
+        _check_token()
+        fmt = request.args.get('format') or format_for(request.content_type or '', default='')
+        if fmt not in IMPORT_FORMATS:
+            return jsonify(error=f"format must be one of {', '.join(IMPORT_FORMATS)}"), 400
+        source = request.args.get('source') or DEFAULT_IMPORT_SOURCE
+
+        job_id = uuid.uuid4().hex
+        job_dir = _job_dir(job_id)
+        job_dir.mkdir(parents=True)
+        upload = job_dir / f'upload.{fmt}'
+        try:
+            with open(upload, 'wb') as f:
+                while block := request.stream.read(UPLOAD_BLOCK_SIZE):
+                    f.write(block)
+        except OSError:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        _write_status(job_dir, {'job': job_id, 'state': 'queued', 'format': fmt, 'source': source})
+        _start_job(job_dir)
+        return jsonify(job=job_id, status=url_for('import_status', job_id=job_id)), 202
+
+    @server.route(f'{IMPORT_ROUTE}/<job_id>')
+    def import_status(job_id):
+        _check_token()
+        job_dir = _job_dir(job_id)
+        if not job_id.isalnum() or not (job_dir / 'status.json').exists():
+            abort(404)
+        return jsonify(_fail_if_exited(job_dir, _read_status(job_dir)))
+
+    @server.route(f'{IMPORT_ROUTE}/<job_id>/rejects')
+    def import_rejects(job_id):
+        _check_token()
+        rejects_path = _job_dir(job_id) / 'rejects.csv'
+        if not job_id.isalnum() or not rejects_path.exists():
+            abort(404)
+        return send_file(rejects_path.resolve(), mimetype='text/csv')
+
+
+__all__ = [
+    'IMPORT_ROUTE',
+    'install_import',
+]
+
+
+if __name__ == "__main__":
+    _run_job(Path(sys.argv[1]))
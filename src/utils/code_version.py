@@ -0,0 +1,35 @@
+"""Identity of the running code, for caches that outlive a deploy."""
+import functools
+import hashlib
+from importlib.metadata import version as package_version
+from pathlib import Path
+
+_SOURCE_ROOT = Path(__file__).resolve().parents[1]
+
+
+@functools.lru_cache(maxsize=1)
+def _source_digest() -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for path in sorted(_SOURCE_ROOT.rglob('*')):
+        if path.is_file() and '__pycache__' not in path.parts:
+            stat = path.stat()
+            digest.update(f'{path.relative_to(_SOURCE_ROOT)}:{stat.st_size}:{stat.st_mtime_ns}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_signature(*packages: str) -> str:
+    """Digest of the app's sources and assets plus the named packages' versions.
+
+    Read once per process; a deploy (new files or upgraded packages) changes it.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for package in packages:
+        digest.update(f'{package}={package_version(package)}'.encode('utf-8'))
+    digest.update(_source_digest().encode('utf-8'))
+    return digest.hexdigest()
+
+
+__all__ = [
+    'code_signature',
+]
@@ -0,0 +1,8 @@
+"""Ids of the Dash components the plot builders create and page callbacks target.
+
+Free of imports, so a page can declare its callbacks at startup without
+loading the builders (and pandas and plotly with them) before it is drawn.
+"""
+ROASTER_MAP_ID = 'roaster-map'
+ROASTER_CLUSTERS_ID = 'roaster-clusters'
+CUMULATIVE_WEIGHT_GRAPH_ID = 'cumulative-weight-graph'
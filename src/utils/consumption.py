@@ -0,0 +1,230 @@
+"""Daily coffee consumption estimated from the purchase log.
+
+Bags bought on one day are assumed to be drunk evenly over the days until the
+next purchase, so each bag becomes a constant grams-per-day rate over an
+interval of day numbers. The daily series is the sum of those intervals,
+built with a difference array (one bincount for the starts, one for the
+ends), and the rolling series are differences of its running total, so
+everything is linear in bags + days.
+
+The newest purchase day has no next purchase yet; it is spread over the
+median gap between purchase days. Only that open interval changes when a
+later purchase arrives, so `extended` recomputes from the previous last
+purchase day onward and keeps the rest of the history as it was.
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from ..db.schema import (
+    BEANS_COL_ID,
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_WEIGHT_GRAMS
+)
+from ..db.aggregations import AGG_COL_ROASTER
+
+AGG_COL_DAY = 'day'
+AGG_COL_GRAMS_PER_DAY = 'grams_per_day'
+ROLLING_WINDOWS = (7, 30, 90)
+# Gap assumed for the newest purchase when there is only one purchase day.
+DEFAULT_OPEN_GAP_DAYS = 14
+OTHER_ROASTERS = 'Other'
+
+
+def rolling_col(window: int) -> str:
+    return f'rolling_{window}d'
+
+
+def _rolling(running: np.ndarray, window: int, start: int = 0) -> np.ndarray:
+    """Trailing mean over `window` days for positions `start:`, from the running total."""
+    i = np.arange(start, len(running))
+    before = np.where(i >= window, running[np.maximum(i - window, 0)], 0.0)
+    return (running[i] - before) / np.minimum(i + 1, window)
+
+
+def _prepare(purchases: pd.DataFrame) -> pd.DataFrame:
+    """Dated, weighed purchases in purchase order."""
+    df = purchases.dropna(subset=[BEANS_COL_PURCHASE_DATE, BEANS_COL_WEIGHT_GRAMS])
+    df = df.assign(**{BEANS_COL_PURCHASE_DATE: pd.to_datetime(df[BEANS_COL_PURCHASE_DATE]).dt.normalize()})
+    order = [BEANS_COL_PURCHASE_DATE] + ([BEANS_COL_ID] if BEANS_COL_ID in df.columns else [])
+    return df.sort_values(order, kind='stable')
+
+
+class ConsumptionEngine:
+    """Consumption series for one purchase log. Instances are never modified.
+
+    Roasters are grouped on the log's roaster text; resolve it first with
+    `data_helpers.with_roaster_names` so spelling variants count as one roaster.
+    """
+
+    def __init__(self, purchases: pd.DataFrame):
+        df = _prepare(purchases)
+        self.start = df[BEANS_COL_PURCHASE_DATE].iloc[0] if len(df) else None
+        self._roaster_labels: list[str] = []
+        self._roaster_codes: dict[str, int] = {}
+        self._day = np.empty(0, dtype=np.int64)
+        self._purchase_days = np.empty(0, dtype=np.int64)
+        self._weight = np.empty(0, dtype=float)
+        self._roaster = np.empty(0, dtype=np.int64)
+        self.max_id = -1
+        self._daily = np.empty(0, dtype=float)
+        self._running = np.empty(0, dtype=float)
+        self._rolling = {window: np.empty(0, dtype=float) for window in ROLLING_WINDOWS}
+        self._add(df)
+
+    @property
+    def bag_count(self) -> int:
+        return len(self._day)
+
+    @property
+    def total_grams(self) -> float:
+        return float(self._weight.sum())
+
+    @property
+    def last_purchase(self) -> Optional[pd.Timestamp]:
+        return self.start + pd.Timedelta(days=int(self._day[-1])) if self.bag_count else None
+
+    def _encode_roasters(self, roasters: pd.Series) -> np.ndarray:
+        names = roasters.astype(object).where(roasters.notna(), '').astype(str).str.strip()
+        codes, uniques = pd.factorize(names.where(names != '', OTHER_ROASTERS))
+        for name in uniques:
+            if name not in self._roaster_codes:
+                self._roaster_codes[name] = len(self._roaster_labels)
+                self._roaster_labels.append(name)
+        return np.array([self._roaster_codes[name] for name in uniques], dtype=np.int64)[codes]
+
+    def _intervals(self, first: int = 0) -> tuple[np.ndarray, np.ndarray]:
+        """End day (exclusive) and grams per day of the bags from position `first` on."""
+        days = self._purchase_days
+        gaps = np.diff(days)
+        open_gap = max(int(np.median(gaps)), 1) if len(gaps) else DEFAULT_OPEN_GAP_DAYS
+        next_days = np.append(days[1:], days[-1] + open_gap)
+        bag_days = self._day[first:]
+        ends = next_days[np.searchsorted(days, bag_days)]
+        return ends, self._weight[first:] / (ends - bag_days)
+
+    def _add(self, df: pd.DataFrame):
+        """Append purchases dated on or after the last one and redo the tail."""
+        if df.empty:
+            return
+        # Intervals ending before the previous last purchase day are settled.
+        cut = int(self._day[-1]) if self.bag_count else 0
+        first = int(np.searchsorted(self._day, cut, side='left'))
+        new_days = (df[BEANS_COL_PURCHASE_DATE] - self.start).dt.days.to_numpy(dtype=np.int64)
+        self._day = np.concatenate([self._day, new_days])
+        self._purchase_days = np.concatenate([
+            self._purchase_days[self._purchase_days < cut], np.unique(self._day[first:])
+        ])
+        self._weight = np.concatenate([self._weight, df[BEANS_COL_WEIGHT_GRAMS].to_numpy(dtype=float)])
+        self._roaster = np.concatenate([self._roaster, self._encode_roasters(df[BEANS_COL_ROASTER])])
+        if BEANS_COL_ID in df.columns:
+            self.max_id = max(self.max_id, int(df[BEANS_COL_ID].max()))
+
+        ends, rates = self._intervals(first)
+        length = int(ends.max()) - cut
+        tail_daily = np.cumsum(
+            np.bincount(self._day[first:] - cut, weights=rates, minlength=length + 1)
+            - np.bincount(ends - cut, weights=rates, minlength=length + 1)
+        )[:length]
+
+        carried = self._running[cut - 1] if cut else 0.0
+        self._daily = np.concatenate([self._daily[:cut], tail_daily])
+        self._running = np.concatenate([self._running[:cut], carried + np.cumsum(tail_daily)])
+        for window in ROLLING_WINDOWS:
+            self._rolling[window] = np.concatenate([
+                self._rolling[window][:cut], _rolling(self._running, window, cut)
+            ])
+
+    def extended(self, new_purchases: pd.DataFrame) -> Optional['ConsumptionEngine']:
+        """A new engine with `new_purchases` appended, or None if any predate the last purchase."""
+        df = _prepare(new_purchases)
+        if df.empty:
+            return self
+        if self.bag_count and df[BEANS_COL_PURCHASE_DATE].iloc[0] < self.last_purchase:
+            return None
+        engine = object.__new__(ConsumptionEngine)
+        engine.__dict__.update(self.__dict__)
+        engine._roaster_labels = list(self._roaster_labels)
+        engine._roaster_codes = dict(self._roaster_codes)
+        engine._rolling = dict(self._rolling)
+        if engine.start is None:
+            engine.start = df[BEANS_COL_PURCHASE_DATE].iloc[0]
+        engine._add(df)
+        return engine
+
+    def _dates(self) -> pd.DatetimeIndex:
+        return pd.date_range(self.start, periods=len(self._daily), freq='D') if self.bag_count \
+            else pd.DatetimeIndex([])
+
+    def daily(self) -> pd.DataFrame:
+        """Grams per day with trailing 7/30/90-day means, one row per day."""
+        return pd.DataFrame({
+            AGG_COL_DAY: self._dates(),
+            AGG_COL_GRAMS_PER_DAY: self._daily,
+            **{rolling_col(window): self._rolling[window] for window in ROLLING_WINDOWS},
+        })
+
+    def by_roaster(self, top: int = 8) -> pd.DataFrame:
+        """Grams per day for the `top` roasters by total grams, the rest as 'Other'.
+
+        Long format (day, roaster, grams_per_day), ready for a stacked area chart.
+        """
+        if not self.bag_count:
+            return pd.DataFrame(columns=[AGG_COL_DAY, AGG_COL_ROASTER, AGG_COL_GRAMS_PER_DAY])
+        ends, rates = self._intervals()
+        totals = np.bincount(self._roaster, weights=self._weight, minlength=len(self._roaster_labels))
+        leaders = [code for code in np.argsort(-totals, kind='stable')[:top]
+                   if self._roaster_labels[code] != OTHER_ROASTERS]
+        group_of = np.full(len(self._roaster_labels), len(leaders), dtype=np.int64)
+        group_of[leaders] = np.arange(len(leaders))
+        labels = [self._roaster_labels[code] for code in leaders] + [OTHER_ROASTERS]
+
+        # One difference array per group, flattened as group * days + day.
+        days = len(self._daily)
+        group = group_of[self._roaster]
+        size = len(labels) * (days + 1)
+        diff = (
+            np.bincount(group * (days + 1) + self._day, weights=rates, minlength=size)
+            - np.bincount(group * (days + 1) + ends, weights=rates, minlength=size)
+        ).reshape(len(labels), days + 1)
+        grams = np.cumsum(diff, axis=1)[:, :days]
+        keep = grams.any(axis=1)
+        labels = [label for label, kept in zip(labels, keep) if kept]
+        dates = self._dates()
+        return pd.DataFrame({
+            AGG_COL_DAY: np.tile(dates, len(labels)),
+            AGG_COL_ROASTER: np.repeat(labels, days),
+            # Differencing leaves float noise around zero on idle days.
+            AGG_COL_GRAMS_PER_DAY: np.round(grams[keep].ravel(), 6),
+        })
+
+
+def refresh_engine(engine: Optional[ConsumptionEngine], purchases: pd.DataFrame) -> ConsumptionEngine:
+    """`engine` brought up to date with `purchases`, the full current log.
+
+    When the rows `engine` has already seen are unchanged and every other row
+    is a later purchase, only those are appended; anything else (edits,
+    deletions, back-dated purchases, or a log without ids) rebuilds.
+    """
+    if engine is None or BEANS_COL_ID not in purchases.columns:
+        return ConsumptionEngine(purchases)
+    valid = purchases.dropna(subset=[BEANS_COL_PURCHASE_DATE, BEANS_COL_WEIGHT_GRAMS])
+    seen = valid[BEANS_COL_ID] <= engine.max_id
+    unchanged = (
+        int(seen.sum()) == engine.bag_count
+        and np.isclose(float(valid.loc[seen, BEANS_COL_WEIGHT_GRAMS].sum()), engine.total_grams)
+    )
+    extended = engine.extended(valid[~seen]) if unchanged else None
+    return extended if extended is not None else ConsumptionEngine(purchases)
+
+
+__all__ = [
+    'ConsumptionEngine',
+    'refresh_engine',
+    'rolling_col',
+    'ROLLING_WINDOWS',
+    'AGG_COL_DAY',
+    'AGG_COL_GRAMS_PER_DAY',
+]
@@ -0,0 +1,172 @@
+import os
+import threading
+from typing import Any, Callable
+
+from src.db.schema import (
+    BEANS_TABLE,
+    BEANS_COL_ID,
+    ROASTERS_TABLE,
+    ROASTERS_COL_ID,
+    CSV_FINGERPRINTS_TABLE,
+    FINGERPRINT_COL_LOADED_AT,
+    BEAN_TASTING_NOTES_TABLE
+)
+
+_WATERMARK_QUERY = f'''
+SELECT
+    (SELECT MAX({BEANS_COL_ID}) FROM {BEANS_TABLE}),
+    (SELECT COUNT(*) FROM {BEANS_TABLE}),
+    (SELECT MAX({ROASTERS_COL_ID}) FROM {ROASTERS_TABLE}),
+    (SELECT COUNT(*) FROM {ROASTERS_TABLE})
+'''
+
+# Row counts cost a scan per request on PostgreSQL; its per-table write
+# counters change on any insert, update or delete (reported within seconds
+# of the commit), and the CSV load time covers the build itself.
+_POSTGRES_WATERMARK_QUERY = f'''
+SELECT
+    (SELECT MAX({BEANS_COL_ID}) FROM {BEANS_TABLE}),
+    (SELECT MAX({ROASTERS_COL_ID}) FROM {ROASTERS_TABLE}),
+    (SELECT MAX({FINGERPRINT_COL_LOADED_AT}) FROM {CSV_FINGERPRINTS_TABLE}),
+    (SELECT SUM(n_tup_ins + n_tup_upd + n_tup_del)::bigint FROM pg_stat_user_tables
+     WHERE relname IN ('{BEANS_TABLE}', '{ROASTERS_TABLE}', '{BEAN_TASTING_NOTES_TABLE}'))
+'''
+
+_entries: dict[str, dict] = {}
+_entries_lock = threading.Lock()
+# Per request thread: whether get_cached handed out a value older than the data.
+_served = threading.local()
+
+
+def _file_signature(*paths) -> tuple:
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            signature.append(None)
+            continue
+        # An empty file (e.g. a WAL just opened by a reader) holds no data.
+        signature.append((stat.st_mtime_ns, stat.st_size) if stat.st_size else None)
+    return tuple(signature)
+
+
+def data_version() -> tuple:
+    """Cheap signal that changes whenever the dashboard data changes.
+
+    For a SQLite file this is just a stat of the database and its WAL file.
+    Other databases fall back to a max-id/row-count watermark (write counters
+    on PostgreSQL), and the CSV fallback uses the CSV files' mtimes.
+    """
+    db_url = os.getenv('DB_URL', 'sqlite:///data/coffee_canary.db')
+    if db_url.startswith('sqlite:///'):
+        db_path = db_url[len('sqlite:///'):]
+        if os.path.exists(db_path):
+            return ('sqlite', _file_signature(db_path, f'{db_path}-wal'))
+    else:
+        # Only here: a SQLite worker never needs SQLAlchemy just to check the version.
+        from sqlalchemy import text
+        from .db import _get_engine
+
+        engine = _get_engine()
+        if engine is not None:
+            try:
+                query = _POSTGRES_WATERMARK_QUERY if engine.dialect.name == 'postgresql' else _WATERMARK_QUERY
+                with engine.connect() as conn:
+                    return ('watermark', tuple(conn.execute(text(query)).one()))
+            except Exception as e:
+                print(e)
+    return ('csv', _file_signature(
+        os.getenv('COFFEE_BEANS_CSV', 'data/coffee_beans.csv'),
+        os.getenv('COFFEE_ROASTERS_CSV', 'data/coffee_roasters.csv'),
+    ))
+
+
+def _refresh(name: str, loader: Callable[[], Any], version: tuple):
+    entry = _entries[name]
+    try:
+        value = loader()
+        with entry['lock']:
+            entry['value'], entry['version'] = value, version
+    except Exception as e:
+        print(f"Error refreshing cached '{name}': {e}")
+    finally:
+        entry['refreshing'] = False
+
+
+def _serve(entry: dict, version: tuple) -> Any:
+    if entry['version'] != version:
+        _served.stale = True
+    return entry['value']
+
+
+def get_cached(name: str, loader: Callable[[], Any], background: bool = True) -> Any:
+    """Return `loader()`'s result, reloading only when `data_version()` moves.
+
+    The first call loads synchronously. After that, a changed version starts
+    a reload in a background thread while callers keep getting the previous
+    value, so a page view never waits on a refresh.
+    """
+    version = data_version()
+    with _entries_lock:
+        entry = _entries.setdefault(name, {
+            'lock': threading.Lock(),
+            'version': None,
+            'value': None,
+            'refreshing': False,
+        })
+
+    if entry['version'] == version:
+        return entry['value']
+
+    if entry['version'] is None:
+        with entry['lock']:
+            if entry['version'] is None:
+                entry['value'], entry['version'] = loader(), version
+        return _serve(entry, version)
+
+    with _entries_lock:
+        start_refresh = not entry['refreshing']
+        entry['refreshing'] = True
+    if start_refresh:
+        if background:
+            threading.Thread(
+                target=_refresh,
+                args=(name, loader, version),
+                name=f'refresh-{name}',
+                daemon=True
+            ).start()
+        else:
+            _refresh(name, loader, version)
+    return _serve(entry, version)
+
+
+def cached_version(name: str):
+    """The data version the cached value for `name` was loaded at, if any."""
+    entry = _entries.get(name)
+    return entry['version'] if entry else None
+
+
+def reset_served_stale():
+    _served.stale = False
+
+
+def served_stale() -> bool:
+    """True if this thread got a stale value from `get_cached` since `reset_served_stale`."""
+    return getattr(_served, 'stale', False)
+
+
+def clear_data_cache():
+    """Forget every cached value so the next `get_cached` call loads afresh."""
+    with _entries_lock:
+        _entries.clear()
+
+
+__all__ = [
+    'data_version',
+    'get_cached',
+    'cached_version',
+    'reset_served_stale',
+    'served_stale',
+    'clear_data_cache',
+]
@@ -1,59 +1,347 @@
 import os
 from typing import Optional
 import pandas as pd
+from sqlalchemy import text
 
 from .db import _get_engine
+from .metrics import timed
 from src.db.schema import (
     BEANS_TABLE,
-    ROASTERS_TABLE
+    BEANS_COL_ID,
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_BLEND_NAME,
+    BEANS_COL_ROAST_LEVEL,
+    BEANS_COL_WEIGHT_GRAMS,
+    BEANS_COL_TASTING_NOTES,
+    BEANS_COL_ORIGIN_COUNTRY,
+    BEANS_COL_ROASTER_ID,
+    BEAN_TASTING_NOTES_TABLE,
+    TOKENS_COL_BEAN_ID,
+    TASTING_NOTES_COL_NOTE,
+    ROASTERS_TABLE,
+    ROASTERS_COL_ID,
+    ROASTERS_COL_NAME,
+    ROASTERS_COL_CITY,
+    ROASTERS_COL_STATE
 )
+from src.db.dtypes import BEANS_DTYPES, ROASTERS_DTYPES, apply_dtypes
+from src.db.snapshot import read_snapshot
+from src.db.aggregations import (
+    AGG_COL_ROAST_LEVEL,
+    AGG_COL_ROASTER,
+    AGG_COL_COUNT,
+    AGG_COL_LOCATION,
+    AGG_COL_CUMULATIVE_WEIGHT,
+    AGG_COL_ROASTERS,
+    AGG_COL_BLEND_NAMES,
+    AGG_COL_TASTING_NOTE,
+    AGG_COL_ORIGIN,
+    ROAST_LEVEL_COUNTS,
+    ROASTER_COUNTS,
+    CUMULATIVE_WEIGHT_BY_DAY,
+    CUMULATIVE_WEIGHT_BY_DAY_POSTGRES,
+    TOP_TASTING_NOTES,
+    TOP_ORIGINS,
+    TASTING_NOTE_PAIRS
+)
+from src.db.normalize import canonical_name, split_multi_value
 
 
-def load_beans_dataframe() -> pd.DataFrame:
-    """Load coffee bean records from Postgres if available, otherwise CSV.
+# Rows fetched per round trip in typed mode; each chunk is converted before
+# the next is read, so the untyped frame never exists in full.
+TYPED_CHUNK_SIZE = 100_000
 
-    Table name can be set via COFFEE_BEANS_TABLE (defaults to coffee_beans).
-    CSV fallback path via COFFEE_BEANS_CSV.
-    """
+
+def _read_sql_chunks(engine, query: str):
+    """Frames of TYPED_CHUNK_SIZE rows. Where the backend has server-side
+    cursors (PostgreSQL), rows are fetched as the chunks are consumed rather
+    than the whole result being buffered by the driver first."""
+    with engine.connect().execution_options(
+        stream_results=True, max_row_buffer=TYPED_CHUNK_SIZE
+    ) as conn:
+        yield from pd.read_sql(text(query), con=conn, chunksize=TYPED_CHUNK_SIZE)
+
+
+def _concat_typed(chunks: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate typed chunks without widening categoricals back to object."""
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = {}
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            columns[col] = pd.Series(
+                pd.api.types.union_categoricals([chunk[col] for chunk in chunks]), name=col
+            )
+        else:
+            columns[col] = pd.concat([chunk[col] for chunk in chunks], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def _projection(columns, dtypes: dict, table: str) -> Optional[list[str]]:
+    if columns is None:
+        return None
+    unknown = [col for col in columns if col not in dtypes]
+    if unknown:
+        raise ValueError(f"Unknown {table} columns: {', '.join(unknown)}")
+    return list(columns)
+
+
+def _sqlite_path() -> Optional[str]:
+    db_url = os.getenv('DB_URL', 'sqlite:///data/coffee_canary.db')
+    return db_url[len('sqlite:///'):] if db_url.startswith('sqlite:///') else None
+
+
+def _load_table(table: str, dtypes: dict, csv_env: str, csv_default: str,
+                columns=None, typed: bool = False) -> pd.DataFrame:
+    columns = _projection(columns, dtypes, table)
+    if typed:
+        db_path = _sqlite_path()
+        snapshot = read_snapshot(db_path, table, columns) if db_path else None
+        if snapshot is not None:
+            return snapshot
     engine = _get_engine()
     if engine is not None:
-        query = f'SELECT * FROM {BEANS_TABLE}'
+        select = ', '.join(f'"{col}"' for col in columns) if columns else '*'
+        query = f'SELECT {select} FROM {table}'
         try:
-            df = pd.read_sql(query, con=engine)
-            return df
+            streamed = engine.dialect.supports_server_side_cursors
+            if not typed and not streamed:
+                return pd.read_sql(query, con=engine)
+            if not typed:
+                chunks = list(_read_sql_chunks(engine, query))
+                return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+            chunks = [apply_dtypes(chunk, dtypes) for chunk in _read_sql_chunks(engine, query)]
+            return _concat_typed(chunks) if chunks else pd.DataFrame(columns=columns)
         except Exception as e:
             print(e)
     # CSV fallback
-    csv_path = os.getenv('COFFEE_BEANS_CSV', 'data/coffee_beans.csv')
+    csv_path = os.getenv(csv_env, csv_default)
     try:
         if csv_path and os.path.exists(csv_path):
-            return pd.read_csv(csv_path)
+            usecols = (lambda col: col in columns) if columns else None
+            if not typed:
+                return pd.read_csv(csv_path, usecols=usecols)
+            # Categoricals and floats are built while parsing; dates after.
+            parse_dtypes = {
+                col: dtype for col, dtype in dtypes.items()
+                if dtype == 'category' or dtype.startswith('float')
+            }
+            return apply_dtypes(pd.read_csv(csv_path, usecols=usecols, dtype=parse_dtypes), dtypes)
     except Exception as e:
         print(e)
     return pd.DataFrame()
 
 
-def load_roasters_dataframe() -> pd.DataFrame:
-    """Load roaster location records from Postgres if available, otherwise CSV."""
+@timed('data_loader_duration_seconds')
+def load_beans_dataframe(columns: Optional[list[str]] = None, typed: bool = False) -> pd.DataFrame:
+    """Load coffee bean records from the database if available, otherwise CSV.
+
+    `columns` limits the load to those columns. With `typed=True` the frame
+    gets the dtypes in BEANS_DTYPES on both paths: categoricals for repeated
+    text, datetime64 dates and float32 weights. Typed loads are served from
+    the memory-mapped columnar snapshot while it matches the database.
+    CSV fallback path via COFFEE_BEANS_CSV.
+    """
+    return _load_table(
+        BEANS_TABLE, BEANS_DTYPES, 'COFFEE_BEANS_CSV', 'data/coffee_beans.csv', columns, typed
+    )
+
+
+@timed('data_loader_duration_seconds')
+def load_roasters_dataframe(columns: Optional[list[str]] = None, typed: bool = False) -> pd.DataFrame:
+    """Load roaster location records from the database if available, otherwise CSV.
+
+    `columns` and `typed` work as in `load_beans_dataframe`, using ROASTERS_DTYPES.
+    """
+    return _load_table(
+        ROASTERS_TABLE, ROASTERS_DTYPES, 'COFFEE_ROASTERS_CSV', 'data/coffee_roasters.csv', columns, typed
+    )
+
+
+def with_roaster_names(beans_df: pd.DataFrame) -> pd.DataFrame:
+    """`beans_df` with each linked bean's roaster text replaced by its roaster's name.
+
+    That is the key ROASTER_COUNTS groups on (`COALESCE(r.name, b.roaster)`),
+    so spelling variants of one roaster stay one roaster in frames grouped in
+    pandas too. Unlinked beans keep their own text; a frame without
+    `roaster_id` (the CSV fallback) is returned unchanged.
+    """
+    if beans_df.empty or not {BEANS_COL_ROASTER, BEANS_COL_ROASTER_ID} <= set(beans_df.columns):
+        return beans_df
+    roasters_df = load_roasters_dataframe(columns=[ROASTERS_COL_ID, ROASTERS_COL_NAME], typed=True)
+    if roasters_df.empty or ROASTERS_COL_ID not in roasters_df.columns:
+        return beans_df
+    names = roasters_df.set_index(ROASTERS_COL_ID)[ROASTERS_COL_NAME]
+    linked = beans_df[BEANS_COL_ROASTER_ID].map(names).astype(object)
+    roaster = linked.where(linked.notna(), beans_df[BEANS_COL_ROASTER].astype(object))
+    return beans_df.assign(**{BEANS_COL_ROASTER: roaster.astype('category')})
+
+
+def memory_report(df: pd.DataFrame) -> pd.DataFrame:
+    """Deep memory use per column, largest first, with a total row."""
+    usage = df.memory_usage(deep=True, index=True)
+    report = pd.DataFrame({
+        'dtype': [str(df.index.dtype)] + [str(df[col].dtype) for col in df.columns],
+        'bytes': usage.to_numpy(),
+    }, index=usage.index).sort_values('bytes', ascending=False)
+    report.loc['total'] = ['', int(report['bytes'].sum())]
+    report['MiB'] = (report['bytes'] / 2**20).round(3)
+    return report
+
+
+def _read_aggregate(query: str, params: Optional[dict] = None,
+                    postgres_query: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """Run an aggregation query, or return None so the caller can fall back to CSV.
+
+    `postgres_query` replaces `query` on PostgreSQL where the SQLite spelling differs.
+    """
     engine = _get_engine()
-    if engine is not None:
-        query = f'SELECT * FROM {ROASTERS_TABLE}'
-        try:
-            df = pd.read_sql(query, con=engine)
-            return df
-        except Exception as e:
-            print(e)
-    # CSV fallback
-    csv_path = os.getenv('COFFEE_ROASTERS_CSV', 'data/coffee_roasters.csv')
+    if engine is None:
+        return None
+    if postgres_query and engine.dialect.name == 'postgresql':
+        query = postgres_query
     try:
-        if csv_path and os.path.exists(csv_path):
-            return pd.read_csv(csv_path)
+        return pd.read_sql(text(query), con=engine, params=params)
     except Exception as e:
         print(e)
-    return pd.DataFrame()
+        return None
+
+
+def _value_counts(series: pd.Series, label: str) -> pd.DataFrame:
+    counts = series.dropna().astype(str).str.strip()
+    counts = counts[counts != ''].value_counts().reset_index()
+    counts.columns = [label, AGG_COL_COUNT]
+    return counts.sort_values([AGG_COL_COUNT, label], ascending=[False, True], ignore_index=True)
+
+
+@timed('data_loader_duration_seconds')
+def load_roast_level_counts() -> pd.DataFrame:
+    """Bean count per roast level, grouped in the database."""
+    df = _read_aggregate(ROAST_LEVEL_COUNTS)
+    if df is not None:
+        return df
+    beans_df = load_beans_dataframe(columns=[BEANS_COL_ROAST_LEVEL])
+    if beans_df.empty:
+        return pd.DataFrame(columns=[AGG_COL_ROAST_LEVEL, AGG_COL_COUNT])
+    return _value_counts(beans_df[BEANS_COL_ROAST_LEVEL], AGG_COL_ROAST_LEVEL)
+
+
+@timed('data_loader_duration_seconds')
+def load_roaster_counts() -> pd.DataFrame:
+    """Bean count per roaster with the roaster's 'City, ST' location."""
+    df = _read_aggregate(ROASTER_COUNTS)
+    if df is not None:
+        return df
+    beans_df = load_beans_dataframe(columns=[BEANS_COL_ROASTER])
+    if beans_df.empty:
+        return pd.DataFrame(columns=[AGG_COL_ROASTER, AGG_COL_COUNT, AGG_COL_LOCATION])
+    counts = _value_counts(beans_df[BEANS_COL_ROASTER], AGG_COL_ROASTER)
+    roasters_df = load_roasters_dataframe(columns=[ROASTERS_COL_NAME, ROASTERS_COL_CITY, ROASTERS_COL_STATE])
+    if roasters_df.empty:
+        counts[AGG_COL_LOCATION] = None
+        return counts
+    # Matched on canonical names, as the database links beans to roasters.
+    keys = roasters_df[ROASTERS_COL_NAME].map(canonical_name)
+    locations = roasters_df.assign(key=keys).dropna(subset=['key']).drop_duplicates('key').set_index('key')
+    locations = locations[ROASTERS_COL_CITY] + ', ' + locations[ROASTERS_COL_STATE]
+    counts[AGG_COL_LOCATION] = counts[AGG_COL_ROASTER].map(canonical_name).map(locations)
+    return counts
+
+
+@timed('data_loader_duration_seconds')
+def load_cumulative_weight() -> pd.DataFrame:
+    """Grams purchased per day with a running total, ordered by purchase date."""
+    df = _read_aggregate(CUMULATIVE_WEIGHT_BY_DAY, postgres_query=CUMULATIVE_WEIGHT_BY_DAY_POSTGRES)
+    if df is None:
+        beans_df = load_beans_dataframe(columns=[
+            BEANS_COL_PURCHASE_DATE, BEANS_COL_WEIGHT_GRAMS, BEANS_COL_ROASTER, BEANS_COL_BLEND_NAME
+        ])
+        columns = [
+            BEANS_COL_PURCHASE_DATE, BEANS_COL_WEIGHT_GRAMS,
+            AGG_COL_CUMULATIVE_WEIGHT, AGG_COL_ROASTERS, AGG_COL_BLEND_NAMES
+        ]
+        if beans_df.empty:
+            return pd.DataFrame(columns=columns)
+        daily = beans_df.dropna(subset=[BEANS_COL_PURCHASE_DATE]).groupby(
+            BEANS_COL_PURCHASE_DATE, sort=True
+        ).agg(**{
+            BEANS_COL_WEIGHT_GRAMS: (BEANS_COL_WEIGHT_GRAMS, 'sum'),
+            AGG_COL_ROASTERS: (BEANS_COL_ROASTER, lambda s: '; '.join(s.dropna().astype(str))),
+            AGG_COL_BLEND_NAMES: (BEANS_COL_BLEND_NAME, lambda s: '; '.join(s.dropna().astype(str))),
+        }).reset_index()
+        daily[AGG_COL_CUMULATIVE_WEIGHT] = daily[BEANS_COL_WEIGHT_GRAMS].astype(float).cumsum()
+        df = daily[columns]
+    df[BEANS_COL_PURCHASE_DATE] = pd.to_datetime(df[BEANS_COL_PURCHASE_DATE], errors='coerce')
+    # Plots window this series with a binary search, so it must stay sorted.
+    return (
+        df.dropna(subset=[BEANS_COL_PURCHASE_DATE])
+        .sort_values(BEANS_COL_PURCHASE_DATE, kind='stable')
+        .reset_index(drop=True)
+    )
+
+
+def _top_tokens(column: str, label: str, limit: int) -> pd.DataFrame:
+    """Pandas equivalent of the junction-table top-N queries, for the CSV path."""
+    beans_df = load_beans_dataframe(columns=[column])
+    if beans_df.empty or column not in beans_df.columns:
+        return pd.DataFrame(columns=[label, AGG_COL_COUNT])
+    tokens = beans_df[column].map(split_multi_value).explode().dropna()
+    return _value_counts(tokens, label).head(limit)
+
+
+@timed('data_loader_duration_seconds')
+def load_top_tasting_notes(limit: int = 20) -> pd.DataFrame:
+    """Most common normalized tasting notes with their bean counts."""
+    df = _read_aggregate(TOP_TASTING_NOTES, {'limit': limit})
+    if df is not None:
+        return df
+    return _top_tokens(BEANS_COL_TASTING_NOTES, AGG_COL_TASTING_NOTE, limit)
+
+
+@timed('data_loader_duration_seconds')
+def load_top_origins(limit: int = 20) -> pd.DataFrame:
+    """Most common normalized origins with their bean counts."""
+    df = _read_aggregate(TOP_ORIGINS, {'limit': limit})
+    if df is not None:
+        return df
+    return _top_tokens(BEANS_COL_ORIGIN_COUNTRY, AGG_COL_ORIGIN, limit)
+
+
+@timed('data_loader_duration_seconds')
+def load_tasting_note_pairs() -> pd.DataFrame:
+    """One row per (bean, normalized tasting note).
+
+    From the database these are bean ids; the CSV fallback has no ids, so it
+    uses each bean's row position in the CSV instead.
+    """
+    db_path = _sqlite_path()
+    snapshot = read_snapshot(db_path, BEAN_TASTING_NOTES_TABLE) if db_path else None
+    if snapshot is not None:
+        return snapshot
+    df = _read_aggregate(TASTING_NOTE_PAIRS)
+    if df is not None:
+        return df
+    beans_df = load_beans_dataframe(columns=[BEANS_COL_ID, BEANS_COL_TASTING_NOTES])
+    if beans_df.empty:
+        return pd.DataFrame(columns=[TOKENS_COL_BEAN_ID, TASTING_NOTES_COL_NOTE])
+    if BEANS_COL_ID in beans_df.columns:
+        beans_df = beans_df.set_index(BEANS_COL_ID)
+    notes = beans_df[BEANS_COL_TASTING_NOTES].map(split_multi_value).explode().dropna()
+    return pd.DataFrame({TOKENS_COL_BEAN_ID: notes.index.to_numpy(), TASTING_NOTES_COL_NOTE: notes.to_numpy()})
 
 
 __all__ = [
+    'BEANS_DTYPES',
+    'ROASTERS_DTYPES',
     'load_beans_dataframe',
     'load_roasters_dataframe',
+    'with_roaster_names',
+    'memory_report',
+    'load_roast_level_counts',
+    'load_roaster_counts',
+    'load_cumulative_weight',
+    'load_top_tasting_notes',
+    'load_top_origins',
+    'load_tasting_note_pairs',
 ]
\ No newline at end of file
@@ -1,19 +1,175 @@
 import os
+import threading
+import time
 from typing import Optional
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
 
-def _get_engine() -> Optional[Engine | None]:
-    """Create a SQLAlchemy engine from environment variables if configured.
+from src.config import (
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE,
+    SQLITE_TEMP_STORE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SLOW_QUERY_MS,
+)
+from .metrics import observe, increment
 
-    Returns None if insufficient configuration.
+# One engine per (url, read_only) for the whole process, created on first use.
+_engines: dict[tuple[str, bool], Engine] = {}
+_engine_stats: dict[tuple[str, bool], dict] = {}
+_engines_lock = threading.Lock()
+
+
+def is_postgres_url(db_url: Optional[str]) -> bool:
+    return bool(db_url) and db_url.startswith(('postgresql', 'postgres://'))
+
+
+def engine_url(db_url: str) -> str:
+    """Pin bare PostgreSQL URLs to psycopg 3; SQLAlchemy would otherwise pick psycopg2."""
+    for scheme in ('postgresql://', 'postgres://'):
+        if db_url.startswith(scheme):
+            return f"postgresql+psycopg://{db_url[len(scheme):]}"
+    return db_url
+
+
+def _read_only_url(db_url: str) -> str:
+    """Open SQLite files read-only so workers can never write to the shared database."""
+    prefix = 'sqlite:///'
+    if not db_url.startswith(prefix) or db_url.startswith(f'{prefix}file:'):
+        return db_url
+    return f"{prefix}file:{db_url[len(prefix):]}?mode=ro&uri=true"
+
+
+def sqlite_pragmas(read_only: bool = False) -> dict:
+    """Pragmas applied to each new SQLite connection."""
+    pragmas = {
+        'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+        'mmap_size': SQLITE_MMAP_SIZE,
+        'cache_size': SQLITE_CACHE_SIZE,
+        'temp_store': SQLITE_TEMP_STORE,
+    }
+    if read_only:
+        # Journal mode is persistent in the file and set by the build.
+        pragmas['query_only'] = 'ON'
+    else:
+        pragmas['journal_mode'] = SQLITE_JOURNAL_MODE
+        pragmas['synchronous'] = SQLITE_SYNCHRONOUS
+    return pragmas
+
+
+def _instrument(engine: Engine, key: tuple[str, bool], read_only: bool):
+    stats = _engine_stats.setdefault(key, {'connects': 0, 'checkouts': 0, 'checkins': 0})
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, _record):
+        stats['connects'] += 1
+        if engine.dialect.name != 'sqlite':
+            return
+        cursor = dbapi_conn.cursor()
+        for name, value in sqlite_pragmas(read_only).items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    @event.listens_for(engine, 'checkout')
+    def _on_checkout(*_args):
+        stats['checkouts'] += 1
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_query_timer(conn, _cursor, _statement, _parameters, _context, _executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _record_query(conn, _cursor, statement, _parameters, _context, _executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+        observe('sql_query_duration_seconds', elapsed, statement=kind)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            increment('sql_slow_queries_total', statement=kind)
+            print(f"Slow query ({elapsed * 1000:.1f} ms): {' '.join(statement.split())[:300]}")
+
+    @event.listens_for(engine, 'handle_error')
+    def _discard_query_timer(context):
+        # after_cursor_execute never fires for a failed statement.
+        if context.connection is not None and context.connection.info.get('query_start'):
+            context.connection.info['query_start'].pop()
+
+    @event.listens_for(engine, 'checkin')
+    def _on_checkin(*_args):
+        stats['checkins'] += 1
+
+
+def _reset_engines_after_fork():
+    """Drop pooled connections inherited from the parent without closing them.
+
+    Closing would tear down the parent's sockets/file handles; the child
+    simply opens fresh connections on next use.
+    """
+    for engine in _engines.values():
+        engine.dispose(close=False)
+    for stats in _engine_stats.values():
+        stats.update(connects=0, checkouts=0, checkins=0)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_engines_after_fork)
+
+
+def get_engine(read_only: Optional[bool] = None) -> Optional[Engine]:
+    """Return the shared SQLAlchemy engine for DB_URL, creating it on first use.
+
+    `read_only` defaults to DB_READ_ONLY. Returns None if DB_URL is unset or
+    the engine cannot be created.
     """
     db_url = os.getenv('DB_URL', 'sqlite:///data/coffee_canary.db')
     if not db_url:
         return None
-    try:
-        engine = create_engine(db_url, pool_pre_ping=True)
+    if read_only is None:
+        read_only = os.getenv('DB_READ_ONLY', 'False') == 'True'
+    key = (db_url, read_only)
+
+    engine = _engines.get(key)
+    if engine is not None:
         return engine
-    except Exception:
-        return None
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            url = engine_url(_read_only_url(db_url) if read_only else db_url)
+            connect_args = {}
+            if read_only and is_postgres_url(url):
+                connect_args['options'] = '-c default_transaction_read_only=on'
+            try:
+                # Local SQLite files cannot go stale; skip the per-checkout ping.
+                engine = create_engine(
+                    url, pool_pre_ping=not url.startswith('sqlite'), connect_args=connect_args
+                )
+            except Exception as e:
+                print(f"Error creating database engine: {e}")
+                return None
+            _instrument(engine, key, read_only)
+            _engines[key] = engine
+    return engine
+
+
+def _get_engine() -> Optional[Engine | None]:
+    """Return the process-wide engine configured from environment variables.
+
+    Set DB_READ_ONLY=True to open a SQLite database read-only, or run every
+    PostgreSQL transaction read-only.
+    Returns None if insufficient configuration.
+    """
+    return get_engine()
+
+
+def get_engine_stats() -> dict:
+    """Pool status and connection counters for every engine in this process."""
+    return {
+        f"{url}{' (read-only)' if read_only else ''}": {
+            'pool': engine.pool.status(),
+            'checked_out': engine.pool.checkedout() if hasattr(engine.pool, 'checkedout') else None,
+            **_engine_stats.get((url, read_only), {}),
+        }
+        for (url, read_only), engine in _engines.items()
+    }
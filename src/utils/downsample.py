@@ -0,0 +1,68 @@
+"""Downsampling of long, sorted time series for display."""
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: the `threshold` points that best keep the line's shape.
+
+    `x` must be sorted. The first and last points are always kept. Returns
+    positional indices, so the caller can take whole rows (hover data and all).
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex.
+        avg_start = int(math.floor((i + 1) * every)) + 1
+        avg_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x, avg_y = x[avg_start:avg_end].mean(), y[avg_start:avg_end].mean()
+
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_series(df: pd.DataFrame, x_col: str, y_col: str, max_points: int,
+                      x_range=None) -> pd.DataFrame:
+    """Rows of `df` (sorted by `x_col`) to draw, at most `max_points` of them.
+
+    With `x_range` only that window is considered, so zooming in returns full
+    detail once the window holds few enough points. One point either side of
+    the window is kept so the line runs to the plot's edges.
+    """
+    if df is None or df.empty:
+        return df
+
+    x = df[x_col]
+    if x_range is not None:
+        lo, hi = (pd.Timestamp(v) for v in x_range) if pd.api.types.is_datetime64_any_dtype(x) else x_range
+        start = max(int(x.searchsorted(lo, side='left')) - 1, 0)
+        stop = min(int(x.searchsorted(hi, side='right')) + 1, len(df))
+        df = df.iloc[start:stop]
+        x = df[x_col]
+
+    numeric_x = x.to_numpy(dtype='datetime64[ns]').astype(np.int64) \
+        if pd.api.types.is_datetime64_any_dtype(x) else x.to_numpy()
+    return df.iloc[lttb_indices(numeric_x, df[y_col].to_numpy(), max_points)]
+
+
+__all__ = [
+    'lttb_indices',
+    'downsample_series',
+]
@@ -0,0 +1,196 @@
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+from .code_version import code_signature
+
+FIGURE_CACHE_SIZE = int(os.getenv('FIGURE_CACHE_SIZE', 128))
+# Unset disables the on-disk tier; point every worker at the same directory to share it.
+FIGURE_CACHE_DIR = os.getenv('FIGURE_CACHE_DIR', '')
+# The disk tier is pruned, least recently used first, back under this size.
+FIGURE_CACHE_DIR_MB = float(os.getenv('FIGURE_CACHE_DIR_MB', 256))
+# Bytes a worker writes between prunes, as a share of the cap.
+_PRUNE_EVERY = 0.1
+
+_memory: OrderedDict[str, str] = OrderedDict()
+_memory_lock = threading.Lock()
+_fingerprints: dict[int, tuple] = {}
+_stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'disk_pruned': 0}
+# Starts full so each worker's first write prunes what earlier processes left behind.
+_disk_state = {'lock': threading.Lock(), 'written': float('inf')}
+
+
+def frame_fingerprint(df) -> str:
+    """Content hash of a DataFrame, computed once per frame object.
+
+    Frames handed out by the data cache are shared and never mutated, so the
+    hash is memoized against the object and dropped when it is collected.
+    """
+    if df is None:
+        return 'none'
+    if not isinstance(df, pd.DataFrame):
+        return repr(df)
+
+    memo = _fingerprints.get(id(df))
+    if memo is not None and memo[0]() is df:
+        return memo[1]
+
+    digest = hashlib.sha1()
+    digest.update(repr((list(df.columns), df.shape)).encode('utf-8'))
+    if not df.empty:
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    fingerprint = digest.hexdigest()
+
+    key = id(df)
+    _fingerprints[key] = (weakref.ref(df, lambda _ref: _fingerprints.pop(key, None)), fingerprint)
+    return fingerprint
+
+
+def _cache_key(name: str, args, kwargs) -> str:
+    # The code signature keeps a persistent disk tier from serving figures
+    # drawn by a previous deploy's builders.
+    parts = [name, code_signature('plotly')]
+    parts.extend(frame_fingerprint(arg) for arg in args)
+    parts.extend(f"{k}={frame_fingerprint(v)}" for k, v in sorted(kwargs.items()))
+    return hashlib.sha1("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+
+def _memory_get(key: str):
+    with _memory_lock:
+        fig_json = _memory.get(key)
+        if fig_json is not None:
+            _memory.move_to_end(key)
+        return fig_json
+
+
+def _memory_put(key: str, fig_json: str):
+    with _memory_lock:
+        _memory[key] = fig_json
+        _memory.move_to_end(key)
+        while len(_memory) > FIGURE_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def _disk_path(key: str):
+    return Path(FIGURE_CACHE_DIR) / f"{key}.json" if FIGURE_CACHE_DIR else None
+
+
+def _disk_get(key: str):
+    path = _disk_path(key)
+    if path is None:
+        return None
+    try:
+        fig_json = path.read_text(encoding='utf-8')
+        # mtime is the recency the pruner goes by.
+        os.utime(path)
+        return fig_json
+    except OSError:
+        return None
+
+
+def _prune_disk(directory: Path, limit_bytes: float) -> int:
+    """Delete the least recently used figures until `directory` fits in `limit_bytes`."""
+    entries = []
+    for path in directory.glob('*.json'):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= limit_bytes:
+            break
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass  # pruned by another worker
+        except OSError as e:
+            print(f"Error pruning figure cache {path}: {e}")
+            continue
+        total -= size
+    return removed
+
+
+def _disk_put(key: str, fig_json: str):
+    path = _disk_path(key)
+    if path is None:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so other workers never read a partial file.
+        with tempfile.NamedTemporaryFile(
+            'w', dir=path.parent, suffix='.tmp', delete=False, encoding='utf-8'
+        ) as f:
+            f.write(fig_json)
+        os.replace(f.name, path)
+    except OSError as e:
+        print(f"Error writing figure cache {path}: {e}")
+        return
+
+    limit_bytes = FIGURE_CACHE_DIR_MB * 2**20
+    with _disk_state['lock']:
+        _disk_state['written'] += len(fig_json)
+        if _disk_state['written'] < limit_bytes * _PRUNE_EVERY:
+            return
+        _disk_state['written'] = 0
+    _stats['disk_pruned'] += _prune_disk(path.parent, limit_bytes)
+
+
+def cached_figure(builder):
+    """Cache a Plotly figure builder's serialized output.
+
+    Keyed on (builder, code signature, DataFrame fingerprints, other
+    arguments). Lookups go memory LRU -> shared disk tier -> build; the
+    disk tier is held under FIGURE_CACHE_DIR_MB by least-recently-used
+    pruning. The wrapped builder returns the figure as a plain dict, which
+    dcc.Graph accepts directly.
+    """
+    name = f"{builder.__module__}.{builder.__qualname__}"
+
+    @functools.wraps(builder)
+    def wrapper(*args, **kwargs):
+        key = _cache_key(name, args, kwargs)
+
+        fig_json = _memory_get(key)
+        if fig_json is not None:
+            _stats['memory_hits'] += 1
+        else:
+            fig_json = _disk_get(key)
+            if fig_json is not None:
+                _stats['disk_hits'] += 1
+            else:
+                _stats['misses'] += 1
+                fig_json = builder(*args, **kwargs).to_json()
+                _disk_put(key, fig_json)
+            _memory_put(key, fig_json)
+        return json.loads(fig_json)
+
+    return wrapper
+
+
+def figure_cache_stats() -> dict:
+    return {**_stats, 'memory_entries': len(_memory)}
+
+
+def clear_figure_cache():
+    with _memory_lock:
+        _memory.clear()
+
+
+__all__ = [
+    'cached_figure',
+    'frame_fingerprint',
+    'figure_cache_stats',
+    'clear_figure_cache',
+]
@@ -0,0 +1,234 @@
+"""Pre-aggregated cube behind the coffee_beans dashboard filters.
+
+Beans are rolled up once into cells of purchase month x roaster x roast level
+x origin set, each holding a bean count and grams. Every filter combination
+is then a mask over the cells, so an interaction costs time in proportion to
+the number of cells rather than the number of beans.
+
+A bean with several origins sits in one cell for its whole origin set, so
+filtering on either origin finds it without counting it twice. Tasting notes
+are many-per-bean too and get their own cube with a note dimension.
+"""
+import functools
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..db.schema import (
+    BEANS_COL_ID,
+    BEANS_COL_PURCHASE_DATE,
+    BEANS_COL_ROASTER,
+    BEANS_COL_ROAST_LEVEL,
+    BEANS_COL_WEIGHT_GRAMS,
+    BEANS_COL_ORIGIN_COUNTRY,
+    TOKENS_COL_BEAN_ID,
+    TASTING_NOTES_COL_NOTE
+)
+from ..db.aggregations import (
+    AGG_COL_ROAST_LEVEL,
+    AGG_COL_ROASTER,
+    AGG_COL_COUNT,
+    AGG_COL_LOCATION,
+    AGG_COL_CUMULATIVE_WEIGHT,
+    AGG_COL_TASTING_NOTE
+)
+from ..db.normalize import split_multi_value
+
+# Filter states remembered per cube; a new cube (new data) starts empty.
+MEMO_SIZE = 256
+TOP_NOTES_LIMIT = 20
+
+
+def _codes(series: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Integer codes and labels for a text column, trimmed; blank and missing are -1.
+
+    Works on the categories rather than the rows, so typed frames stay cheap.
+    """
+    cat = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    labels = pd.Series(cat.cat.categories.astype(str)).str.strip()
+    remap, uniques = pd.factorize(labels.where(labels != ''))
+    raw = cat.cat.codes.to_numpy()
+    codes = np.where(raw >= 0, remap[raw], -1) if len(remap) else np.full(len(raw), -1)
+    return codes.astype(np.int64), np.asarray(uniques, dtype=object)
+
+
+def _origin_set_codes(series: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Origin-set code per bean, the origin vocabulary, and set x origin membership."""
+    cat = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    sets = [tuple(sorted(split_multi_value(value))) for value in cat.cat.categories]
+    # Beans without an origin share the empty set.
+    remap, unique_sets = pd.factorize(pd.Series(sets + [()], dtype=object))
+    raw = cat.cat.codes.to_numpy()
+    codes = np.where(raw >= 0, remap[np.maximum(raw, 0)], remap[-1])
+
+    origins = np.array(sorted({origin for origin_set in unique_sets for origin in origin_set}), dtype=object)
+    position = {origin: i for i, origin in enumerate(origins)}
+    members = np.zeros((len(unique_sets), len(origins)), dtype=bool)
+    for i, origin_set in enumerate(unique_sets):
+        members[i, [position[origin] for origin in origin_set]] = True
+    return codes.astype(np.int64), origins, members
+
+
+def _month_codes(series: pd.Series) -> np.ndarray:
+    """Months since year 0 (year * 12 + month - 1); -1 where the date is missing."""
+    dates = pd.to_datetime(series, errors='coerce')
+    months = dates.dt.year * 12 + dates.dt.month - 1
+    return months.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def month_start(month: int) -> pd.Timestamp:
+    return pd.Timestamp(year=month // 12, month=month % 12 + 1, day=1)
+
+
+class _Cells:
+    """One row per occupied combination of the dimension codes."""
+
+    def __init__(self, frame: pd.DataFrame, dims: list[str], measures: dict[str, tuple]):
+        grouped = frame.groupby(dims, sort=False).agg(**measures).reset_index()
+        for col in grouped.columns:
+            setattr(self, col, grouped[col].to_numpy())
+        self.size = len(grouped)
+
+
+class FilterKey(NamedTuple):
+    """Hashable filter state; None or an empty tuple leaves a dimension unfiltered."""
+    months: Optional[tuple[int, int]]
+    roasters: tuple[str, ...]
+    roast_levels: tuple[str, ...]
+    origins: tuple[str, ...]
+
+    @property
+    def unfiltered(self) -> bool:
+        return self.months is None and not (self.roasters or self.roast_levels or self.origins)
+
+
+class CubeView(NamedTuple):
+    """Chart inputs for one filter state. Shared between callers; do not mutate."""
+    roast_level_counts: pd.DataFrame
+    roaster_counts: pd.DataFrame
+    monthly_weight: pd.DataFrame
+    top_tasting_notes: pd.DataFrame
+
+
+class FilterCube:
+    """Bean counts and grams by month, roaster, roast level and origin set.
+
+    Roasters are grouped on `beans_df`'s roaster text, so resolve it first with
+    `data_helpers.with_roaster_names` to match ROASTER_COUNTS and the keys of
+    `roaster_locations`.
+    """
+
+    def __init__(self, beans_df: pd.DataFrame, note_pairs: Optional[pd.DataFrame] = None,
+                 roaster_locations: Optional[pd.Series] = None):
+        self.bean_count = len(beans_df)
+        months = _month_codes(beans_df[BEANS_COL_PURCHASE_DATE])
+        roasters, self.roasters = _codes(beans_df[BEANS_COL_ROASTER])
+        levels, self.roast_levels = _codes(beans_df[BEANS_COL_ROAST_LEVEL])
+        origin_sets, self.origins, self._origin_members = _origin_set_codes(beans_df[BEANS_COL_ORIGIN_COUNTRY])
+        dated = months[months >= 0]
+        self.month_range = (int(dated.min()), int(dated.max())) if len(dated) else None
+        self._roaster_locations = roaster_locations
+
+        dims = ['month', 'roaster', 'level', 'origin_set']
+        keys = pd.DataFrame({'month': months, 'roaster': roasters, 'level': levels, 'origin_set': origin_sets})
+        self._cells = _Cells(
+            keys.assign(grams=beans_df[BEANS_COL_WEIGHT_GRAMS].to_numpy(dtype=float)),
+            dims,
+            {'count': ('grams', 'size'), 'grams': ('grams', 'sum')},
+        )
+
+        if note_pairs is None or note_pairs.empty:
+            note_pairs = pd.DataFrame({TOKENS_COL_BEAN_ID: [], TASTING_NOTES_COL_NOTE: []})
+        # Junction rows carry bean ids; CSV-built pairs carry row positions.
+        if BEANS_COL_ID in beans_df.columns:
+            position = pd.Index(beans_df[BEANS_COL_ID]).get_indexer(note_pairs[TOKENS_COL_BEAN_ID])
+        else:
+            position = note_pairs[TOKENS_COL_BEAN_ID].to_numpy(dtype=np.int64)
+        known = position >= 0
+        notes, self.notes = _codes(note_pairs[TASTING_NOTES_COL_NOTE][known])
+        self._note_cells = _Cells(
+            keys.iloc[position[known]].reset_index(drop=True).assign(note=notes),
+            dims + ['note'],
+            {'count': ('note', 'size')},
+        )
+        self.select = functools.lru_cache(maxsize=MEMO_SIZE)(self._select)
+
+    @property
+    def size(self) -> int:
+        return self._cells.size + self._note_cells.size
+
+    def key(self, months=None, roasters=None, roast_levels=None, origins=None) -> FilterKey:
+        """Normalize widget values; a month range covering all the data is no filter."""
+        if months is not None and self.month_range is not None:
+            months = (int(months[0]), int(months[1]))
+            if months[0] <= self.month_range[0] and months[1] >= self.month_range[1]:
+                months = None
+        else:
+            months = None
+        return FilterKey(
+            months,
+            tuple(sorted(set(roasters or ()))),
+            tuple(sorted(set(roast_levels or ()))),
+            tuple(sorted(set(origins or ()))),
+        )
+
+    def _mask(self, cells: _Cells, key: FilterKey) -> np.ndarray:
+        mask = np.ones(cells.size, dtype=bool)
+        if key.months is not None:
+            mask &= (cells.month >= key.months[0]) & (cells.month <= key.months[1])
+        if key.roasters:
+            mask &= np.isin(cells.roaster, np.flatnonzero(np.isin(self.roasters, key.roasters)))
+        if key.roast_levels:
+            mask &= np.isin(cells.level, np.flatnonzero(np.isin(self.roast_levels, key.roast_levels)))
+        if key.origins:
+            chosen = np.isin(self.origins, key.origins)
+            mask &= self._origin_members[:, chosen].any(axis=1)[cells.origin_set]
+        return mask
+
+    @staticmethod
+    def _counts(codes, weights, labels, label_col) -> pd.DataFrame:
+        present = codes >= 0
+        totals = np.bincount(codes[present], weights=weights[present], minlength=len(labels))
+        nonzero = np.flatnonzero(totals)
+        df = pd.DataFrame({label_col: labels[nonzero], AGG_COL_COUNT: totals[nonzero].astype(np.int64)})
+        return df.sort_values([AGG_COL_COUNT, label_col], ascending=[False, True], ignore_index=True)
+
+    def _select(self, key: FilterKey) -> CubeView:
+        cells, mask = self._cells, self._mask(self._cells, key)
+        count = cells.count[mask].astype(float)
+
+        roaster_counts = self._counts(cells.roaster[mask], count, self.roasters, AGG_COL_ROASTER)
+        roaster_counts[AGG_COL_LOCATION] = (
+            roaster_counts[AGG_COL_ROASTER].map(self._roaster_locations)
+            if self._roaster_locations is not None else None
+        )
+
+        months = cells.month[mask]
+        dated = months >= 0
+        monthly = pd.DataFrame({'month': months[dated], BEANS_COL_WEIGHT_GRAMS: cells.grams[mask][dated]})
+        monthly = monthly.groupby('month', sort=True)[BEANS_COL_WEIGHT_GRAMS].sum().reset_index()
+        monthly.insert(0, BEANS_COL_PURCHASE_DATE, [month_start(m) for m in monthly.pop('month')])
+        monthly[AGG_COL_CUMULATIVE_WEIGHT] = monthly[BEANS_COL_WEIGHT_GRAMS].cumsum()
+
+        note_cells = self._note_cells
+        note_mask = self._mask(note_cells, key)
+        top_notes = self._counts(
+            note_cells.note[note_mask], note_cells.count[note_mask].astype(float),
+            self.notes, AGG_COL_TASTING_NOTE
+        ).head(TOP_NOTES_LIMIT)
+
+        return CubeView(
+            roast_level_counts=self._counts(cells.level[mask], count, self.roast_levels, AGG_COL_ROAST_LEVEL),
+            roaster_counts=roaster_counts,
+            monthly_weight=monthly,
+            top_tasting_notes=top_notes,
+        )
+
+
+__all__ = [
+    'FilterCube',
+    'FilterKey',
+    'CubeView',
+    'month_start',
+]
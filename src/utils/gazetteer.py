@@ -0,0 +1,133 @@
+"""Offline city/state -> lat/lon lookup backed by a bundled gazetteer file.
+
+The bundled `data/gazetteer_us_places.csv` is a small hand-curated starter
+list: about 115 large US cities and the roasters' home towns, with
+approximate city-centre coordinates. It is not Census data, and a roaster in
+a town it lacks still falls through to the Geocoding API. Firewalled hosts
+should replace it with the full US Census Bureau Gazetteer national places
+file (public domain, ~32k places, INTPTLAT/INTPTLONG coordinates):
+
+    python -m src.utils.gazetteer path/to/2020_Gaz_place_national.txt
+
+or point GAZETTEER_CSV at a file converted that way.
+"""
+import csv
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Optional
+
+GAZETTEER_CSV = os.getenv('GAZETTEER_CSV', 'data/gazetteer_us_places.csv')
+
+STATE_ABBREVIATIONS = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR',
+    'california': 'CA', 'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE',
+    'district of columbia': 'DC', 'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI',
+    'idaho': 'ID', 'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA',
+    'kansas': 'KS', 'kentucky': 'KY', 'louisiana': 'LA', 'maine': 'ME',
+    'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN',
+    'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE',
+    'nevada': 'NV', 'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM',
+    'new york': 'NY', 'north carolina': 'NC', 'north dakota': 'ND', 'ohio': 'OH',
+    'oklahoma': 'OK', 'oregon': 'OR', 'pennsylvania': 'PA', 'rhode island': 'RI',
+    'south carolina': 'SC', 'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX',
+    'utah': 'UT', 'vermont': 'VT', 'virginia': 'VA', 'washington': 'WA',
+    'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY',
+}
+
+# Census place names carry their legal/statistical area description as a suffix.
+_CENSUS_NAME_SUFFIXES = (
+    ' city and borough', ' consolidated government', ' metropolitan government',
+    ' unified government', ' urban county', ' city', ' town', ' village',
+    ' borough', ' municipality', ' CDP',
+)
+
+_index = None
+
+
+def _key(city: str, state: str) -> Optional[str]:
+    city = " ".join(city.split()).casefold()
+    state = " ".join(state.split())
+    state = STATE_ABBREVIATIONS.get(state.casefold(), state).upper()
+    if not city or not state:
+        return None
+    return f"{state}|{city}"
+
+
+def split_location(location: str) -> tuple[str, str]:
+    """Split 'City, ST' into its city and state parts."""
+    city, _, state = (location or "").rpartition(",")
+    return city, state
+
+
+def _load_index(path: str = GAZETTEER_CSV):
+    """Read the gazetteer into parallel sorted key / lat / lon arrays."""
+    keys, lats, lons = [], array('d'), array('d')
+    if not os.path.exists(path):
+        print(f"Gazetteer file {path} does not exist.")
+        return keys, lats, lons
+
+    with open(path, 'r', encoding='utf-8') as f:
+        rows = sorted(
+            (key, float(row['lat']), float(row['lon']))
+            for row in csv.DictReader(f)
+            if (key := _key(row['city'], row['state'])) is not None
+        )
+    for key, lat, lon in rows:
+        if keys and keys[-1] == key:
+            continue
+        keys.append(key)
+        lats.append(lat)
+        lons.append(lon)
+    return keys, lats, lons
+
+
+def lookup_location(location: str) -> tuple[Optional[float], Optional[float]]:
+    """Return (lat, lon) for a 'City, ST' string from the offline gazetteer."""
+    global _index
+    if _index is None:
+        _index = _load_index()
+    keys, lats, lons = _index
+
+    key = _key(*split_location(location))
+    if key is None:
+        return None, None
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        return lats[i], lons[i]
+    return None, None
+
+
+def build_gazetteer(census_path: str, out_path: str = GAZETTEER_CSV):
+    """Convert a Census Gazetteer national places file into the bundled CSV."""
+    rows = []
+    with open(census_path, 'r', encoding='latin-1') as f:
+        reader = csv.DictReader(f, delimiter='\t')
+        reader.fieldnames = [name.strip() for name in reader.fieldnames]
+        for row in reader:
+            name = row['NAME'].strip()
+            for suffix in _CENSUS_NAME_SUFFIXES:
+                if name.endswith(suffix):
+                    name = name[:-len(suffix)]
+                    break
+            rows.append((
+                row['USPS'].strip(),
+                name,
+                round(float(row['INTPTLAT']), 4),
+                round(float(row['INTPTLONG']), 4)
+            ))
+
+    rows.sort(key=lambda r: (r[0].casefold(), r[1].casefold()))
+    with open(out_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['state', 'city', 'lat', 'lon'])
+        writer.writerows(rows)
+    print(f"Wrote {len(rows)} places to {out_path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python -m src.utils.gazetteer CENSUS_PLACES_FILE [OUT_CSV]")
+        sys.exit(1)
+    build_gazetteer(*sys.argv[1:3])
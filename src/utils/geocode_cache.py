@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from src.config import (
+    DB_PATH,
+    GEOCODE_MAX_WORKERS,
+    GEOCODE_CACHE_TTL_DAYS,
+    GEOCODE_NEGATIVE_TTL_HOURS,
+)
+from src.db.queries import (
+    CREATE_GEOCODE_CACHE_TABLE,
+    UPSERT_GEOCODE_CACHE,
+    SELECT_GEOCODE_CACHE_BATCH,
+)
+from .gazetteer import lookup_location
+from .google_maps_api import geocode_location, has_api_key
+
+# SQLite's default limit on bound parameters is 999 on older builds.
+_SELECT_BATCH_SIZE = 500
+
+
+def location_key(location: str) -> Optional[str]:
+    """Normalize a location string so 'Sacramento,  CA' and 'sacramento, ca' share a cache entry."""
+    if not location or not isinstance(location, str):
+        return None
+    key = " ".join(location.replace(",", ", ").split()).casefold()
+    return key.replace(" ,", ",") or None
+
+
+def _is_fresh(found: int, fetched_at: float, now: float) -> bool:
+    if found:
+        ttl = GEOCODE_CACHE_TTL_DAYS * 86400
+    else:
+        ttl = GEOCODE_NEGATIVE_TTL_HOURS * 3600
+    return now - fetched_at < ttl
+
+
+def _read_cache(conn, keys: list[str], now: float) -> dict:
+    hits = {}
+    for i in range(0, len(keys), _SELECT_BATCH_SIZE):
+        batch = keys[i:i + _SELECT_BATCH_SIZE]
+        query = SELECT_GEOCODE_CACHE_BATCH.format(placeholders=", ".join("?" * len(batch)))
+        for key, lat, lon, found, fetched_at in conn.execute(query, batch):
+            if _is_fresh(found, fetched_at, now):
+                hits[key] = (lat, lon) if found else (None, None)
+    return hits
+
+
+def _fetch_misses(misses: dict[str, str], max_workers: int) -> dict:
+    """Geocode each missing key once, with at most `max_workers` requests in flight."""
+    if not misses:
+        return {}
+    workers = max(1, min(max_workers, len(misses)))
+    keys = list(misses)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(geocode_location, [misses[k] for k in keys])
+        return dict(zip(keys, results))
+
+
+def geocode_locations(
+    locations: Iterable[str],
+    db_path: str = DB_PATH,
+    max_workers: int = GEOCODE_MAX_WORKERS,
+) -> dict:
+    """Resolve many locations at once through the on-disk geocode cache.
+
+    Duplicate locations collapse to a single lookup. The offline gazetteer
+    answers first, then cached entries are read in one batch; only expired
+    or missing keys go to the Geocoding API, fetched concurrently and written
+    back in a single transaction.
+
+    Returns a mapping of the original location strings to (lat, lon), with
+    (None, None) for locations that could not be resolved.
+    """
+    locations = [loc for loc in locations if isinstance(loc, str)]
+    originals = {}
+    for location in locations:
+        key = location_key(location)
+        if key is not None:
+            originals.setdefault(key, location)
+    if not originals:
+        return {}
+
+    resolved = {}
+    for key, location in originals.items():
+        lat, lon = lookup_location(location)
+        if lat is not None:
+            resolved[key] = (lat, lon)
+    pending = [key for key in originals if key not in resolved]
+    if not pending:
+        return {
+            location: resolved[location_key(location)]
+            for location in locations
+        }
+
+    now = time.time()
+    # Read-only workers only consult the cache the build step filled.
+    read_only = os.getenv('DB_READ_ONLY', 'False') == 'True'
+    if read_only:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30)
+    else:
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.execute(CREATE_GEOCODE_CACHE_TABLE)
+    try:
+        resolved.update(_read_cache(conn, pending, now))
+        misses = {k: v for k, v in originals.items() if k not in resolved}
+
+        if misses and not read_only and has_api_key():
+            fetched = _fetch_misses(misses, max_workers)
+            with conn:
+                conn.executemany(UPSERT_GEOCODE_CACHE, [
+                    (key, lat, lon, int(lat is not None and lon is not None), now)
+                    for key, (lat, lon) in fetched.items()
+                ])
+            resolved.update(fetched)
+        elif misses and not read_only:
+            print(f"Skipping {len(misses)} uncached locations: Google Maps API key not found.")
+    finally:
+        conn.close()
+
+    return {
+        location: resolved.get(location_key(location), (None, None))
+        for location in locations
+    }
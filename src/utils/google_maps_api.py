@@ -1,20 +1,37 @@
-import requests
-
-from src.config import GOOGLE_MAPS_API_KEY
+from src.config import GOOGLE_MAPS_API_KEY, GEOCODE_TIMEOUT_SECONDS
+from .gazetteer import lookup_location
+from .metrics import timed
 
 GEOCODE_REQUEST_URL_TEMPLATE = "https://maps.googleapis.com/maps/api/geocode/json?address={location}&key={api_key}"
 
+
+def has_api_key() -> bool:
+    return GOOGLE_MAPS_API_KEY != 'No Key Found'
+
+
+@timed('geocode_duration_seconds')
 def geocode_location(location: str) -> tuple[float, float]:
-    """Get latitude and longitude for a given location using Google Maps Geocoding API."""
-    if GOOGLE_MAPS_API_KEY == 'No Key Found' or not location:
+    """Get latitude and longitude for a given location.
+
+    The offline gazetteer is checked first; only misses go to the Google Maps
+    Geocoding API.
+    """
+    lat, lon = lookup_location(location)
+    if lat is not None:
+        return lat, lon
+    if not has_api_key() or not location:
         print("Google Maps API key not found or location is empty.")
         return None, None
+    # Only misses reach the network, so requests stays off worker startup.
+    import requests
+
     try:
         result = requests.get(
             GEOCODE_REQUEST_URL_TEMPLATE.format(
                 location=location.strip().replace(" ", "+"),
                 api_key=GOOGLE_MAPS_API_KEY
-            )
+            ),
+            timeout=GEOCODE_TIMEOUT_SECONDS
         )
         latlon = result.json()['results'][0]['geometry']['location']
     except Exception as e:
@@ -0,0 +1,205 @@
+"""Response compression and ETags for the Flask server behind Dash.
+
+Layouts and callback outputs (figures, map markers) are JSON documents of up
+to several megabytes. Every text response over COMPRESS_MIN_BYTES is sent
+gzip- or brotli-encoded, as the client accepts.
+
+`_dash-layout`, `_dash-dependencies` and callback responses depend only on
+the dataset, the code and the request (path, plus the body for callbacks),
+so they are tagged from those before the request is dispatched: a client
+sending the ETag back gets a 304 without the layout or callback running.
+Their encoded bodies are kept in a per-worker LRU of RESPONSE_CACHE_MB, so a
+repeat visit to unchanged data is answered from memory too. A response built
+from a stale cached value is never tagged or stored; see `served_stale` in
+data_cache. The page shell gets no ETag: Dash signs a fresh token into it.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from src.config import COMPRESS_ENABLED, COMPRESS_MIN_BYTES, RESPONSE_CACHE_MB
+from .code_version import code_signature
+from .data_cache import data_version, reset_served_stale, served_stale
+from .metrics import increment
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CALLBACK_ROUTE = '/_dash-update-component'
+# GET endpoints whose bodies are a function of the data and code alone.
+DATA_KEYED_ROUTES = ('/_dash-layout', '/_dash-dependencies')
+COMPRESSIBLE_MIMETYPES = (
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/javascript',
+    'text/plain',
+    'image/svg+xml',
+)
+GZIP_LEVEL = 6
+# Brotli quality 5 compresses JSON about as fast as gzip -6, and smaller.
+BROTLI_QUALITY = 5
+# Encodings this process can produce, preferred first.
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+# Appended to an ETag per encoding, so each encoded body has its own tag.
+ETAG_SUFFIXES = {'br': '-br', 'gzip': '-gz', None: ''}
+
+# (tag, accepted encoding) -> (body, mimetype, encoding the body is in)
+_bodies: OrderedDict[tuple[str, str], tuple[bytes, str, str]] = OrderedDict()
+_bodies_lock = threading.Lock()
+_stats = {'bytes': 0}
+
+
+def preferred_encoding(request) -> str | None:
+    """The first of ENCODINGS the client accepts, or None for identity."""
+    accepted = request.accept_encodings
+    return next((encoding for encoding in ENCODINGS if accepted[encoding]), None)
+
+
+def compress(data: bytes, encoding: str | None) -> bytes:
+    """`data` in `encoding` ('br', 'gzip', or None for as is)."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    return data
+
+
+def _body_get(key):
+    with _bodies_lock:
+        entry = _bodies.get(key)
+        if entry is not None:
+            _bodies.move_to_end(key)
+        return entry
+
+
+def _body_put(key, body: bytes, mimetype: str, encoding: str | None):
+    budget = RESPONSE_CACHE_MB * 1024 * 1024
+    if len(body) > budget / 4:
+        return
+    with _bodies_lock:
+        previous = _bodies.pop(key, None)
+        if previous is not None:
+            _stats['bytes'] -= len(previous[0])
+        _bodies[key] = (body, mimetype, encoding)
+        _stats['bytes'] += len(body)
+        while _stats['bytes'] > budget:
+            _, (evicted, *_) = _bodies.popitem(last=False)
+            _stats['bytes'] -= len(evicted)
+
+
+def response_cache_stats() -> dict:
+    with _bodies_lock:
+        return {'entries': len(_bodies), 'bytes': _stats['bytes']}
+
+
+def clear_response_cache():
+    with _bodies_lock:
+        _bodies.clear()
+        _stats['bytes'] = 0
+
+
+def _request_tag(request) -> str | None:
+    """Tag for a request answered from the data and code alone, or None for any other.
+
+    Callback responses are tagged on their request body, so a callback's
+    output must depend on nothing but its inputs and the data: no clock
+    readings, timings or per-request randomness.
+    """
+    if request.method == 'POST' and request.path.endswith(CALLBACK_ROUTE):
+        identity = request.get_data()
+    elif request.method in ('GET', 'HEAD') and request.path.endswith(DATA_KEYED_ROUTES):
+        identity = request.query_string
+    else:
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(data_version()).encode('utf-8'))
+    digest.update(code_signature('dash').encode('utf-8'))
+    digest.update(request.path.encode('utf-8'))
+    digest.update(identity)
+    return digest.hexdigest()
+
+
+def install_http_cache(server):
+    """Attach compression, ETags and the response cache to a Flask app."""
+    from flask import g, request
+
+    if not COMPRESS_ENABLED:
+        return
+
+    def _respond(body: bytes, mimetype: str, tag: str, encoding: str | None):
+        response = server.response_class(body, mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(tag + ETAG_SUFFIXES[encoding])
+        return response
+
+    @server.before_request
+    def _serve_cached():
+        tag = _request_tag(request)
+        if tag is None:
+            return None
+        reset_served_stale()
+        g.http_cache_version = data_version()
+        g.http_cache_tag = tag
+        accepted = preferred_encoding(request)
+        # Small bodies go out unencoded, so either tag may come back.
+        for encoding in {accepted, None}:
+            if request.if_none_match.contains(tag + ETAG_SUFFIXES[encoding]):
+                increment('http_cache_hits_total', kind='not_modified')
+                response = server.response_class(status=304)
+                response.set_etag(tag + ETAG_SUFFIXES[encoding])
+                g.http_cache_done = True
+                return response
+        cached = _body_get((tag, accepted))
+        if cached is not None:
+            increment('http_cache_hits_total', kind='response')
+            g.http_cache_done = True
+            return _respond(cached[0], cached[1], tag, cached[2])
+        return None
+
+    @server.after_request
+    def _compress_response(response):
+        if g.pop('http_cache_done', False):
+            return response
+        tag = g.pop('http_cache_tag', None)
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        body = response.get_data()
+        accepted = preferred_encoding(request)
+        encoding = accepted if len(body) >= COMPRESS_MIN_BYTES else None
+        response.vary.add('Accept-Encoding')
+        encoded = compress(body, encoding)
+
+        # The tag promises the current data; a body built from anything else goes out untagged.
+        if tag is not None and not served_stale() and data_version() == g.get('http_cache_version'):
+            response.set_etag(tag + ETAG_SUFFIXES[encoding])
+            _body_put((tag, accepted), encoded, response.mimetype, encoding)
+        if encoding:
+            response.set_data(encoded)
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+__all__ = [
+    'COMPRESSIBLE_MIMETYPES',
+    'ENCODINGS',
+    'ETAG_SUFFIXES',
+    'preferred_encoding',
+    'compress',
+    'install_http_cache',
+    'response_cache_stats',
+    'clear_response_cache',
+]
@@ -0,0 +1,153 @@
+"""Server-side clustering of roaster locations for the map.
+
+Roasters at the same coordinates (usually one city) collapse into a site;
+sites are then grid-clustered once per zoom level. Each level is kept sorted
+by longitude so a viewport lookup is a binary search plus a latitude mask,
+and the GeoJSON sent to the browser only ever covers what is on screen.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from ..db.schema import (
+    ROASTERS_COL_NAME,
+    ROASTERS_COL_CITY,
+    ROASTERS_COL_STATE,
+    ROASTERS_COL_LAT,
+    ROASTERS_COL_LON
+)
+
+MIN_ZOOM = 0
+# At and above this zoom every site is drawn on its own.
+MAX_CLUSTER_ZOOM = 12
+CLUSTER_RADIUS_PX = 60
+TILE_SIZE_PX = 256
+# Fetch a margin around the visible bounds so small pans don't expose gaps.
+VIEWPORT_PADDING = 0.25
+# Names listed in a site tooltip before summarising the rest.
+MAX_TOOLTIP_NAMES = 5
+# Web Mercator stops short of the poles.
+MAX_LATITUDE = 85.05112878
+
+
+def _mercator(lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Project to the unit square the tile pyramid is built on."""
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    return x, y
+
+
+def _site_tooltip(names: list[str], total: int, location: str) -> str:
+    if total == 1:
+        return f"Roaster: {names[0]}<br>Location: {location}"
+    more = f"<br>and {total - len(names)} more" if total > len(names) else ''
+    return f"{total} roasters in {location}<br>{'<br>'.join(names)}{more}"
+
+
+class _Level:
+    """Clusters at one zoom level, sorted by longitude."""
+
+    def __init__(self, lat, lon, count, site):
+        order = np.argsort(lon, kind='stable')
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self.count = count[order]
+        # Index into the site arrays for single-site clusters, -1 otherwise.
+        self.site = site[order]
+
+    def within(self, south, west, north, east) -> np.ndarray:
+        start = np.searchsorted(self.lon, west, side='left')
+        stop = np.searchsorted(self.lon, east, side='right')
+        lat = self.lat[start:stop]
+        return start + np.flatnonzero((lat >= south) & (lat <= north))
+
+
+class ClusterIndex:
+    """Per-zoom clusters over every roaster with coordinates."""
+
+    def __init__(self, roasters_df: pd.DataFrame):
+        df = roasters_df.dropna(subset=[ROASTERS_COL_LAT, ROASTERS_COL_LON])
+        self.size = len(df)
+        # Group roasters by identical coordinates; names stay in one array,
+        # sliced per site, so tooltips are only built for sites on screen.
+        codes = df.groupby([ROASTERS_COL_LAT, ROASTERS_COL_LON], sort=False).ngroup().to_numpy()
+        order = np.argsort(codes, kind='stable')
+        site_count = np.bincount(codes, minlength=codes.max() + 1 if len(codes) else 0).astype(np.int64)
+        self._offsets = np.concatenate(([0], np.cumsum(site_count)))
+        first = order[self._offsets[:-1]]
+        self._names = df[ROASTERS_COL_NAME].to_numpy(dtype=object)[order]
+        self._locations = (
+            df[ROASTERS_COL_CITY].astype(object).fillna('') + ", "
+            + df[ROASTERS_COL_STATE].astype(object).fillna('')
+        ).to_numpy(dtype=object)[first]
+        self.site_lat = df[ROASTERS_COL_LAT].to_numpy(dtype=float)[first]
+        self.site_lon = df[ROASTERS_COL_LON].to_numpy(dtype=float)[first]
+        sites = np.arange(len(site_count))
+
+        x, y = _mercator(self.site_lat, self.site_lon)
+        self.levels = {}
+        for zoom in range(MIN_ZOOM, MAX_CLUSTER_ZOOM):
+            scale = TILE_SIZE_PX * 2 ** zoom / CLUSTER_RADIUS_PX
+            cells = np.floor(x * scale).astype(np.int64) * (1 << 32) + np.floor(y * scale).astype(np.int64)
+            _, inverse = np.unique(cells, return_inverse=True)
+            count = np.bincount(inverse, weights=site_count)
+            lat = np.bincount(inverse, weights=self.site_lat * site_count) / count
+            lon = np.bincount(inverse, weights=self.site_lon * site_count) / count
+            sites_per_cell = np.bincount(inverse)
+            # Any site in a cell identifies it when the cell holds only that one.
+            site = np.full(len(count), -1, dtype=np.int64)
+            site[inverse] = sites
+            site[sites_per_cell > 1] = -1
+            self.levels[zoom] = _Level(lat, lon, count.astype(np.int64), site)
+        self.levels[MAX_CLUSTER_ZOOM] = _Level(self.site_lat, self.site_lon, site_count, sites)
+
+    def _site_tooltip(self, site: int) -> str:
+        start, stop = self._offsets[site], self._offsets[site + 1]
+        names = list(self._names[start:min(stop, start + MAX_TOOLTIP_NAMES)])
+        return _site_tooltip(names, int(stop - start), self._locations[site])
+
+    def _level(self, zoom) -> _Level:
+        zoom = MIN_ZOOM if zoom is None else int(zoom)
+        return self.levels[min(max(zoom, MIN_ZOOM), MAX_CLUSTER_ZOOM)]
+
+    def query(self, bounds, zoom) -> dict:
+        """GeoJSON FeatureCollection of the clusters and sites inside `bounds` at `zoom`.
+
+        `bounds` is [[south, west], [north, east]] as reported by the map; None
+        returns the whole level.
+        """
+        level = self._level(zoom)
+        if bounds:
+            (south, west), (north, east) = bounds
+            pad_lat, pad_lon = (north - south) * VIEWPORT_PADDING, (east - west) * VIEWPORT_PADDING
+            south, north = south - pad_lat, north + pad_lat
+            west, east = west - pad_lon, east + pad_lon
+            # A view spanning more than the world wraps; just take everything.
+            if east - west >= 360:
+                west, east = -180.0, 180.0
+            indices = level.within(south, west, north, east)
+        else:
+            indices = np.arange(len(level.lat))
+
+        features = []
+        for i in indices:
+            count = int(level.count[i])
+            site = int(level.site[i])
+            features.append({
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [float(level.lon[i]), float(level.lat[i])]},
+                'properties': {
+                    'count': count,
+                    'cluster': site < 0,
+                    'tooltip': self._site_tooltip(site) if site >= 0 else f"{count} roasters",
+                },
+            })
+        return {'type': 'FeatureCollection', 'features': features}
+
+
+__all__ = [
+    'ClusterIndex',
+    'MAX_CLUSTER_ZOOM',
+]
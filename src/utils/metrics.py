@@ -0,0 +1,261 @@
+"""In-process latency histograms and counters, exposed as Prometheus text.
+
+Recording an observation is a bisect and two increments under a lock, cheap
+enough to leave on in production. Each process keeps its own registry; under
+Gunicorn every worker reports its own counters, labelled with its pid.
+"""
+import cProfile
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from src.config import (
+    METRICS_ENABLED,
+    PROFILE_REQUESTS,
+    PROFILE_DIR,
+)
+
+METRIC_PREFIX = 'coffee_canary_'
+# Seconds; spans a cached figure (sub-ms) up to a cold geocode or big load.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HELP = {
+    'http_request_duration_seconds': 'Flask request latency by route.',
+    'sql_query_duration_seconds': 'SQLAlchemy statement latency by statement type.',
+    'sql_slow_queries_total': 'Statements slower than SLOW_QUERY_MS.',
+    'data_loader_duration_seconds': 'data_helpers loader latency.',
+    'plot_builder_duration_seconds': 'plots.make_* builder latency, including figure cache hits.',
+    'geocode_duration_seconds': 'geocode_location latency.',
+    'errors_total': 'Exceptions raised by instrumented functions.',
+    'http_cache_hits_total': 'Responses served from the response cache or as 304 Not Modified.',
+    'prerender_hits_total': 'Page shells and layouts served from the prerendered bundle.',
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a running sum, as Prometheus expects."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> tuple[list[int], float]:
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+_histograms: dict[tuple[str, tuple], Histogram] = {}
+_counters: dict[tuple[str, tuple], int] = {}
+_registry_lock = threading.Lock()
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def observe(name: str, seconds: float, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = (name, _labels_key(labels))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    histogram.observe(seconds)
+
+
+def increment(name: str, amount: int = 1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = (name, _labels_key(labels))
+    with _registry_lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def timed(metric: str, **labels):
+    """Record each call's latency in `metric`, labelled with the function name.
+
+    Exceptions are counted in errors_total and re-raised.
+    """
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+        fn_labels = {'function': fn.__name__, **labels}
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                increment('errors_total', **fn_labels)
+                raise
+            finally:
+                observe(metric, time.perf_counter() - start, **fn_labels)
+
+        return wrapper
+
+    return decorator
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render_metrics(gauges: list[tuple[str, dict, float]] | None = None) -> str:
+    """Every histogram, counter and gauge in the Prometheus text format (0.0.4)."""
+    pid = (('pid', os.getpid()),)
+    lines = []
+
+    with _registry_lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+
+    seen = set()
+    for (name, labels), histogram in histograms:
+        full = METRIC_PREFIX + name
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# HELP {full} {_HELP.get(name, name)}')
+            lines.append(f'# TYPE {full} histogram')
+        counts, total = histogram.snapshot()
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, counts):
+            cumulative += count
+            lines.append(f'{full}_bucket{_format_labels(labels + pid, (("le", bound),))} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{full}_bucket{_format_labels(labels + pid, (("le", "+Inf"),))} {cumulative}')
+        lines.append(f'{full}_sum{_format_labels(labels + pid)} {total}')
+        lines.append(f'{full}_count{_format_labels(labels + pid)} {cumulative}')
+
+    for (name, labels), value in counters:
+        full = METRIC_PREFIX + name
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# HELP {full} {_HELP.get(name, name)}')
+            lines.append(f'# TYPE {full} counter')
+        lines.append(f'{full}{_format_labels(labels + pid)} {value}')
+
+    for name, labels, value in gauges or ():
+        if value is None:
+            continue
+        full = METRIC_PREFIX + name
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# TYPE {full} gauge')
+        lines.append(f'{full}{_format_labels(_labels_key(labels) + pid)} {value}')
+
+    return "\n".join(lines) + "\n"
+
+
+def _collect_gauges() -> list[tuple[str, dict, float]]:
+    """Point-in-time values owned by other modules: figure cache and pool state."""
+    from .db import get_engine_stats
+    from .figure_cache import figure_cache_stats
+    from .http_cache import response_cache_stats
+
+    gauges = [(f'figure_cache_{k}', {}, v) for k, v in figure_cache_stats().items()]
+    gauges += [(f'response_cache_{k}', {}, v) for k, v in response_cache_stats().items()]
+    for engine, stats in get_engine_stats().items():
+        gauges.append(('db_pool_checked_out', {'engine': engine}, stats.get('checked_out')))
+        gauges.append(('db_connects', {'engine': engine}, stats.get('connects')))
+    return gauges
+
+
+def _route_label(request) -> str:
+    """Bounded label: the matched URL rule, or the callback output for Dash updates."""
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if rule.endswith('/_dash-update-component'):
+        body = request.get_json(silent=True) or {}
+        return f"callback:{body.get('output', 'unknown')}"
+    return rule
+
+
+def install_metrics(server):
+    """Attach request timing, the /metrics endpoint and optional profiling to a Flask app."""
+    from flask import Response, g, request
+
+    if not METRICS_ENABLED:
+        return
+
+    profile_requests = PROFILE_REQUESTS and os.getenv('DEBUG', 'False') == 'True'
+    if PROFILE_REQUESTS and not profile_requests:
+        print("PROFILE_REQUESTS ignored: request profiling only runs with DEBUG=True.")
+
+    @server.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        if profile_requests and request.path != '/metrics':
+            g.profiler = cProfile.Profile()
+            try:
+                g.profiler.enable()
+            except ValueError:
+                # Another profiler is already active on this thread.
+                g.profiler = None
+
+    @server.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            observe(
+                'http_request_duration_seconds',
+                time.perf_counter() - start,
+                route=_route_label(request),
+                method=request.method,
+                status=response.status_code,
+            )
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _dump_profile(profiler, _route_label(request))
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(
+            render_metrics(_collect_gauges()),
+            mimetype='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+
+def _dump_profile(profiler, route: str):
+    Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+    safe_route = ''.join(c if c.isalnum() else '_' for c in route).strip('_')[:80] or 'root'
+    path = Path(PROFILE_DIR) / f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{safe_route}.prof"
+    profiler.dump_stats(path)
+    print(f"Profile written to {path} (inspect with `python -m pstats {path}`)")
+
+
+def reset_metrics():
+    with _registry_lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+__all__ = [
+    'Histogram',
+    'observe',
+    'increment',
+    'timed',
+    'render_metrics',
+    'install_metrics',
+    'reset_metrics',
+]
@@ -1,12 +1,9 @@
-import dash_leaflet as dl
-import plotly.express as px
+# plotly.express and dash_leaflet are imported by the builders that use them,
+# so a worker only pays for them when it first draws a page, not at startup.
 import pandas as pd
 
 from ..db.schema import (
     BEANS_COL_PURCHASE_DATE,
-    BEANS_COL_ROASTER,
-    BEANS_COL_BLEND_NAME,
-    BEANS_COL_ROAST_LEVEL,
     BEANS_COL_WEIGHT_GRAMS,
     ROASTERS_COL_NAME,
     ROASTERS_COL_CITY,
@@ -14,54 +11,59 @@ from ..db.schema import (
     ROASTERS_COL_LAT,
     ROASTERS_COL_LON
 )
-from .google_maps_api import geocode_location
-
-def make_roaster_distribution(beans_df: pd.DataFrame, roasters_df: pd.DataFrame):
-    if beans_df is None or beans_df.empty:
-        return px.bar(title='No coffee bean data available')
-
-    if roasters_df is None or roasters_df.empty:
-        return px.bar(title='No roaster data available')
+from ..db.aggregations import (
+    AGG_COL_ROAST_LEVEL,
+    AGG_COL_ROASTER,
+    AGG_COL_COUNT,
+    AGG_COL_LOCATION,
+    AGG_COL_CUMULATIVE_WEIGHT,
+    AGG_COL_ROASTERS,
+    AGG_COL_BLEND_NAMES,
+    AGG_COL_TASTING_NOTE
+)
+from src.config import LINE_MAX_POINTS
+from .downsample import downsample_series
+from .figure_cache import cached_figure
+from .metrics import timed
+from .geocode_cache import geocode_locations
+from .map_clusters import ClusterIndex
+from .consumption import AGG_COL_DAY, AGG_COL_GRAMS_PER_DAY, ROLLING_WINDOWS, rolling_col
+from .component_ids import ROASTER_MAP_ID, ROASTER_CLUSTERS_ID, CUMULATIVE_WEIGHT_GRAPH_ID
 
-    roaster_series = beans_df[BEANS_COL_ROASTER].dropna().astype(str).str.strip()
-    if roaster_series.empty:
-        return px.bar(title='No data available')
+ROASTER_MAP_ZOOM = 4
 
-    counts = roaster_series.value_counts().reset_index()
-    counts.columns = ['Roaster', 'Count']
-    counts = counts.sort_values(['Count', 'Roaster'], ascending=[False, True])
 
-    merged = counts.merge(
-        roasters_df,
-        left_on='Roaster',
-        right_on=ROASTERS_COL_NAME,
-        how='left'
-    )
+@timed('plot_builder_duration_seconds')
+@cached_figure
+def make_roaster_distribution(counts_df: pd.DataFrame):
+    """Bar chart of bean counts per roaster, from `data_helpers.load_roaster_counts`."""
+    import plotly.express as px
 
-    merged['Location'] = merged[ROASTERS_COL_CITY] + ', ' + merged[ROASTERS_COL_STATE]
+    if counts_df is None or counts_df.empty:
+        return px.bar(title='No coffee bean data available')
 
     return px.bar(
-        merged,
-        x='Roaster',
-        y='Count',
-        hover_data={'Location': True},
+        counts_df,
+        x=AGG_COL_ROASTER,
+        y=AGG_COL_COUNT,
+        hover_data={AGG_COL_LOCATION: True},
         title='Distribution of Coffee Beans by Roaster'
     )
 
 
-def make_roast_level_pie(beans_df: pd.DataFrame):
-    """Pie chart of roast level proportions."""
-    roast_level_series = beans_df[BEANS_COL_ROAST_LEVEL].dropna().astype(str).str.strip()
+@timed('plot_builder_duration_seconds')
+@cached_figure
+def make_roast_level_pie(counts_df: pd.DataFrame):
+    """Pie chart of roast level proportions, from `data_helpers.load_roast_level_counts`."""
+    import plotly.express as px
 
-    if roast_level_series.empty:
+    if counts_df is None or counts_df.empty:
         return px.bar(title='No data available')
 
-    counts = roast_level_series.value_counts().reset_index()
-    counts.columns = ['Roast Level', 'Count']
     fig = px.pie(
-        counts,
-        names='Roast Level',
-        values='Count',
+        counts_df,
+        names=AGG_COL_ROAST_LEVEL,
+        values=AGG_COL_COUNT,
         title='Roast Level Proportions',
         hole=0.4
     )
@@ -69,89 +71,167 @@ def make_roast_level_pie(beans_df: pd.DataFrame):
     return fig
 
 
-def make_cumulative_weight_line(beans_df: pd.DataFrame):
-    if beans_df is None or beans_df.empty:
+@timed('plot_builder_duration_seconds')
+@cached_figure
+def make_cumulative_weight_line(daily_df: pd.DataFrame, x_range=None):
+    """Running total of grams purchased, from `data_helpers.load_cumulative_weight`
+    or a filtered `FilterCube` view's monthly series.
+
+    At most LINE_MAX_POINTS points are drawn: the whole history is downsampled
+    with LTTB, and `x_range` (a zoomed window) gets its own, finer sample.
+    """
+    import plotly.express as px
+
+    if daily_df is None or daily_df.empty:
         return px.line(title='No coffee bean data available')
 
+    points = downsample_series(
+        daily_df, BEANS_COL_PURCHASE_DATE, AGG_COL_CUMULATIVE_WEIGHT, LINE_MAX_POINTS, x_range
+    )
     col_labels = {
         BEANS_COL_PURCHASE_DATE: 'Purchase Date',
-        BEANS_COL_ROASTER: 'Roaster',
-        BEANS_COL_BLEND_NAME: 'Blend Name',
+        AGG_COL_ROASTERS: 'Roaster',
+        AGG_COL_BLEND_NAMES: 'Blend Name',
         BEANS_COL_WEIGHT_GRAMS: 'Bag Weight (g)',
-        'cumulative_weight_g': 'Cumulative Weight (g)',
+        AGG_COL_CUMULATIVE_WEIGHT: 'Cumulative Weight (g)',
     }
-    df = beans_df.copy()
-    df[BEANS_COL_PURCHASE_DATE] = pd.to_datetime(df[BEANS_COL_PURCHASE_DATE], errors='coerce')
-    df = df.dropna(subset=[BEANS_COL_PURCHASE_DATE]).sort_values(BEANS_COL_PURCHASE_DATE)
-    df['cumulative_weight_g'] = df[BEANS_COL_WEIGHT_GRAMS].astype(float).cumsum()
-
     fig = px.line(
-        df,
+        points,
         x=BEANS_COL_PURCHASE_DATE,
-        y='cumulative_weight_g',
+        y=AGG_COL_CUMULATIVE_WEIGHT,
         labels=col_labels,
         title='Cumulative Weight of Beans Consumed Over Time',
         markers=True,
+        # Monthly (filtered) series carry no per-day roaster or blend lists.
         hover_data={
-            BEANS_COL_ROASTER: True,
-            BEANS_COL_BLEND_NAME: True,
-            BEANS_COL_WEIGHT_GRAMS: True
+            col: True for col in (AGG_COL_ROASTERS, AGG_COL_BLEND_NAMES, BEANS_COL_WEIGHT_GRAMS)
+            if col in points.columns
         }
     )
-    fig.update_layout(xaxis_title='Date', yaxis_title='Cumulative Weight (g)')
+    # uirevision keeps the user's zoom when the zoomed figure replaces this one.
+    fig.update_layout(
+        xaxis_title='Date',
+        yaxis_title='Cumulative Weight (g)',
+        uirevision=CUMULATIVE_WEIGHT_GRAPH_ID
+    )
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
     return fig
 
 
-def make_roaster_location_map(roasters_df: pd.DataFrame):
-    map = dl.Map(
-        [dl.TileLayer(), dl.LocateControl()],
-        center=[39.5, -98.35],
-        zoom=4,
-        style={"height": "50vh", "width": "100%"}
+@timed('plot_builder_duration_seconds')
+@cached_figure
+def make_daily_consumption_line(daily_df: pd.DataFrame):
+    """Grams consumed per day and its trailing means, from `ConsumptionEngine.daily`."""
+    import plotly.express as px
+
+    if daily_df is None or daily_df.empty:
+        return px.line(title='No coffee bean data available')
+
+    points = downsample_series(daily_df, AGG_COL_DAY, AGG_COL_GRAMS_PER_DAY, LINE_MAX_POINTS)
+    series = {AGG_COL_GRAMS_PER_DAY: 'Daily'}
+    series.update({rolling_col(window): f'{window}-day mean' for window in ROLLING_WINDOWS})
+    fig = px.line(
+        points.rename(columns=series),
+        x=AGG_COL_DAY,
+        y=list(series.values()),
+        title='Coffee Consumed per Day',
+    )
+    fig.update_layout(xaxis_title='Date', yaxis_title='Grams per Day', legend_title_text='')
+    return fig
+
+
+@timed('plot_builder_duration_seconds')
+@cached_figure
+def make_roaster_consumption_area(by_roaster_df: pd.DataFrame):
+    """Stacked grams per day by roaster, from `ConsumptionEngine.by_roaster`."""
+    import plotly.express as px
+
+    if by_roaster_df is None or by_roaster_df.empty:
+        return px.area(title='No coffee bean data available')
+
+    df = by_roaster_df
+    if df[AGG_COL_DAY].nunique() > LINE_MAX_POINTS:
+        # Weekly means keep a multi-year stack light.
+        df = df.groupby(
+            [pd.Grouper(key=AGG_COL_DAY, freq='W'), AGG_COL_ROASTER], sort=False
+        )[AGG_COL_GRAMS_PER_DAY].mean().reset_index()
+    fig = px.area(
+        df,
+        x=AGG_COL_DAY,
+        y=AGG_COL_GRAMS_PER_DAY,
+        color=AGG_COL_ROASTER,
+        title='Coffee Consumed per Day by Roaster',
     )
+    fig.update_layout(xaxis_title='Date', yaxis_title='Grams per Day')
+    return fig
+
+
+def build_roaster_cluster_index(roasters_df: pd.DataFrame) -> ClusterIndex:
+    """Spatial index behind the roaster map, geocoding any roasters still missing coordinates."""
     if roasters_df is None or roasters_df.empty:
-        return map
+        return ClusterIndex(pd.DataFrame(columns=[
+            ROASTERS_COL_NAME, ROASTERS_COL_CITY, ROASTERS_COL_STATE, ROASTERS_COL_LAT, ROASTERS_COL_LON
+        ]))
 
     df = roasters_df.copy()
-    df['location'] = df[ROASTERS_COL_CITY] + ", " + df[ROASTERS_COL_STATE]
-    df[ROASTERS_COL_LAT], df[ROASTERS_COL_LON] = zip(*df['location'].apply(geocode_location))
-    df = df.dropna(subset=[ROASTERS_COL_LAT, ROASTERS_COL_LON])
-    if df.empty:
-        return map
-
-    markers = []
-    for _, row in df.iterrows():
-        tooltip_text = f"Roaster: {row[ROASTERS_COL_NAME]}<br>Location: {row['location']}"
-        marker = dl.Marker(
-            position=[row[ROASTERS_COL_LAT], row[ROASTERS_COL_LON]],
-            children=[dl.Tooltip(content=tooltip_text)]
-        )
-        markers.append(marker)
-
-    map.children.append(dl.LayerGroup(markers))
-    return map
-
-def make_coffee_notes_distribution(beans_df: pd.DataFrame):
-    """Bar chart of most common coffee tasting notes."""
-    if beans_df is None or beans_df.empty:
-        return px.bar(title='No coffee bean data available')
+    # object so typed (categorical) frames concatenate like plain ones
+    df['location'] = df[ROASTERS_COL_CITY].astype(object) + ", " + df[ROASTERS_COL_STATE].astype(object)
+    for col in (ROASTERS_COL_LAT, ROASTERS_COL_LON):
+        if col not in df.columns:
+            df[col] = None
+    missing = df[ROASTERS_COL_LAT].isna() | df[ROASTERS_COL_LON].isna()
+    if missing.any():
+        coords = geocode_locations(df.loc[missing, 'location'].dropna().unique())
+        latlon = df.loc[missing, 'location'].map(lambda loc: coords.get(loc, (None, None)))
+        df.loc[missing, ROASTERS_COL_LAT] = latlon.str[0]
+        df.loc[missing, ROASTERS_COL_LON] = latlon.str[1]
+    return ClusterIndex(df)
+
+
+@timed('plot_builder_duration_seconds')
+def make_roaster_location_map(cluster_index: ClusterIndex):
+    """Roaster map whose GeoJSON layer is filled per viewport by the page's callback.
+
+    Only the initial view's clusters are sent with the layout; see
+    `pages.coffee_beans.update_roaster_clusters`.
+    """
+    import dash_leaflet as dl
+
+    return dl.Map(
+        [
+            dl.TileLayer(),
+            dl.LocateControl(),
+            dl.GeoJSON(
+                id=ROASTER_CLUSTERS_ID,
+                data=cluster_index.query(None, ROASTER_MAP_ZOOM),
+                pointToLayer={'variable': 'coffeeCanary.roasterMap.pointToLayer'},
+            ),
+        ],
+        id=ROASTER_MAP_ID,
+        center=[39.5, -98.35],
+        zoom=ROASTER_MAP_ZOOM,
+        trackViewport=True,
+        style={"height": "50vh", "width": "100%"}
+    )
 
-    notes_series = beans_df['tasting_notes'].dropna().astype(str).str.strip()
-    if notes_series.empty:
-        return px.bar(title='No tasting notes available')
+@timed('plot_builder_duration_seconds')
+@cached_figure
+def make_coffee_notes_distribution(counts_df: pd.DataFrame):
+    """Bar chart of most common tasting notes, from `data_helpers.load_top_tasting_notes`."""
+    import plotly.express as px
 
-    all_notes = notes_series.str.split(';').explode().str.strip()
-    counts = all_notes.value_counts().reset_index()
-    counts.columns = ['Tasting Note', 'Count']
-    counts = counts.sort_values(
-        ['Count', 'Tasting Note'],
-        ascending=[False, True]
-    ).head(20)
+    if counts_df is None or counts_df.empty:
+        return px.bar(title='No tasting notes available')
 
+    # Notes are stored normalized to lowercase; title-case them for display.
+    counts = counts_df.assign(**{
+        AGG_COL_TASTING_NOTE: counts_df[AGG_COL_TASTING_NOTE].str.title()
+    })
     fig = px.bar(
         counts,
-        x='Tasting Note',
-        y='Count',
-        title='Top 20 Coffee Tasting Notes'
+        x=AGG_COL_TASTING_NOTE,
+        y=AGG_COL_COUNT,
+        title=f'Top {len(counts)} Coffee Tasting Notes'
     )
     return fig
@@ -0,0 +1,418 @@
+"""Static prerender of the read-only dashboard pages.
+
+Each page in PRERENDER_PATHS is rendered into a bundle a browser can load
+without any Python running: the page shell (HTML), a `_dash-layout` with the
+page's content, figures and map data already inlined, `_dash-dependencies`,
+and the scripts, styles and assets the shell references. The shell's
+`requests_pathname_prefix` points at `/_prerender/<page>/`, so the renderer
+fetches that page's own layout, and the inlined dcc.Location already holds
+the page's path, so no routing callback runs on load.
+
+A bundle is keyed on a fingerprint of the data (`data_version`) and the
+code. It is written to PRERENDER_DIR/<fingerprint>/ and published by
+swapping the `current` symlink. While the fingerprint matches, the Flask
+server answers page and layout requests from the current bundle,
+pre-compressed. Otherwise it serves the page live and renders a new bundle
+on a background thread. Callbacks (filters, map re-clustering, client-side
+navigation) still POST to the app, at `/_prerender/<page>/_dash-update-component`.
+
+`PRERENDER_DIR/current/` can also be uploaded to any static host or CDN,
+with that POST route forwarded to the app.
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from src.config import (
+    DB_PATH,
+    COMPRESS_MIN_BYTES,
+    PRERENDER_ENABLED,
+    PRERENDER_DIR,
+    PRERENDER_PATHS,
+    PRERENDER_MAX_AGE
+)
+from .code_version import code_signature
+from .data_cache import data_version
+from .http_cache import COMPRESSIBLE_MIMETYPES, ENCODINGS, ETAG_SUFFIXES, compress, preferred_encoding
+from .metrics import increment
+
+PRERENDER_URL_PREFIX = '/_prerender/'
+# Sent on the requests a render makes to the app itself, which are always answered live.
+RENDER_HEADER = 'X-Coffee-Canary-Prerender'
+CURRENT_LINK = 'current'
+MANIFEST_NAME = 'manifest.json'
+# Served from the bundle; the callback route always reaches the app.
+BUNDLE_ENDPOINTS = ('_dash-layout', '_dash-dependencies')
+LIVE_ENDPOINTS = (('_dash-layout', 'GET'), ('_dash-dependencies', 'GET'), ('_dash-update-component', 'POST'))
+
+# Ids dash.page_container gives its routing components.
+PAGES_LOCATION_ID = '_pages_location'
+PAGES_CONTENT_ID = '_pages_content'
+PAGES_STORE_ID = '_pages_store'
+
+_CONFIG_SCRIPT = re.compile(r'(<script id="_dash-config" type="application/json">)(.*?)(</script>)', re.S)
+_RESOURCE_URL = re.compile(r'(?:src|href)="(/(?:_dash-component-suites|assets)/[^"]+|/_favicon\.ico[^"]*)"')
+# The `.v<version>m<mtime>.` Dash inserts into component suite file names.
+_FINGERPRINT = re.compile(r'\.(v[\w-]+m[0-9a-fA-F]+)\.')
+_ENCODED_SUFFIX = {'br': '.br', 'gzip': '.gz'}
+PLOTLY_JS_PATH = '_dash-component-suites/plotly/package_data/plotly.min.js'
+
+_state = {'lock': threading.Lock(), 'refreshing': False, 'attempted': None}
+
+
+def prerender_dir() -> Path:
+    """PRERENDER_DIR if set, otherwise a directory next to the database file."""
+    return Path(PRERENDER_DIR) if PRERENDER_DIR else Path(f"{DB_PATH}-prerender")
+
+
+def bundle_fingerprint() -> str:
+    """Identity of the data and code a bundle is rendered from."""
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(repr(data_version()).encode('utf-8'))
+    digest.update(code_signature('dash').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def current_fingerprint():
+    """Fingerprint of the published bundle, or None if there is none."""
+    try:
+        return os.readlink(prerender_dir() / CURRENT_LINK)
+    except OSError:
+        return None
+
+
+def _prerender_pages() -> dict:
+    """Registered pages to prerender, by path."""
+    import dash
+
+    registry = {page['path']: page for page in dash.page_registry.values()}
+    unknown = [path for path in PRERENDER_PATHS if path not in registry]
+    if unknown:
+        print(f"Not prerendering unregistered pages: {', '.join(unknown)}")
+    return {path: registry[path] for path in PRERENDER_PATHS if path in registry}
+
+
+def _page_name(page: dict) -> str:
+    return page['module'].split('.')[-1]
+
+
+def _shell_file(path: str) -> str:
+    """Where a page's HTML goes in a bundle, as a static host would look it up."""
+    return 'index.html' if path == '/' else f"{path.strip('/')}/index.html"
+
+
+def _static_config(config_json: str, requests_prefix: str, plotly_url: str) -> str:
+    """The renderer config of a bundle's shell: API requests go to `requests_prefix`."""
+    config = json.loads(config_json)
+    config['requests_pathname_prefix'] = requests_prefix
+    # Served locally, plotly.js would be loaded from under the requests
+    # prefix; point every page at the one shared copy instead.
+    if config.get('serve_locally'):
+        config['serve_locally'] = False
+        config['plotlyjs_url'] = plotly_url
+    return json.dumps(config, separators=(',', ':')).replace('</', '<\\/')
+
+
+def _inline_page(node, path: str, content, title: str):
+    """Put a page's layout into the page container of an app layout (as JSON), in place."""
+    if isinstance(node, list):
+        for child in node:
+            _inline_page(child, path, content, title)
+        return
+    if not isinstance(node, dict):
+        return
+    props = node.get('props')
+    if isinstance(props, dict):
+        component_id = props.get('id')
+        if component_id == PAGES_CONTENT_ID:
+            props['children'] = content
+            return
+        if component_id == PAGES_LOCATION_ID:
+            # Location only reports props it was not given, so with these set
+            # mounting it does not trigger the routing callback.
+            props.update(pathname=path, search='', hash='')
+        elif component_id == PAGES_STORE_ID:
+            props['data'] = {'title': title}
+    for value in node.values():
+        _inline_page(value, path, content, title)
+
+
+def _write(root: Path, relative: str, body: bytes, mimetype: str):
+    """Write a bundle file, plus .gz (and .br) copies a server can send as they are."""
+    path = root / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(body)
+    if len(body) < COMPRESS_MIN_BYTES or mimetype not in COMPRESSIBLE_MIMETYPES:
+        return
+    for encoding in ENCODINGS:
+        path.with_name(path.name + _ENCODED_SUFFIX[encoding]).write_bytes(compress(body, encoding))
+
+
+def _resource_mimetype(relative: str) -> str:
+    if relative.endswith('.ico'):
+        return 'image/x-icon'
+    return mimetypes.guess_type(relative)[0] or 'application/octet-stream'
+
+
+def _chunk_urls(app, referenced: set) -> set:
+    """Component suite files loaded on demand (e.g. dcc's async chunks).
+
+    Their loaders request them under the fingerprint of the script that
+    loads them, so each is written under the fingerprints of the referenced
+    scripts in its package directory.
+    """
+    fingerprints = {}
+    for url in referenced:
+        parts = urlsplit(url).path.split('/')
+        match = _FINGERPRINT.search(parts[-1])
+        if parts[1] == '_dash-component-suites' and match:
+            fingerprints.setdefault('/'.join(parts[2:-1]), set()).add(match.group(1))
+    urls = set()
+    for namespace, paths in app.registered_paths.items():
+        package_dir = Path(sys.modules[namespace].__file__).parent
+        for relative in paths:
+            # Registered source maps are often not shipped.
+            if not (package_dir / relative).is_file():
+                continue
+            directory, _, filename = f'{namespace}/{relative}'.rpartition('/')
+            name, dot, extension = filename.partition('.')
+            for fingerprint in fingerprints.get(directory, ()):
+                urls.add(f'/_dash-component-suites/{directory}/{name}.{fingerprint}{dot}{extension}')
+    return urls - {urlsplit(url).path for url in referenced}
+
+
+def render_bundle(app, root: Path) -> dict:
+    """Render every page in PRERENDER_PATHS into `root`; returns the manifest."""
+    from plotly.io.json import to_json_plotly
+
+    client = app.server.test_client()
+    routes_prefix = app.config.routes_pathname_prefix
+    plotly_url = f'{app.config.requests_pathname_prefix}{PLOTLY_JS_PATH}'
+
+    def fetch(url: str) -> bytes:
+        response = client.get(url, headers={RENDER_HEADER: '1'})
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return response.get_data()
+
+    pages, referenced = {}, set()
+    for path, page in _prerender_pages().items():
+        start = time.perf_counter()
+        name = _page_name(page)
+        bundle_prefix = f'{PRERENDER_URL_PREFIX}{name}/'
+        shell = fetch(path).decode('utf-8')
+        referenced.update(_RESOURCE_URL.findall(shell))
+        shell = _CONFIG_SCRIPT.sub(
+            lambda m: m.group(1) + _static_config(m.group(2), bundle_prefix, plotly_url) + m.group(3),
+            shell,
+            count=1
+        )
+
+        layout = json.loads(fetch(f'{routes_prefix}_dash-layout'))
+        content = page['layout']() if callable(page['layout']) else page['layout']
+        title = page['title']() if callable(page['title']) else page['title']
+        _inline_page(layout, path, json.loads(to_json_plotly(content)), title)
+
+        _write(root, _shell_file(path), shell.encode('utf-8'), 'text/html')
+        _write(root, f'{bundle_prefix[1:]}_dash-layout',
+               json.dumps(layout, separators=(',', ':')).encode('utf-8'), 'application/json')
+        _write(root, f'{bundle_prefix[1:]}_dash-dependencies',
+               fetch(f'{routes_prefix}_dash-dependencies'), 'application/json')
+        pages[path] = {'name': name, 'seconds': round(time.perf_counter() - start, 3)}
+
+    resources = {urlsplit(url).path for url in referenced} | _chunk_urls(app, referenced)
+    resources.add(plotly_url)
+    # Layouts reference assets too (e.g. the photos on brew_tools).
+    assets = Path(app.config.assets_folder)
+    resources.update(
+        app.get_asset_url(path.relative_to(assets).as_posix())
+        for path in assets.rglob('*') if path.is_file()
+    )
+    for url in sorted(resources):
+        relative = url.lstrip('/')
+        _write(root, relative, fetch(url), _resource_mimetype(relative))
+    return {'pages': pages, 'resources': len(resources)}
+
+
+@contextmanager
+def _render_lock(directory: Path):
+    """Yield True to the one process allowed to render into `directory` right now."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / '.lock', 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _publish(directory: Path, staging: Path, fingerprint: str):
+    target = directory / fingerprint
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    # Swap the link atomically, so a reader sees the old bundle or the new one.
+    link = directory / f'.{CURRENT_LINK}-{os.getpid()}'
+    link.unlink(missing_ok=True)
+    os.symlink(fingerprint, link)
+    os.replace(link, directory / CURRENT_LINK)
+    for old in directory.iterdir():
+        if old.is_dir() and not old.is_symlink() and old.name not in (fingerprint, CURRENT_LINK) \
+                and not old.name.startswith('.'):
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def prerender(app=None, force=False) -> bool:
+    """Render and publish a bundle unless the current one matches the data and code.
+
+    Imports the app only when there is something to render. Returns False
+    if the render failed or another process is rendering.
+    """
+    directory = prerender_dir()
+    if not force and current_fingerprint() == bundle_fingerprint():
+        print("Prerendered pages up to date.")
+        return True
+
+    with _render_lock(directory) as acquired:
+        if not acquired:
+            print("Pages are being prerendered by another process.")
+            return False
+        if app is None:
+            from src.app import app
+        # Taken before rendering: data that changes meanwhile makes the bundle stale at once.
+        fingerprint = bundle_fingerprint()
+        if not force and current_fingerprint() == fingerprint:
+            print("Prerendered pages up to date.")
+            return True
+
+        start = time.perf_counter()
+        staging = Path(tempfile.mkdtemp(dir=directory, prefix='.render-'))
+        # mkdtemp's 0700 would hide the bundle from a web server running as another user.
+        staging.chmod(0o755)
+        try:
+            manifest = render_bundle(app, staging)
+            manifest.update(fingerprint=fingerprint, rendered_at=time.time())
+            (staging / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+            _publish(directory, staging, fingerprint)
+        except Exception as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            print(f"Error prerendering pages: {e}")
+            return False
+    print(
+        f"Prerendered {', '.join(manifest['pages'])} and {manifest['resources']} resources "
+        f"to {directory / fingerprint} in {time.perf_counter() - start:.2f}s"
+    )
+    return True
+
+
+def _refresh_in_background(app, fingerprint: str):
+    """Render a bundle for `fingerprint` on a thread, at most once per process."""
+    with _state['lock']:
+        if _state['refreshing'] or _state['attempted'] == fingerprint:
+            return
+        _state['refreshing'] = True
+        _state['attempted'] = fingerprint
+
+    def run():
+        try:
+            prerender(app)
+        finally:
+            _state['refreshing'] = False
+
+    threading.Thread(target=run, name='prerender', daemon=True).start()
+
+
+def install_prerender(app):
+    """Serve prerendered pages from the current bundle and route their callbacks to `app`."""
+    from flask import request, send_file
+
+    # Dev tools and hot reload call routes a bundle does not carry.
+    if not PRERENDER_ENABLED or os.getenv('DEBUG', 'False') == 'True':
+        return
+
+    server = app.server
+    directory = prerender_dir().resolve()
+    routes_prefix = app.config.routes_pathname_prefix
+    files = {}
+    for path, page in _prerender_pages().items():
+        name = _page_name(page)
+        files[path] = _shell_file(path)
+        for endpoint in BUNDLE_ENDPOINTS:
+            files[f'{PRERENDER_URL_PREFIX}{name}/{endpoint}'] = f'{PRERENDER_URL_PREFIX[1:]}{name}/{endpoint}'
+        # What the bundle does not answer (or a stale bundle's page) is answered live.
+        for endpoint, method in LIVE_ENDPOINTS:
+            server.add_url_rule(
+                f'{PRERENDER_URL_PREFIX}{name}/{endpoint}',
+                endpoint=f'prerender_{name}{endpoint}',
+                view_func=server.view_functions[f'{routes_prefix}{endpoint}'],
+                methods=[method],
+            )
+
+    @server.before_request
+    def _serve_prerendered():
+        relative = files.get(request.path)
+        if relative is None or request.method not in ('GET', 'HEAD') or RENDER_HEADER in request.headers:
+            return None
+        fingerprint = bundle_fingerprint()
+        if current_fingerprint() != fingerprint:
+            _refresh_in_background(app, fingerprint)
+            return None
+
+        path = directory / fingerprint / relative
+        encoding = preferred_encoding(request)
+        if encoding is not None:
+            encoded = path.with_name(path.name + _ENCODED_SUFFIX[encoding])
+            path, encoding = (encoded, encoding) if encoded.exists() else (path, None)
+        try:
+            response = send_file(
+                path,
+                mimetype='text/html' if relative.endswith('.html') else 'application/json',
+                etag=fingerprint + ETAG_SUFFIXES[encoding],
+                max_age=PRERENDER_MAX_AGE,
+                conditional=True,
+            )
+        except OSError:
+            # Replaced by a newer bundle since the link was read.
+            return None
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        increment('prerender_hits_total', file=relative)
+        return response
+
+
+__all__ = [
+    'PRERENDER_URL_PREFIX',
+    'prerender_dir',
+    'bundle_fingerprint',
+    'current_fingerprint',
+    'render_bundle',
+    'prerender',
+    'install_prerender',
+]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Render the read-only pages into static bundles.')
+    parser.add_argument('--force', action='store_true', help='Render even if the current bundle is up to date')
+    args = parser.parse_args(argv)
+    return 0 if prerender(force=args.force) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
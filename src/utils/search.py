@@ -0,0 +1,141 @@
+import re
+
+import pandas as pd
+from sqlalchemy import text
+
+from .db import _get_engine
+from src.db.queries import BEANS_SEARCH_NAME_COLUMNS, SEARCH_BEANS_CANDIDATES, SEARCH_BEANS_CANDIDATES_POSTGRES
+from src.db.schema import (
+    BEANS_COL_ID,
+    BEANS_COL_BLEND_NAME,
+    BEANS_COL_ROASTER,
+    BEANS_COL_TASTING_NOTES,
+    BEANS_COL_ORIGIN_COUNTRY
+)
+
+# Single-character prefixes match most of the index; wait for two.
+MIN_TOKEN_LENGTH = 2
+# How many of the newest matches are ranked for relevance, once for matches
+# in the blend and roaster names and once for matches anywhere.
+SEARCH_CANDIDATES = 200
+
+# Match weights per column, mirroring what a person searching usually means.
+COLUMN_WEIGHTS = {
+    BEANS_COL_BLEND_NAME: 10.0,
+    BEANS_COL_ROASTER: 5.0,
+    BEANS_COL_TASTING_NOTES: 2.0,
+    BEANS_COL_ORIGIN_COUNTRY: 2.0,
+}
+
+_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def _tokens(value) -> list[str]:
+    return _TOKEN_PATTERN.findall(value.casefold()) if isinstance(value, str) else []
+
+
+def parse_query(query: str) -> tuple[list[str], str]:
+    """Split search box text into completed words and the word still being typed.
+
+    The last word is only treated as a prefix while the cursor is still on it,
+    i.e. when the text does not end in whitespace.
+    """
+    tokens = [t for t in _tokens(query or '') if len(t) >= MIN_TOKEN_LENGTH]
+    if tokens and not (query or '')[-1:].isspace():
+        return tokens[:-1], tokens[-1]
+    return tokens, ''
+
+
+def build_match_query(query: str, columns=()) -> str:
+    """Turn free text into an FTS5 query: exact completed words, prefix last word.
+
+    Every term is quoted, so FTS5 syntax in the search box can never cause a
+    query error. With `columns`, every term must match within those columns.
+    """
+    words, prefix = parse_query(query)
+    terms = [f'"{word}"' for word in words]
+    if prefix:
+        terms.append(f'"{prefix}"*')
+    if columns and terms:
+        return f"{{{' '.join(columns)}}} : ({' '.join(terms)})"
+    return " ".join(terms)
+
+
+def build_tsquery(query: str) -> str:
+    """The PostgreSQL counterpart of `build_match_query`, for to_tsquery.
+
+    Terms are runs of word characters quoted as lexemes, so tsquery
+    operators typed into the search box are never interpreted.
+    """
+    words, prefix = parse_query(query)
+    terms = [f"'{word}'" for word in words]
+    if prefix:
+        terms.append(f"'{prefix}':*")
+    return " & ".join(terms)
+
+
+def _score(row, words: list[str], prefix: str) -> float:
+    """Column-weighted match score, favouring matches in shorter fields.
+
+    Every candidate already contains every term, so global term rarity (the
+    IDF part of bm25) would rank them all the same; only where and how
+    densely the terms occur matters.
+    """
+    score = 0.0
+    for column, weight in COLUMN_WEIGHTS.items():
+        field = _tokens(row[column])
+        if not field:
+            continue
+        hits = sum(1 for w in words if w in field)
+        if prefix:
+            hits += any(token.startswith(prefix) for token in field)
+        score += weight * hits / (1 + 0.1 * len(field))
+    return score
+
+
+def search_beans(query: str, limit: int = 25) -> pd.DataFrame:
+    """Full-text search over blend name, roaster, tasting notes and origin, best match first.
+
+    Only the newest SEARCH_CANDIDATES matches in the blend and roaster names
+    and the newest SEARCH_CANDIDATES matches anywhere are scored, so an old
+    bean matched only in its tasting notes or origin can be missed when a
+    query matches more beans than that.
+    """
+    match = build_match_query(query)
+    if not match:
+        return pd.DataFrame()
+    engine = _get_engine()
+    if engine is None:
+        return pd.DataFrame()
+    sql = SEARCH_BEANS_CANDIDATES
+    params = {
+        'match': match,
+        'name_match': build_match_query(query, BEANS_SEARCH_NAME_COLUMNS),
+        'candidates': SEARCH_CANDIDATES,
+    }
+    if engine.dialect.name == 'postgresql':
+        # The name columns have their own document, so one tsquery serves both.
+        sql, params = SEARCH_BEANS_CANDIDATES_POSTGRES, {'match': build_tsquery(query), 'candidates': SEARCH_CANDIDATES}
+    try:
+        candidates = pd.read_sql(text(sql), con=engine, params=params)
+    except Exception as e:
+        print(f"Error searching beans for '{query}': {e}")
+        return pd.DataFrame()
+    if candidates.empty:
+        return candidates
+
+    words, prefix = parse_query(query)
+    candidates['score'] = [
+        _score(row, words, prefix) for row in candidates.to_dict('records')
+    ]
+    # Newest first among equal scores; the candidates arrive newest first.
+    ranked = candidates.sort_values('score', ascending=False, kind='stable').head(limit)
+    return ranked.drop(columns=[BEANS_COL_ID, 'score']).reset_index(drop=True)
+
+
+__all__ = [
+    'parse_query',
+    'build_match_query',
+    'build_tsquery',
+    'search_beans',
+]
@@ -0,0 +1,30 @@
+import os
+import time
+from contextlib import contextmanager
+
+_process_start = time.perf_counter()
+_phases = []
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Record how long a named step of process startup takes."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - start))
+
+
+def startup_phases() -> list[tuple[str, float]]:
+    return list(_phases)
+
+
+def report_startup():
+    """Print where boot time went for this process."""
+    total = time.perf_counter() - _process_start
+    lines = [f"Startup timing (pid {os.getpid()}):"]
+    for name, seconds in _phases:
+        lines.append(f"  {name:<24} {seconds * 1000:9.1f} ms")
+    lines.append(f"  {'total since import':<24} {total * 1000:9.1f} ms")
+    print("\n".join(lines))